@@ -0,0 +1,107 @@
+import warnings
+
+import numpy as np
+
+# The supported policies for runs of different lengths and the interpolation methods
+POLICIES = ["pad", "truncate"]
+INTERPOLATIONS = ["linear", "previous", "nearest"]
+
+
+def align_runs(pdfs, step=0.1, policy="pad", interpolation="linear", dtype=np.float64):
+    """
+    Resample the time indexed power data of multiple runs onto one shared regular time grid, so they can be
+    combined into a single dense 2-D array instead of a sparse union of all their time values.
+
+    :param pdfs: The list of time indexed power Series of the runs
+    :param step: The step of the time grid in seconds
+    :param policy: "pad" to span all the runs (NaN where a run has no data) or "truncate" to span only the
+    time covered by every run
+    :param interpolation: How to resample the runs onto the grid, "linear", "previous", or "nearest"
+    :param dtype: The dtype of the aligned power array
+    :return: The time grid array and the 2-D float array of the power with one row per time and one column
+    per run
+    """
+    if policy not in POLICIES:
+        raise ValueError(f"Unknown alignment policy: {policy}")
+    if interpolation not in INTERPOLATIONS:
+        raise ValueError(f"Unknown interpolation method: {interpolation}")
+
+    # Get the time and power arrays of the runs, runs without data are left empty
+    times = [pdf.index.to_numpy(dtype=np.float64) for pdf in pdfs]
+    powers = [pdf.to_numpy() for pdf in pdfs]
+    spans = [(time[0], time[-1]) for time in times if len(time)]
+
+    # Create the grid over the time span of the policy, at whole multiples of the step
+    grid = np.empty(0)
+    if spans:
+        starts, ends = zip(*spans)
+        start, end = (min(starts), max(ends)) if policy == "pad" else (max(starts), min(ends))
+        first, last = np.ceil(start / step - 1e-9), np.floor(end / step + 1e-9)
+        if last >= first:
+            grid = bin_time(np.arange(first, last + 1) * step, step)
+
+    # Resample each run onto the grid, leaving the times outside of the run NaN
+    values = np.full((len(grid), len(pdfs)), np.nan, dtype=dtype)
+    for i, (time, power) in enumerate(zip(times, powers)):
+        if len(time):
+            inside = (grid >= time[0]) & (grid <= time[-1])
+            values[inside, i] = resample(time, power, grid[inside], interpolation)
+
+    return grid, values
+
+
+def resample(time, power, grid, interpolation="linear"):
+    """
+    Resample the power of a run at the given grid times, which should lie within the time span of the run.
+
+    :param time: The increasing time array of the run
+    :param power: The power array of the run
+    :param grid: The times to resample at
+    :param interpolation: How to resample the run, "linear", "previous", or "nearest"
+    :return: The array of resampled power values
+    """
+    if interpolation == "linear":
+        return np.interp(grid, time, power)
+
+    # Find the last sample at or before each grid time, and for nearest move to the next one if it is closer
+    index = np.clip(np.searchsorted(time, grid, side="right") - 1, 0, len(time) - 1)
+    if interpolation == "nearest":
+        following = np.minimum(index + 1, len(time) - 1)
+        index = np.where(time[following] - grid < grid - time[index], following, index)
+    return power[index]
+
+
+def aligned_mean_std(values):
+    """
+    Calculate the mean and (sample) std over the runs at each time of the aligned array, ignoring the runs
+    without data at a time.
+
+    :param values: The 2-D aligned power array, one row per time and one column per run
+    :return: The mean and std arrays, NaN where there is not enough data
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", category=RuntimeWarning)
+        mean = np.nanmean(values, axis=1)
+        std = np.nanstd(values, axis=1, ddof=1)
+    return mean, std
+
+
+def bin_time(time, bin_width):
+    """
+    Round the time values to the nearest multiple of the bin width. When the bin width divides a second
+    into a whole number of bins the values are scaled up instead, so 0.1s gives the same bins as the numpy
+    round(time, 1) the extraction used before. A tie of the scaled value goes to the even bin, unlike round of
+    a Python float, which rounds the exact binary value: round(0.15, 1) is 0.1 while this gives 0.2.
+
+    :param time: The array of time values
+    :param bin_width: The width of the time bins in seconds
+    :return: The array of rounded time values
+    """
+    if bin_width <= 0:
+        raise ValueError("The time bin width must be positive")
+
+    # Scale by the number of bins per second if it is a whole number, otherwise divide by the bin width
+    bins_per_second = round(1 / bin_width)
+    if abs(bins_per_second * bin_width - 1) < 1e-9:
+        return np.round(time * bins_per_second) / bins_per_second
+    return np.round(time / bin_width) * bin_width
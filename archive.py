@@ -0,0 +1,102 @@
+import json
+import os
+import struct
+
+import numpy as np
+
+# The file extension and the magic bytes identifying an archive, and the version of the format
+ARCHIVE_EXTENSION = ".erarc"
+MAGIC = b"ERARCHV1"
+FORMAT_VERSION = 1
+
+# The alignment of the start of the data section in bytes
+ALIGNMENT = 64
+
+
+def is_archive(file):
+    """
+    Check whether a path or uploaded file is an archive, by its extension.
+
+    :param file: The path or uploaded file
+    :return: Whether the file is an archive
+    """
+    name = os.fspath(file) if isinstance(file, (str, os.PathLike)) else file.name
+    return name.lower().endswith(ARCHIVE_EXTENSION)
+
+
+def write_archive(path, runs):
+    """
+    Write runs to an archive. The archive starts with the magic bytes, the length of the JSON header and the
+    header itself, holding the metadata and the position of each run. Then follows the data section with one
+    column of the time values of all the runs and one column of the power values, as little-endian float64.
+
+    :param path: The path to write the archive to
+    :param runs: The list of runs, each a dict with the name, time and power arrays, total_energy, and any other
+    JSON serializable metadata (such as the source hash, the column used and the bin width)
+    """
+    # The metadata of each run with the start of its values in the columns
+    entries = []
+    start = 0
+    for run in runs:
+        metadata = {key: value for key, value in run.items() if key not in ("time", "power")}
+        entries.append({**metadata, "start": start, "samples": len(run["time"])})
+        start += len(run["time"])
+    header = json.dumps({"version": FORMAT_VERSION, "samples": start, "runs": entries}).encode("utf-8")
+
+    # Pad the header so the data section is aligned
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % ALIGNMENT)
+
+    # Write the archive through a temporary file so partially written archives are never read
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as f:
+        f.write(MAGIC + struct.pack("<Q", len(header)) + header)
+        for column in ("time", "power"):
+            for run in runs:
+                f.write(np.ascontiguousarray(run[column], dtype="<f8").tobytes())
+    os.replace(temporary_path, path)
+
+
+def read_archive(source):
+    """
+    Read the runs of an archive without copying their values. Archives on disk are memory-mapped, and archives
+    in memory are read from their bytes, so the time and power arrays of the runs are views of the archive.
+
+    :param source: The path or the bytes of the archive
+    :return: The list of runs, each a dict with the name, time and power arrays, total_energy and the metadata
+    """
+    # Read the header from the start of the archive
+    if isinstance(source, bytes):
+        prefix = source[:len(MAGIC) + 8]
+    else:
+        with open(source, "rb") as f:
+            prefix = f.read(len(MAGIC) + 8)
+    if len(prefix) < len(MAGIC) + 8 or prefix[:len(MAGIC)] != MAGIC:
+        raise ValueError("The file is not an EnergiReporter archive")
+    header_length = struct.unpack("<Q", prefix[len(MAGIC):])[0]
+    offset = len(MAGIC) + 8 + header_length
+    if isinstance(source, bytes):
+        header = json.loads(source[len(MAGIC) + 8:offset])
+    else:
+        with open(source, "rb") as f:
+            f.seek(len(MAGIC) + 8)
+            header = json.loads(f.read(header_length))
+    if header["version"] > FORMAT_VERSION:
+        raise ValueError(f"The archive format version {header['version']} is not supported")
+
+    # Map the data section, the time column followed by the power column
+    samples = header["samples"]
+    if samples == 0:
+        data = np.empty(0, dtype="<f8")
+    elif isinstance(source, bytes):
+        data = np.frombuffer(source, dtype="<f8", count=2 * samples, offset=offset)
+    else:
+        data = np.memmap(source, dtype="<f8", mode="r", offset=offset, shape=(2 * samples,))
+    times, powers = data[:samples], data[samples:]
+
+    # Slice the views of each run from the columns
+    runs = []
+    for entry in header["runs"]:
+        window = slice(entry["start"], entry["start"] + entry["samples"])
+        metadata = {key: value for key, value in entry.items() if key != "start"}
+        runs.append({**metadata, "time": times[window], "power": powers[window]})
+    return runs
@@ -0,0 +1,492 @@
+import argparse
+import ast
+import datetime
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import scipy
+
+from alignment import aligned_mean_std
+from comparison import compare_sets
+from reader import (PARSER_VERSION, extract_channels, extract_df, read_channels_csv, read_energy_csv,
+                    read_uploaded_files, remove_time_duplicates)
+from runblock import PRECISIONS
+
+# The number of rows generated and written at once by generate_energibridge_csv
+GENERATE_CHUNK_ROWS = 100000
+
+# The number of distinct files generated for the per-set stages, the other files of a set are copies of them
+DISTINCT_FILES = 8
+
+# The keys identifying the configuration of a suite result, to match the results of different runs
+CONFIG_KEYS = ["stage", "format", "rows", "cores", "files", "jitter", "duplicates", "module"]
+
+# The modules the pages defer until their sections run, imported one at a time in the startup benchmark
+DEFERRED_MODULES = ["pandas", "altair", "scipy.stats", "matplotlib.pyplot", "reader", "runset", "ingest",
+                    "comparison", "distributions", "bundle"]
+
+
+def generate_energibridge_csv(path, rows=100000, cores=64, power_column=False, seed=0, jitter=0.0, duplicates=0.0):
+    """
+    Generate a synthetic CSV file following the EnergiBridge format, with the per-core energy, frequency,
+    P-state and voltage columns, the CPU frequency and usage columns, and the memory counters. The file is
+    written in chunks of rows, so large files can be generated with a bounded amount of memory.
+
+    :param path: The path to write the CSV file to
+    :param rows: The number of samples (rows) to generate
+    :param cores: The number of cores to generate columns for
+    :param power_column: Whether to report the total as a CPU_POWER column instead of a CPU_ENERGY column
+    :param seed: The seed of the random generator
+    :param jitter: The standard deviation of the sampling interval relative to the 100ms interval
+    :param duplicates: The fraction of samples taken 1-5ms after the previous one, so they share its time bin
+    """
+    rng = np.random.default_rng(seed)
+
+    # The state carried over between the chunks: the clock and the cumulative energy counters
+    clock = 1711464957805 - 100
+    core_energy = np.full(cores, 370.0)
+    cpu_energy = 6274.0
+
+    for start in range(0, rows, GENERATE_CHUNK_ROWS):
+        n = min(GENERATE_CHUNK_ROWS, rows - start)
+
+        # The sample intervals in ms, jittered around 100ms with some samples right after the previous one
+        delta = np.maximum(np.rint(100 * (1 + jitter * rng.standard_normal(n))), 1).astype(np.int64)
+        delta = np.where(rng.random(n) < duplicates, rng.integers(1, 6, n), delta)
+        if start == 0:
+            delta[0] = 100
+        times = clock + np.cumsum(delta)
+        clock = times[-1]
+        columns = {"Delta": delta, "Time": times}
+
+        # The per-core energy (cumulative), frequency, P-state and voltage columns
+        for core in range(cores):
+            energy = core_energy[core] + np.cumsum(rng.uniform(0, 0.2, n))
+            core_energy[core] = energy[-1]
+            columns[f"CORE{core}_ENERGY (J)"] = energy
+            columns[f"CORE{core}_FREQ (MHZ)"] = rng.uniform(800, 3500, n)
+            columns[f"CORE{core}_PSTATE"] = rng.integers(0, 3, n)
+            columns[f"CORE{core}_VOLT (V)"] = rng.uniform(0.8, 1.3, n)
+
+        # The total power or energy column
+        if power_column:
+            columns["CPU_POWER (Watts)"] = rng.uniform(5, 30, n)
+        else:
+            energy = cpu_energy + np.cumsum(rng.uniform(0.5, 3, n))
+            cpu_energy = energy[-1]
+            columns["CPU_ENERGY (J)"] = energy
+
+        # The CPU frequency and usage columns for each core and the memory counters
+        for core in range(cores):
+            columns[f"CPU_FREQUENCY_{core}"] = rng.integers(800, 3500, n)
+        for core in range(cores):
+            columns[f"CPU_USAGE_{core}"] = rng.uniform(0, 100, n)
+        columns["TOTAL_MEMORY"] = np.full(n, 14556872704)
+        columns["TOTAL_SWAP"] = np.full(n, 2147479552)
+        columns["USED_MEMORY"] = rng.integers(9000000000, 10000000000, n)
+        columns["USED_SWAP"] = np.zeros(n, dtype=np.int64)
+
+        pd.DataFrame(columns).to_csv(path, index=False, mode="w" if start == 0 else "a", header=start == 0)
+
+
+def measure(function, *args, **kwargs):
+    """
+    Call a function and measure its wall time and the peak memory traced while it runs.
+
+    :param function: The function to call
+    :return: The return value, the wall time in seconds and the traced peak memory in bytes
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, duration, peak
+
+
+def benchmark_ingest(rows, cores, power_column):
+    """
+    Compare reading a wide synthetic EnergiBridge CSV file in full with the column-pruned, typed ingestion,
+    and print the parse time and memory used by each.
+
+    :param rows: The number of samples (rows) in the synthetic file
+    :param cores: The number of cores in the synthetic file
+    :param power_column: Whether the synthetic file reports power instead of energy
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "synthetic.csv")
+        generate_energibridge_csv(path, rows, cores, power_column)
+        print(f"Synthetic file: {rows} rows, {cores} cores, "
+              f"{len(pd.read_csv(path, nrows=0).columns)} columns, {os.path.getsize(path) / 2 ** 20:.1f} MiB")
+
+        # Read the file with each ingestion variant
+        variants = [("full read_csv", lambda: pd.read_csv(path)),
+                    ("pruned (c)", lambda: read_energy_csv(path, "c")),
+                    ("pruned (default)", lambda: read_energy_csv(path))]
+        for name, read in variants:
+            df, duration, peak = measure(read)
+            print(f"{name:>18}: {duration:8.3f}s, DataFrame {df.memory_usage(deep=True).sum() / 2 ** 20:8.1f} MiB, "
+                  f"traced peak {peak / 2 ** 20:8.1f} MiB")
+        print("Note: memory allocated by pyarrow itself is not traced.")
+
+
+def benchmark_memory(files, rows, precisions, workers, pages=False, cache_mb=256):
+    """
+    Load a large synthetic set of files into a run set with each precision, and print the memory in use after
+    loading and after taking the per-run and combined power values used by the statistics, with the peak while
+    loading and the size of the power block and aligned frame. The set is loaded with RunSet.from_files, or like
+    the pages load it, in the background with a run cache, keeping the ingestion like the session does.
+
+    :param files: The number of files of the set
+    :param rows: The number of rows of each file
+    :param precisions: The precisions of the power values to load the set with
+    :param workers: The number of processes to load the files with, None for all CPU cores
+    :param pages: Whether to load the set like the pages do, the run cache is then included in the memory in use
+    :param cache_mb: The memory budget of the run cache in MiB when the set is loaded like the pages do
+    """
+    from runset import RunSet
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The files are copies of a few distinct generated files to save generating time, each copy ending in a
+        # different number of blank lines so the run cache does not take the copies for the same file
+        paths = []
+        for i in range(files):
+            paths.append(os.path.join(directory, f"set_{i}.csv"))
+            if i < DISTINCT_FILES:
+                generate_energibridge_csv(paths[i], rows, 4, i % 2 == 0, i, 0.1, 0.05)
+            else:
+                shutil.copyfile(paths[i % DISTINCT_FILES], paths[i])
+                with open(paths[i], "a") as f:
+                    f.write("\n" * (i // DISTINCT_FILES))
+        print(f"Synthetic set: {files} files of {rows} rows, loaded {'like the pages' if pages else 'from the files'}")
+
+        for precision in precisions:
+            tracemalloc.start()
+            if pages:
+                run_set, ingestion, cache = load_like_pages(paths, precision, workers, cache_mb)
+            else:
+                run_set = RunSet.from_files(paths, workers=workers, precision=precision)
+            loaded, peak = tracemalloc.get_traced_memory()
+            _ = run_set.values, run_set.pooled
+            used = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            print(f"{precision:>8}: loaded {loaded / 2 ** 20:8.1f} MiB (peak {peak / 2 ** 20:8.1f} MiB), with the "
+                  f"values {used / 2 ** 20:8.1f} MiB; power block {run_set.block.nbytes / 2 ** 20:.1f} MiB, "
+                  f"aligned frame {run_set.power_df.to_numpy().nbytes / 2 ** 20:.1f} MiB"
+                  + (f", run cache {cache.stats()['bytes'] / 2 ** 20:.1f} MiB" if pages else ""))
+            del run_set
+            if pages:
+                del ingestion, cache
+
+
+def load_like_pages(paths, precision, workers, cache_mb=256):
+    """
+    Load a set of files like the pages do: submitted to a background ingestion with a run cache and combined once
+    they are all loaded.
+
+    :param paths: The list of paths of the files
+    :param precision: The precision of the power values
+    :param workers: The number of processes to load the files with, None for the pool shared by the sessions
+    :param cache_mb: The memory budget of the run cache in MiB
+    :return: The RunSet of the files, the Ingestion and the RunCache
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    from cache import RunCache
+    from ingest import Ingestion
+    from runset import RunSet
+
+    executor = None
+    if workers is not None:
+        executor = ThreadPoolExecutor(max_workers=1) if workers == 1 else ProcessPoolExecutor(max_workers=workers)
+    cache = RunCache(int(cache_mb * 2 ** 20))
+    ingestion = Ingestion(cache=cache, executor=executor)
+    ingestion.submit(paths)
+    while not ingestion.finished(paths):
+        ingestion.wait(paths)
+    run_set = RunSet(*ingestion.read_file_sets([paths], precision=precision)[0])
+    if executor is not None:
+        executor.shutdown()
+    return run_set, ingestion, cache
+
+
+def benchmark_suite(formats, rows_list, cores_list, file_counts, set_rows, jitter, duplicates, repeat, workers,
+                    output):
+    """
+    Time the stages of the pipeline on synthetic data and write the results to a JSON file. The per-file stages
+    (read_energy_csv, extract_df, read_channels_csv, extract_channels and remove_time_duplicates) run for each
+    format, row count and core count, the per-set stages (read_uploaded_files, the mean/std aggregation and
+    compare_sets) for each number of files.
+
+    :param formats: The list of formats to generate, "power" and/or "energy"
+    :param rows_list: The list of row counts of the per-file stages
+    :param cores_list: The list of core counts (column widths) of the per-file stages
+    :param file_counts: The list of numbers of files of the per-set stages
+    :param set_rows: The number of rows of each file of the per-set stages
+    :param jitter: The standard deviation of the sampling interval relative to the 100ms interval
+    :param duplicates: The fraction of samples that share the time bin of the previous sample
+    :param repeat: The number of times to run each stage, the fastest run is recorded
+    :param workers: The number of processes read_uploaded_files loads the files with, None for all CPU cores
+    :param output: The path to write the JSON results to
+    """
+    results = []
+
+    def record(stage, function, samples, **config):
+        # Run the stage repeatedly, keeping the fastest time and the highest traced peak memory
+        runs = [measure(function) for _ in range(repeat)]
+        seconds = min(duration for _, duration, _ in runs)
+        results.append({"stage": stage, **config, "jitter": jitter, "duplicates": duplicates,
+                        "seconds": seconds, "peak_bytes": max(peak for _, _, peak in runs),
+                        "samples_per_second": samples / seconds if seconds > 0 else None})
+        print(f"{stage:>22} {config}: {seconds:8.3f}s, traced peak {results[-1]['peak_bytes'] / 2 ** 20:8.1f} MiB",
+              flush=True)
+        return runs[0][0]
+
+    with tempfile.TemporaryDirectory() as directory:
+        for data_format in formats:
+            # The per-file stages for each row count and column width
+            for rows in rows_list:
+                for cores in cores_list:
+                    path = os.path.join(directory, "synthetic.csv")
+                    generate_energibridge_csv(path, rows, cores, data_format == "power", 0, jitter, duplicates)
+                    config = {"format": data_format, "rows": rows, "cores": cores, "files": 1}
+                    df = record("read_energy_csv", lambda: read_energy_csv(path), rows, **config)
+                    record("extract_df", lambda: extract_df(df), rows, **config)
+                    channels_df = record("read_channels_csv", lambda: read_channels_csv(path), rows, **config)
+                    record("extract_channels", lambda: extract_channels(channels_df), rows * cores, **config)
+
+                # Deduplicate synthetic cumulative times with the same jitter and duplicate rate
+                rng = np.random.default_rng(0)
+                deltas = np.maximum(0.1 * (1 + jitter * rng.standard_normal(rows)), 0.001)
+                deltas = np.where(rng.random(rows) < duplicates, 0.001, deltas)
+                time_values, power_values = np.cumsum(deltas), rng.uniform(5, 30, rows)
+                record("remove_time_duplicates", lambda: remove_time_duplicates(time_values, power_values), rows,
+                       format=data_format, rows=rows, cores=None, files=1)
+
+            # The per-set stages, the files are copies of a few distinct generated files to save generating time
+            for files in file_counts:
+                paths = []
+                for i in range(files):
+                    paths.append(os.path.join(directory, f"set_{data_format}_{i}.csv"))
+                    if i < DISTINCT_FILES:
+                        generate_energibridge_csv(paths[i], set_rows, 4, data_format == "power", i, jitter, duplicates)
+                    else:
+                        shutil.copyfile(paths[i % DISTINCT_FILES], paths[i])
+                config = {"format": data_format, "rows": set_rows, "cores": 4, "files": files}
+                power_df, _, total_energies, _, block = record(
+                    "read_uploaded_files", lambda: read_uploaded_files(paths, workers=workers), set_rows * files,
+                    **config)
+                record("mean_std", lambda: aligned_mean_std(power_df.to_numpy()), power_df.size, **config)
+
+                # Compare the interleaved halves of the set, so both sides have the size of half the set
+                pooled = block.pooled
+                record("compare_sets", lambda: compare_sets(pooled[::2], pooled[1::2], total_energies,
+                                                            total_energies), len(pooled), **config)
+
+    # Write the results with the environment they were measured in
+    with open(output, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    print(f"Results written to {output}")
+
+
+def page_imports(path):
+    """
+    Get the modules a page imports at its top level, which are imported before anything on the page renders.
+
+    :param path: The path of the page script
+    :return: The list of the names of the imported modules, in order
+    """
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return modules
+
+
+def import_times(modules, repeat=3):
+    """
+    Measure the import time of modules in a fresh interpreter with python -X importtime, importing them in order
+    so each module is only charged for what the modules before it did not import yet.
+
+    :param modules: The list of the names of the modules
+    :param repeat: The number of fresh interpreters to measure in, the fastest time of each module counts
+    :return: A dict with the import time in seconds of each module
+    """
+    times = dict.fromkeys(modules, float("inf"))
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+                                 capture_output=True, text=True, check=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)))
+
+        # The top level lines hold the cumulative time of the modules imported by the command itself, modules
+        # already imported by an earlier one do not appear and cost nothing
+        imported = {}
+        for line in process.stderr.splitlines():
+            fields = line.split("|")
+            if len(fields) == 3 and fields[2].startswith(" ") and not fields[2].startswith("  "):
+                imported[fields[2].strip()] = int(fields[1]) / 1e6 if fields[1].strip().isdigit() else 0.0
+        for module in modules:
+            times[module] = min(times[module], imported.get(module, 0.0))
+    return times
+
+
+def benchmark_startup(repeat, output):
+    """
+    Measure the cold start of the application: the time each page spends importing its top level modules before
+    anything renders, and the time of each module the pages defer when it is imported on its own.
+
+    :param repeat: The number of fresh interpreters to measure in, the fastest time of each module counts
+    :param output: The path to write the results to as JSON
+    """
+    directory = os.path.dirname(os.path.abspath(__file__))
+    pages = sorted(glob.glob(os.path.join(directory, "_*.py"))) + sorted(glob.glob(os.path.join(directory, "pages",
+                                                                                                 "*.py")))
+
+    # The top level imports of each page, in a fresh interpreter per page
+    results = []
+    for page in pages:
+        modules = page_imports(page)
+        times = import_times(modules, repeat)
+        name = os.path.splitext(os.path.basename(page))[0]
+        print(f"{name}: {sum(times.values()):.3f}s before rendering")
+        for module, seconds in times.items():
+            print(f"{seconds:12.3f}s {module}")
+        results.append({"stage": "page imports", "module": name, "seconds": sum(times.values())})
+
+    # The deferred modules, each in a fresh interpreter of its own
+    print("Deferred modules, imported on their own:")
+    for module in DEFERRED_MODULES:
+        seconds = import_times([module], repeat)[module]
+        print(f"{seconds:12.3f}s {module}")
+        results.append({"stage": "import", "module": module, "seconds": seconds})
+
+    # Write the results with the environment they were measured in
+    with open(output, "w") as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2)
+    print(f"Results written to {output}")
+
+
+def environment():
+    """
+    Describe the environment the benchmarks run in, so results of different versions and machines can be told
+    apart.
+
+    :return: A dict with the time, git commit, Python, platform, CPU count, library versions and parser version
+    """
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {"created": datetime.datetime.now().isoformat(timespec="seconds"), "commit": commit,
+            "python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "numpy": np.__version__, "pandas": pd.__version__, "scipy": scipy.__version__,
+            "parser_version": PARSER_VERSION}
+
+
+def compare_results(baseline_path, current_path, threshold):
+    """
+    Compare the results of two benchmark suite runs and print the change in time of each matching stage.
+
+    :param baseline_path: The path of the JSON results to compare against
+    :param current_path: The path of the JSON results to compare
+    :param threshold: The ratio of the current to the baseline time above which a stage is a regression
+    :return: Whether any stage regressed
+    """
+    def load(path):
+        with open(path) as f:
+            return {tuple((key, value) for key, value in result.items() if key in CONFIG_KEYS): result["seconds"]
+                    for result in json.load(f)["results"]}
+
+    baseline, current = load(baseline_path), load(current_path)
+    regressed = False
+    for key in sorted(baseline.keys() & current.keys(), key=str):
+        ratio = current[key] / baseline[key] if baseline[key] > 0 else float("inf")
+        regressed |= ratio > threshold
+        print(f"{'REGRESSION' if ratio > threshold else '':>10} {ratio:6.2f}x {baseline[key]:8.3f}s -> "
+              f"{current[key]:8.3f}s {dict(key)}")
+    return regressed
+
+
+def main():
+    """
+    Parse the command line arguments and run the selected benchmark.
+    """
+    parser = argparse.ArgumentParser(description="Benchmarks for the EnergiReporter data pipeline.")
+    benchmarks = parser.add_subparsers(dest="benchmark", required=True)
+
+    ingest = benchmarks.add_parser("ingest", help="Full versus column-pruned CSV ingestion of a wide file")
+    ingest.add_argument("--rows", type=int, default=100000, help="The number of rows of the synthetic file")
+    ingest.add_argument("--cores", type=int, default=64, help="The number of cores of the synthetic file")
+    ingest.add_argument("--power", action="store_true", help="Use a power column instead of an energy column")
+
+    suite = benchmarks.add_parser("suite", help="Time the pipeline stages on synthetic data and save the results")
+    suite.add_argument("--formats", nargs="+", choices=["power", "energy"], default=["power", "energy"],
+                       help="The formats of the synthetic files")
+    suite.add_argument("--rows", type=int, nargs="+", default=[1000, 100000],
+                       help="The row counts of the per-file stages, for example 1000 up to 10000000")
+    suite.add_argument("--cores", type=int, nargs="+", default=[4, 64],
+                       help="The core counts (column widths) of the per-file stages, for example 4 up to 256")
+    suite.add_argument("--files", type=int, nargs="+", default=[1, 10, 100],
+                       help="The numbers of files of the per-set stages, for example 1 up to 1000")
+    suite.add_argument("--set-rows", type=int, default=10000, help="The number of rows of the files of a set")
+    suite.add_argument("--jitter", type=float, default=0.1, help="The relative jitter of the sampling interval")
+    suite.add_argument("--duplicates", type=float, default=0.05,
+                       help="The fraction of samples sharing the time bin of the previous sample")
+    suite.add_argument("--repeat", type=int, default=1, help="The number of runs of each stage, the fastest counts")
+    suite.add_argument("--workers", type=int, help="The number of processes to load the files of a set with")
+    suite.add_argument("--output", default="benchmark_results.json", help="The path to write the results to")
+
+    memory = benchmarks.add_parser("memory", help="The memory used by a loaded set of files with each precision")
+    memory.add_argument("--files", type=int, default=100, help="The number of files of the set")
+    memory.add_argument("--rows", type=int, default=100000, help="The number of rows of each file")
+    memory.add_argument("--precisions", nargs="+", choices=PRECISIONS, default=PRECISIONS,
+                        help="The precisions of the power values to load the set with")
+    memory.add_argument("--workers", type=int, help="The number of processes to load the files with")
+    memory.add_argument("--pages", action="store_true",
+                        help="Load the set like the pages do, in the background with a run cache")
+    memory.add_argument("--cache-mb", type=float, default=256,
+                        help="The memory budget of the run cache in MiB when loading like the pages (default 256)")
+
+    startup = benchmarks.add_parser("startup", help="Time the imports of the pages before they render and of the "
+                                                    "modules they defer")
+    startup.add_argument("--repeat", type=int, default=3,
+                         help="The number of fresh interpreters to measure in, the fastest counts")
+    startup.add_argument("--output", default="startup_results.json", help="The path to write the results to")
+
+    compare = benchmarks.add_parser("compare", help="Compare the results of two suite runs")
+    compare.add_argument("baseline", help="The results to compare against")
+    compare.add_argument("current", help="The results to compare")
+    compare.add_argument("--threshold", type=float, default=1.2,
+                         help="The slowdown ratio above which a stage is reported as a regression")
+
+    args = parser.parse_args()
+    if args.benchmark == "ingest":
+        benchmark_ingest(args.rows, args.cores, args.power)
+    elif args.benchmark == "suite":
+        benchmark_suite(args.formats, args.rows, args.cores, args.files, args.set_rows, args.jitter, args.duplicates,
+                        args.repeat, args.workers, args.output)
+    elif args.benchmark == "memory":
+        benchmark_memory(args.files, args.rows, args.precisions, args.workers, args.pages, args.cache_mb)
+    elif args.benchmark == "startup":
+        benchmark_startup(args.repeat, args.output)
+    elif args.benchmark == "compare" and compare_results(args.baseline, args.current, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+import base64
+import datetime
+import html
+import io
+import json
+
+import numpy as np
+import pandas as pd
+
+from downsampling import downsample_frame
+from reader import POWER, TIME
+from utils import to_json
+
+# The file extension and the format name identifying a bundle, and the version of the format
+BUNDLE_EXTENSION = ".erbundle"
+BUNDLE_FORMAT = "energireporter-bundle"
+FORMAT_VERSION = 1
+
+# The kinds of reports a bundle can hold
+KINDS = ["analysis", "comparison"]
+
+# The colors of the sets in the charts of the pages and the HTML report
+SET_COLORS = ["#1f77b4", "#ff7f0e", "#2ca02c", "#d62728", "#9467bd", "#8c564b", "#e377c2", "#7f7f7f", "#bcbd22",
+              "#17becf"]
+
+
+def set_bundle(name, run_set, orv=3, total_name="Total"):
+    """
+    Collect everything the report shows of a set of runs: the downsampled mean and error band chart data, the
+    totals of each run, the normality and distribution tables and the violin densities.
+
+    :param name: The name of the set
+    :param run_set: The RunSet of the set
+    :param orv: The number of standard deviations to keep included in the distribution statistics
+    :param total_name: The name of all the runs combined in the tables and violin charts
+    :return: The dict with the precomputed report of the set
+    """
+    names = run_set.names + [total_name]
+
+    # The mean chart and, with multiple runs, the error band chart data, at the resolution of the charts
+    mean_tdf = downsample_frame(run_set.mean_df.reset_index(), TIME, POWER)
+    errorband = None
+    if not run_set.single:
+        std_df = downsample_frame(run_set.std_df, TIME, "MEAN")
+        errorband = {"time": std_df[TIME].to_numpy(), "mean": std_df["MEAN"].to_numpy(),
+                     "std": std_df["STD"].to_numpy()}
+
+    # The tables and violins of the outlier removed values, all memoized in the run set
+    p_values, tests = zip(*run_set.normality_tests(orv))
+    return {"name": name,
+            "files": run_set.names,
+            "outlier_removal": orv,
+            "total_energies": run_set.total_energies,
+            "mean": {"time": mean_tdf[TIME].to_numpy(), "power": mean_tdf[POWER].to_numpy()},
+            "errorband": errorband,
+            "summary": run_set.summary.to_dict("list"),
+            "normality": {"FILE": names, "NORMAL": [str(p_value > 0.05) for p_value in p_values],
+                          "P-VALUE": list(p_values), "TEST": list(tests)},
+            "distribution": run_set.distribution_summary(orv, names).to_dict("list"),
+            "violins": {"names": names, "stats": run_set.violin_stats(orv)}}
+
+
+def build_bundle(set_names, run_sets, orvs=3, correction="holm", total_names=None):
+    """
+    Build the bundle of a finished analysis of one set, or comparison of multiple sets, with all the results
+    precomputed so it can be shown again without the files. The results already computed for the pages are
+    reused from the run sets.
+
+    :param set_names: The names of the sets
+    :param run_sets: The list of RunSets of the sets
+    :param orvs: The outlier removal value of each set, or one for all the sets
+    :param correction: The multiple comparison correction of the pairwise comparison of more than two sets
+    :param total_names: The name of all the runs combined of each set, None for "Total"
+    :return: The dict of the bundle
+    """
+    from comparison import compare_many, compare_sets
+
+    orvs = orvs if isinstance(orvs, (list, tuple)) else [orvs] * len(run_sets)
+    total_names = total_names or ["Total"] * len(run_sets)
+    bundle = {"format": BUNDLE_FORMAT,
+              "version": FORMAT_VERSION,
+              "kind": "analysis" if len(run_sets) == 1 else "comparison",
+              "created": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+              "sets": [set_bundle(*set_args) for set_args in zip(set_names, run_sets, orvs, total_names)]}
+
+    # The comparison of two sets, or the corrected pairwise comparison of more sets, memoized like the pages do
+    if len(run_sets) == 2:
+        run_set1, run_set2 = run_sets
+        bundle["comparison"] = run_set1.memoize(("comparison", run_set2),
+                                                lambda: compare_sets(run_set1.pooled, run_set2.pooled,
+                                                                     run_set1.total_energies,
+                                                                     run_set2.total_energies))
+    elif len(run_sets) > 2:
+        bundle["pairwise"] = {"correction": correction,
+                              **run_sets[0].memoize(("pairwise", tuple(run_sets[1:]), correction),
+                                                    lambda: compare_many([run_set.pooled for run_set in run_sets],
+                                                                         correction))}
+    return bundle
+
+
+def write_bundle(bundle):
+    """
+    :param bundle: The dict of the bundle
+    :return: The bytes of the bundle file, compact JSON with NaN values as null
+    """
+    return json.dumps(to_json(bundle), separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+def read_bundle(data):
+    """
+    Read a bundle file, restoring the arrays of the chart data, violins and pairwise comparison. The fields shown
+    as text are checked, so a bundle from elsewhere cannot put markup in the HTML report.
+
+    :param data: The bytes of the bundle file
+    :return: The dict of the bundle
+    """
+    try:
+        bundle = json.loads(data)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise ValueError("The file is not an EnergiReporter bundle")
+    if not isinstance(bundle, dict) or bundle.get("format") != BUNDLE_FORMAT:
+        raise ValueError("The file is not an EnergiReporter bundle")
+    version = bundle.get("version")
+    if not _is_number(version) or version != int(version):
+        raise ValueError("The bundle has no valid format version")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"The bundle format version {version} is not supported")
+    if bundle.get("kind") not in KINDS:
+        raise ValueError(f"Unknown bundle report kind: {bundle.get('kind')!r}")
+    if not isinstance(bundle.get("created"), str):
+        raise ValueError("The bundle has no creation time")
+    if not isinstance(bundle.get("sets"), list) or not bundle["sets"]:
+        raise ValueError("The bundle has no sets")
+    for set_data in bundle["sets"]:
+        if not isinstance(set_data, dict) or not isinstance(set_data.get("name"), str):
+            raise ValueError("A set of the bundle has no name")
+        if not _is_number(set_data.get("outlier_removal")):
+            raise ValueError(f"The set {set_data['name']} has no valid outlier removal value")
+    pairwise = bundle.get("pairwise", {"correction": ""})
+    if not isinstance(pairwise, dict) or not isinstance(pairwise.get("correction"), str):
+        raise ValueError("The pairwise comparison of the bundle has no correction")
+
+    # JSON has no NaN, the missing values were written as null
+    try:
+        for set_data in bundle["sets"]:
+            set_data["mean"] = {key: _floats(values) for key, values in set_data["mean"].items()}
+            if set_data["errorband"] is not None:
+                set_data["errorband"] = {key: _floats(values) for key, values in set_data["errorband"].items()}
+            set_data["violins"]["stats"] = [{key: _floats(value) for key, value in stats.items()}
+                                            for stats in set_data["violins"]["stats"]]
+        if "pairwise" in bundle:
+            bundle["pairwise"] = {key: value if key == "correction" else _floats(value)
+                                  for key, value in bundle["pairwise"].items()}
+    except (KeyError, TypeError, AttributeError, ValueError):
+        raise ValueError("The bundle is incomplete")
+    return bundle
+
+
+def _is_number(value):
+    """
+    :param value: A value read from JSON
+    :return: Whether the value is a finite number, booleans not counting as numbers
+    """
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and np.isfinite(value)
+
+
+def _floats(value):
+    """
+    :param value: A number or (nested) list of numbers, with null for NaN
+    :return: The float or float array of the value
+    """
+    if isinstance(value, list):
+        return np.array(value, dtype=np.float64)
+    return np.nan if value is None else float(value)
+
+
+def resampling_table(comparison):
+    """
+    :param comparison: The results of comparison.compare_sets
+    :return: The DataFrame of the differences between two sets with their confidence intervals and permutation tests
+    """
+    return pd.DataFrame(data={
+        "MEASURE": ["Mean power (W)", "Mean total energy (J)"],
+        "DIFFERENCE": [comparison["power_difference"], comparison["energy_difference"]],
+        "95% CI LOW": [comparison["power_bootstrap"][0], comparison["energy_bootstrap"][0]],
+        "95% CI HIGH": [comparison["power_bootstrap"][1], comparison["energy_bootstrap"][1]],
+        "PERMUTATION P-VALUE": [comparison["power_permutation"], comparison["energy_permutation"]]})
+
+
+def pairwise_table(set_names, pairwise):
+    """
+    :param set_names: The names of the sets
+    :param pairwise: The results of comparison.compare_many
+    :return: The DataFrame of the tests of all the pairs of sets, with the corrected p-values
+    """
+    upper = [(i, j) for i in range(len(set_names)) for j in range(i + 1, len(set_names))]
+    return pd.DataFrame(data={
+        "SET": [set_names[i] for i, _ in upper],
+        "COMPARED TO": [set_names[j] for _, j in upper],
+        "MEAN DIFFERENCE (W)": [pairwise["mean_difference"][i, j] for i, j in upper],
+        "WELCH P-VALUE": [pairwise["welch_adjusted"][i, j] for i, j in upper],
+        "MANNWHITNEYU P-VALUE": [pairwise["mannwhitneyu_adjusted"][i, j] for i, j in upper],
+        "HIGHER (%)": [pairwise["higher"][i, j] for i, j in upper],
+        "CLIFF'S DELTA": [pairwise["cliffs_delta"][i, j] for i, j in upper],
+        "SIGNIFICANT": [str(pairwise["welch_adjusted"][i, j] < 0.05 and pairwise["mannwhitneyu_adjusted"][i, j] < 0.05)
+                        for i, j in upper]})
+
+
+def bundle_html(bundle):
+    """
+    Render a bundle as a static, self-contained HTML report, with the charts embedded as images.
+
+    :param bundle: The dict of the bundle, as built or read
+    :return: The HTML text of the report
+    """
+    from distributions import violin_figure
+
+    title = f"EnergiReporter data {html.escape(bundle['kind'])}"
+    sets = bundle["sets"]
+    parts = [f"<h1>{title}</h1>", f"<p>Created {html.escape(bundle['created'])}</p>",
+             "<h2>Power consumption over time</h2>", _image(mean_figure(sets))]
+
+    # The totals, tables and violins of each set
+    for set_data in sets:
+        summary = pd.DataFrame(set_data["summary"])
+        parts += [f"<h2>{html.escape(set_data['name'])}</h2>",
+                  f"<p>Average total energy usage: {np.mean(set_data['total_energies']):.2f}J</p>",
+                  _table(summary),
+                  f"<h3>Data distribution of power (outlier removal "
+                  f"{html.escape(str(set_data['outlier_removal']))})</h3>",
+                  _table(pd.DataFrame(set_data["normality"])), _table(pd.DataFrame(set_data["distribution"])),
+                  _image(violin_figure(set_data["violins"]["names"], bundle_violin_stats(set_data)))]
+
+    # The statistical comparison of the sets
+    if "comparison" in bundle:
+        comparison = bundle["comparison"]
+        parts += ["<h2>Comparing the data with statistical analysis</h2>",
+                  _table(pd.DataFrame(data={"TEST": ["Welch's t-test p-value", "MannWhitneyU-test p-value",
+                                                     "Percentage of Pairs (%)", "Cohen's d", "Cliff's delta"],
+                                            "VALUE": [comparison["welch"], comparison["mannwhitneyu"],
+                                                      comparison["higher"], comparison["cohens_d"],
+                                                      comparison["cliffs_delta"]]})),
+                  _table(resampling_table(comparison))]
+    if "pairwise" in bundle:
+        parts += ["<h2>Comparing all pairs of sets with statistical analysis</h2>",
+                  f"<p>The p-values are corrected with the {html.escape(bundle['pairwise']['correction'])} "
+                  f"correction.</p>",
+                  _table(pairwise_table([set_data["name"] for set_data in sets], bundle["pairwise"]))]
+
+    style = ("body{font-family:sans-serif;max-width:960px;margin:auto;padding:1em}"
+             "table{border-collapse:collapse;margin:1em 0}td,th{border:1px solid #ddd;padding:4px 8px}"
+             "img{max-width:100%}")
+    return (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>{title}</title><style>{style}</style>"
+            f"</head><body>{''.join(parts)}</body></html>")
+
+
+def mean_figure(sets):
+    """
+    Create the chart of the mean power of each set over time, with the std error band of the sets with multiple
+    runs, rendered as an image.
+
+    :param sets: The list of set dicts of a bundle
+    :return: The PNG image bytes of the chart
+    """
+    import matplotlib.pyplot as plt
+
+    figure, axes = plt.subplots(figsize=(10, 4))
+    for set_data, color in zip(sets, SET_COLORS):
+        axes.plot(set_data["mean"]["time"], set_data["mean"]["power"], color=color, linewidth=1,
+                  label=set_data["name"])
+        errorband = set_data["errorband"]
+        if errorband is not None:
+            axes.fill_between(errorband["time"], errorband["mean"] - errorband["std"],
+                              errorband["mean"] + errorband["std"], color=color, alpha=0.2, linewidth=0)
+    axes.set_xlabel(TIME)
+    axes.set_ylabel(POWER)
+    if len(sets) > 1:
+        axes.legend()
+
+    image = io.BytesIO()
+    figure.savefig(image, format="png", bbox_inches="tight")
+    plt.close(figure)
+    return image.getvalue()
+
+
+def category_colors(set_names):
+    """
+    :param set_names: The names of the sets
+    :return: The category colors encoding of the sets for the compare plots
+    """
+    import altair as alt
+
+    return alt.Color("Set:N", scale=alt.Scale(domain=set_names, range=SET_COLORS[:len(set_names)]))
+
+
+def mean_chart(means_df, colors):
+    """
+    :param means_df: The DataFrame of the mean power of the sets over time, with the set of each row in "Set"
+    :param colors: The category colors encoding of the sets
+    :return: The line chart of the mean power of each set
+    """
+    import altair as alt
+
+    return alt.Chart(means_df).mark_line().encode(x=TIME, y=POWER, color=colors, tooltip=["Set", POWER])
+
+
+def errorband_chart(means_df, bands_df, error, colors):
+    """
+    :param means_df: The DataFrame of the mean power of the sets over time, with the set of each row in "Set"
+    :param bands_df: The DataFrame of the mean ("MEAN") and error of the sets over time, with the set in "Set"
+    :param error: The column of the error to draw the bands of, "STD" or "CONF"
+    :param colors: The category colors encoding of the sets
+    :return: The chart of the mean power of each set with its error band
+    """
+    import altair as alt
+
+    return (mean_chart(means_df, colors).interactive() +
+            alt.Chart(bands_df).mark_errorband(extent="ci")
+            .encode(x=TIME, y=alt.Y("MEAN", title=POWER), yError=error, color="Set:N"))
+
+
+def bundle_violin_stats(set_data):
+    """
+    :param set_data: The set dict of a bundle
+    :return: The violin statistics of the set with arrays, as violin_figure draws them
+    """
+    return [{key: np.atleast_1d(np.asarray(value, dtype=np.float64)) if key in ("coords", "vals") else value
+             for key, value in stats.items()} for stats in set_data["violins"]["stats"]]
+
+
+def _table(df):
+    """
+    :param df: The DataFrame
+    :return: The HTML table of the DataFrame
+    """
+    return df.to_html(index=False, float_format=lambda value: f"{value:.4g}", na_rep="", border=0)
+
+
+def _image(image):
+    """
+    :param image: The PNG image bytes
+    :return: The HTML image element with the image embedded
+    """
+    return f"<img src=\"data:image/png;base64,{base64.b64encode(image).decode('ascii')}\">"
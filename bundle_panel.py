@@ -0,0 +1,32 @@
+import streamlit as st
+
+from help_texts import help_text_export
+
+
+def show_export(run_set, inputs, build, file_stem):
+    """
+    Show the export of a finished report as a bundle to reopen in the application and as a static HTML report.
+    They are only built when the export is turned on, once per value of the inputs of the report, memoized in
+    the run set.
+
+    :param run_set: The run set to memoize the export in
+    :param inputs: The tuple of the values of the inputs the report depends on, such as the outlier removal
+    :param build: The function without arguments building the bundle (see bundle.build_bundle)
+    :param file_stem: The name of the downloaded files without their extension
+    """
+    st.subheader("Export the report")
+    if not st.toggle("Prepare a shareable report", help=help_text_export):
+        return
+
+    from bundle import BUNDLE_EXTENSION, bundle_html, write_bundle
+
+    def export():
+        bundle = build()
+        return write_bundle(bundle), bundle_html(bundle)
+
+    data, page = run_set.memoize(("export",) + inputs, export)
+    columns = st.columns(2)
+    columns[0].download_button("Download report bundle", data, file_name=f"{file_stem}{BUNDLE_EXTENSION}",
+                               mime="application/json", use_container_width=True)
+    columns[1].download_button("Download HTML report", page, file_name=f"{file_stem}.html", mime="text/html",
+                               use_container_width=True)
@@ -0,0 +1,188 @@
+from collections import OrderedDict
+import hashlib
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+from reader import POWER, TIME, run_frame
+
+# The default memory budget of the cache and the environment variables to configure it with
+DEFAULT_MAX_BYTES = 256 * 2 ** 20
+MAX_MB_ENV = "ENERGIREPORTER_CACHE_MB"
+DIRECTORY_ENV = "ENERGIREPORTER_CACHE_DIR"
+
+
+class RunCache:
+    """
+    A content-addressed cache of loaded runs, keyed on a hash of the file bytes and the parser settings.
+    The runs are kept in memory within a memory budget, evicting the least recently used runs first, and
+    optionally also on disk so repeated uploads across sessions do not have to be parsed again.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, directory=None):
+        """
+        :param max_bytes: The memory budget of the in-memory runs in bytes
+        :param directory: The directory of the on-disk tier, None to only cache in memory
+        """
+        self.max_bytes = max_bytes
+        self.directory = directory
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._runs = OrderedDict()
+        self._lock = threading.Lock()
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(data, version, bin_width):
+        """
+        Get the cache key of a file from its bytes and the parser settings.
+
+        :param data: The bytes of the file, or an iterable of consecutive blocks of its bytes so large files do not
+        have to be read into memory at once
+        :param version: The version of the parser, so runs of an older parser are not reused
+        :param bin_width: The width of the time bins the run is de-duplicated with
+        :return: The cache key
+        """
+        digest = hashlib.sha256()
+        for block in [data] if isinstance(data, bytes) else data:
+            digest.update(block)
+        return f"{digest.hexdigest()}-v{version}-{bin_width!r}"
+
+    def get(self, key):
+        """
+        Get a run from the cache, from memory or else from disk.
+
+        :param key: The cache key of the run
+        :return: The (time-power DataFrame, total energy) tuple of the run, or None if it is not cached
+        """
+        with self._lock:
+            # Look in memory first, marking the run as most recently used
+            if key in self._runs:
+                self._runs.move_to_end(key)
+                self.hits += 1
+                return self._runs[key]
+
+        # Then look on disk, adding the run to memory if it is found
+        run = self._read(key)
+        with self._lock:
+            if run is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+        self._store(key, run)
+        return run
+
+    def put(self, key, run):
+        """
+        Add a run to the cache, in memory and on disk when the disk tier is used.
+
+        :param key: The cache key of the run
+        :param run: The (time-power DataFrame, total energy) tuple of the run
+        """
+        self._store(key, run)
+        self._write(key, run)
+
+    def stats(self):
+        """
+        Get the counters of the cache.
+
+        :return: A dict with the hits, disk hits, misses, evictions, number of runs, and memory size in bytes
+        """
+        with self._lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "evictions": self.evictions, "runs": len(self._runs), "bytes": self.size}
+
+    def clear(self):
+        """
+        Remove all the runs from memory, the on-disk tier is kept.
+        """
+        with self._lock:
+            self._runs.clear()
+            self.size = 0
+
+    def _store(self, key, run):
+        """
+        Add a run to memory and evict the least recently used runs until it fits the memory budget.
+
+        :param key: The cache key of the run
+        :param run: The (time-power DataFrame, total energy) tuple of the run
+        """
+        run_size = int(run[0].memory_usage(index=True).sum())
+        with self._lock:
+            if key in self._runs:
+                self._runs.move_to_end(key)
+                return
+            if run_size > self.max_bytes:
+                return
+
+            self._runs[key] = run
+            self.size += run_size
+            while self.size > self.max_bytes:
+                _, (evicted_tdf, _) = self._runs.popitem(last=False)
+                self.size -= int(evicted_tdf.memory_usage(index=True).sum())
+                self.evictions += 1
+
+    def _path(self, key):
+        """
+        :param key: The cache key of the run
+        :return: The path of the run in the on-disk tier
+        """
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def _read(self, key):
+        """
+        Read a run from the on-disk tier.
+
+        :param key: The cache key of the run
+        :return: The (time-power DataFrame, total energy) tuple of the run, or None if it is not on disk
+        """
+        if self.directory is None or not os.path.exists(self._path(key)):
+            return None
+        try:
+            with np.load(self._path(key)) as data:
+                return run_frame(data["time"], data["power"]), float(data["total_energy"])
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _write(self, key, run):
+        """
+        Write a run to the on-disk tier, through a temporary file so partially written runs are never read.
+
+        :param key: The cache key of the run
+        :param run: The (time-power DataFrame, total energy) tuple of the run
+        """
+        if self.directory is None:
+            return
+        power_tdf, total_energy = run
+        fd, temporary_path = tempfile.mkstemp(dir=self.directory, suffix=".npz")
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, time=power_tdf[TIME].to_numpy(), power=power_tdf[POWER].to_numpy(),
+                     total_energy=total_energy)
+        os.replace(temporary_path, self._path(key))
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def default_run_cache():
+    """
+    Get the run cache shared by all the sessions, configured with the ENERGIREPORTER_CACHE_MB memory budget
+    and the ENERGIREPORTER_CACHE_DIR on-disk tier directory environment variables.
+
+    :return: The shared run cache
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            max_mb = os.environ.get(MAX_MB_ENV)
+            max_bytes = int(float(max_mb) * 2 ** 20) if max_mb else DEFAULT_MAX_BYTES
+            _default_cache = RunCache(max_bytes, os.environ.get(DIRECTORY_ENV))
+        return _default_cache
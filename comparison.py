@@ -0,0 +1,422 @@
+import numpy as np
+
+from power_statistics import Moments
+
+# The number of resamples of the permutation and bootstrap tests, and the maximum number of bins to resample
+N_RESAMPLES = 1000
+MAX_BINS = 4096
+
+# The largest combined size of two sets whose MannWhitneyU-test is left to scipy, which may use the exact
+# distribution for small sets, larger sets use the normal approximation computed from the rank counts
+SCIPY_MAX_SAMPLES = 4096
+
+# The number of resampled bin counts to hold in memory at once
+BATCH_CELLS = 2 ** 22
+
+# The multiple comparison corrections of the pairwise comparison of many sets
+CORRECTIONS = ["holm", "bonferroni", "fdr_bh", "none"]
+
+
+def compare_sets(data1, data2, energies1, energies2, n_resamples=N_RESAMPLES, seed=0, weights=None, moments=None):
+    """
+    Perform the statistical tests comparing the power and total energy of two sets. The power values can also be
+    given binned, as the value of each bin with its count as weight, and the moments of the values themselves.
+
+    :param data1: The array of power values of the first set
+    :param data2: The array of power values of the second set
+    :param energies1: The total energy of each run of the first set
+    :param energies2: The total energy of each run of the second set
+    :param n_resamples: The number of resamples of the permutation and bootstrap tests
+    :param seed: The seed of the resampling
+    :param weights: The arrays of the count of each power value of both sets, None for all 1
+    :param moments: The Moments of the power values of both sets, None to compute them from the values
+    :return: A dict with the test results: the Welch's t-test (welch) and MannWhitneyU-test (mannwhitneyu)
+    p-values, the Percentage of Pairs result (higher), the differences in mean power and mean total energy with
+    their permutation test p-values and bootstrap 95% confidence intervals, and the effect sizes
+    """
+    from scipy import stats
+
+    data1 = np.asarray(data1, dtype=np.float64)
+    data2 = np.asarray(data2, dtype=np.float64)
+    weights1, weights2 = weights or (None, None)
+    moments1, moments2 = moments or (Moments.from_values(data1, weights1), Moments.from_values(data2, weights2))
+    mean1, mean2 = (moments.mean if moments.count else np.nan for moments in (moments1, moments2))
+    rng = np.random.default_rng(seed)
+
+    # The classic tests and the comparison of all pairs
+    higher, lower, mannwhitneyu = rank_comparison(data1, data2, weights1, weights2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        welch = stats.ttest_ind_from_stats(mean1, moments1.std, moments1.count, mean2, moments2.std, moments2.count,
+                                           equal_var=False).pvalue
+    results = {"welch": welch,
+               "mannwhitneyu": mannwhitneyu,
+               "higher": round(100 * higher, 2),
+               "cohens_d": cohens_d(moments1, moments2),
+               "cliffs_delta": higher - lower}
+
+    # The resampling tests of the mean power, on the values binned into a bounded number of bins
+    values, counts1, counts2 = shared_bins(data1, data2, weights1=weights1, weights2=weights2)
+    results["power_difference"] = mean1 - mean2
+    results["power_permutation"] = permutation_pvalue(values, counts1, counts2, results["power_difference"],
+                                                      n_resamples, rng)
+    results["power_bootstrap"] = bootstrap_interval(values, counts1, counts2, results["power_difference"],
+                                                    n_resamples, rng)
+
+    # The resampling tests of the mean total energy of the runs
+    values, counts1, counts2 = shared_bins(np.asarray(energies1, dtype=np.float64),
+                                           np.asarray(energies2, dtype=np.float64))
+    results["energy_difference"] = np.mean(energies1) - np.mean(energies2)
+    results["energy_permutation"] = permutation_pvalue(values, counts1, counts2, results["energy_difference"],
+                                                       n_resamples, rng)
+    results["energy_bootstrap"] = bootstrap_interval(values, counts1, counts2, results["energy_difference"],
+                                                     n_resamples, rng)
+    return results
+
+
+def rank_comparison(data1, data2, weights1=None, weights2=None):
+    """
+    Compare all pairs of a value of the first and of the second set by counting ranks in the sorted sets instead
+    of comparing each pair. The counts give the MannWhitneyU-test, computed like scipy.stats.mannwhitneyu with
+    the asymptotic method, which scipy itself uses for large sets.
+
+    :param data1: The array of values of the first set
+    :param data2: The array of values of the second set
+    :param weights1: The array of the count of each value of the first set, None for all 1
+    :param weights2: The array of the count of each value of the second set, None for all 1
+    :return: The fraction of the pairs where the first value is higher, where it is lower, and the two-sided
+    MannWhitneyU-test p-value
+    """
+    from scipy import stats
+
+    n1, n2 = (len(data1), len(data2)) if weights1 is None else (np.sum(weights1), np.sum(weights2))
+    if n1 == 0 or n2 == 0:
+        return np.nan, np.nan, np.nan
+
+    # Counted values are repeated for scipy when there are few, otherwise their ranks are counted in one pass
+    if weights1 is not None:
+        if n1 + n2 <= SCIPY_MAX_SAMPLES:
+            return rank_comparison(np.repeat(data1, weights1), np.repeat(data2, weights2))
+        below, _, tie_terms = pair_counts([data1, data2], [weights1, weights2])
+        pairs = float(n1) * n2
+        p_value = float(_mannwhitneyu_pvalue(below[0, 1], below[1, 0], pairs, n1 + n2, tie_terms[0, 1]))
+        return below[0, 1] / pairs, below[1, 0] / pairs, p_value
+
+    # Count the values of the second set below and at or below each value of the first set, in sorted order
+    sorted1, sorted2 = np.sort(data1), np.sort(data2)
+    pairs = n1 * n2
+    higher = np.searchsorted(sorted2, sorted1, side="left").sum()
+    lower = pairs - np.searchsorted(sorted2, sorted1, side="right").sum()
+
+    # Small sets use scipy, which may use the exact distribution for them
+    if n1 + n2 <= SCIPY_MAX_SAMPLES:
+        return higher / pairs, lower / pairs, stats.mannwhitneyu(data1, data2, alternative="two-sided").pvalue
+
+    # The tie correction from the lengths of the runs of equal values in the sorted pooled values
+    pooled = np.concatenate((sorted1, sorted2))
+    pooled.sort(kind="mergesort")
+    ties = np.diff(np.concatenate(([0], np.flatnonzero(np.diff(pooled)) + 1, [n1 + n2]))).astype(np.float64)
+    p_value = float(_mannwhitneyu_pvalue(higher, lower, pairs, n1 + n2, (ties ** 3 - ties).sum()))
+    return higher / pairs, lower / pairs, p_value
+
+
+def cohens_d(moments1, moments2):
+    """
+    Calculate Cohen's d, the difference in mean divided by the pooled standard deviation.
+
+    :param moments1: The Moments of the values of the first set
+    :param moments2: The Moments of the values of the second set
+    :return: The effect size, NaN if there is no spread
+    """
+    n1, n2 = moments1.count, moments2.count
+    if n1 == 0 or n2 == 0 or n1 + n2 < 3:
+        return np.nan
+    pooled_var = (moments1.m2 + moments2.m2) / (n1 + n2 - 2)
+    return (moments1.mean - moments2.mean) / np.sqrt(pooled_var) if pooled_var > 0 else np.nan
+
+
+def compare_many(datasets, correction="holm", weights=None, moments=None):
+    """
+    Compare every pair of many sets with Welch's t-test, the MannWhitneyU-test and the Percentage of Pairs test.
+    All the sets are sorted together once and the rank counts of every pair are summed in one pass over the sorted
+    values (see pair_counts), so the cost grows with the number of sets times the number of values instead of with
+    the number of pairs times the number of values. Like for compare_sets, the values can also be given binned.
+
+    :param datasets: The list of arrays of power values of the sets
+    :param correction: The multiple comparison correction of the p-values over all the pairs, one of CORRECTIONS
+    :param weights: The list of arrays of the count of each power value of the sets, None for all 1
+    :param moments: The list of Moments of the power values of the sets, None to compute them from the values
+    :return: A dict of square matrices with a row and a column per set, for each pair of the row compared to the
+    column set: the Welch's t-test (welch) and MannWhitneyU-test (mannwhitneyu) p-values and their corrected
+    versions (welch_adjusted, mannwhitneyu_adjusted), the percentage of pairs where the row set is higher
+    (higher), Cliff's delta (cliffs_delta) and the difference in mean (mean_difference)
+    """
+    from scipy import stats
+
+    if correction not in CORRECTIONS:
+        raise ValueError(f"Unknown multiple comparison correction: {correction}")
+    datasets = [np.asarray(data, dtype=np.float64) for data in datasets]
+    k = len(datasets)
+    moments = moments or [Moments.from_values(data, None if weights is None else weights[i])
+                          for i, data in enumerate(datasets)]
+    sizes = np.array([set_moments.count for set_moments in moments], dtype=np.float64)
+    means = np.array([set_moments.mean if set_moments.count else np.nan for set_moments in moments])
+    stds = np.array([set_moments.std for set_moments in moments])
+
+    # The pairs where the row set is higher, where it is lower, and the MannWhitneyU-test of every pair
+    below, tied, tie_terms = pair_counts(datasets, weights)
+    pairs = np.outer(sizes, sizes)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        higher = below / pairs
+        lower = below.T / pairs
+        mannwhitneyu = _mannwhitneyu_pvalue(below, below.T, pairs, sizes[:, None] + sizes[None, :], tie_terms)
+
+    # Small pairs use scipy, which may use the exact distribution for them, like rank_comparison
+    for i in range(k):
+        for j in range(i + 1, k):
+            if 0 < sizes[i] and 0 < sizes[j] and sizes[i] + sizes[j] <= SCIPY_MAX_SAMPLES:
+                data1, data2 = ((datasets[i], datasets[j]) if weights is None else
+                                (np.repeat(datasets[i], weights[i]), np.repeat(datasets[j], weights[j])))
+                mannwhitneyu[i, j] = mannwhitneyu[j, i] = stats.mannwhitneyu(data1, data2,
+                                                                             alternative="two-sided").pvalue
+    mannwhitneyu[(sizes[:, None] == 0) | (sizes[None, :] == 0)] = np.nan
+
+    # Welch's t-test of all pairs at once from the means and standard deviations of the sets
+    with np.errstate(divide="ignore", invalid="ignore"):
+        welch = stats.ttest_ind_from_stats(means[:, None], stds[:, None], sizes[:, None], means[None, :],
+                                           stds[None, :], sizes[None, :], equal_var=False).pvalue
+
+    # Correct the p-values for comparing all the pairs, the diagonal compares a set with itself
+    results = {"welch": welch, "mannwhitneyu": mannwhitneyu}
+    upper = np.triu_indices(k, 1)
+    for test in ("welch", "mannwhitneyu"):
+        np.fill_diagonal(results[test], np.nan)
+        adjusted = np.full((k, k), np.nan)
+        adjusted[upper] = adjust_pvalues(results[test][upper], correction)
+        results[f"{test}_adjusted"] = np.fmin(adjusted, adjusted.T)
+    results["higher"] = np.round(100 * higher, 2)
+    results["cliffs_delta"] = higher - lower
+    results["mean_difference"] = means[:, None] - means[None, :]
+    for measure in ("higher", "cliffs_delta", "mean_difference"):
+        np.fill_diagonal(results[measure], np.nan)
+    return results
+
+
+def pair_counts(datasets, weights=None):
+    """
+    Count for every pair of sets the pairs of values where the value of the row set is higher and where both are
+    tied, with the tie term of the MannWhitneyU-test of the pair. The values of all the sets are sorted together
+    once, then for each set a running count of its values gives the number of them below every value, which is
+    summed per set of the values. The cost is one sort and a few passes over all the values per set.
+
+    For a run of equal values with a values of the row and b of the column set, the tie term of the pair, the sum
+    of t^3 - t with t = a + b, expands into the tie terms of both sets on their own and the cross term
+    3a^2b + 3ab^2, which are summed over the values in runs of more than one value only.
+
+    :param datasets: The list of arrays of values of the sets
+    :param weights: The list of arrays of the count of each value of the sets, None for all 1
+    :return: The square matrices of the number of pairs where the row set is higher, where both are tied, and of
+    the tie terms of the pairs, the diagonal is not meaningful
+    """
+    k = len(datasets)
+    below, tied, squares = np.zeros((k, k)), np.zeros((k, k)), np.zeros((k, k))
+    if sum(len(data) for data in datasets) == 0:
+        return below, tied, np.zeros((k, k))
+
+    # Sort the values of all the sets together with the set and count of each value, sorting each set of values
+    # first so the stable sort only has to merge them
+    pooled = np.concatenate([np.sort(data) for data in datasets] if weights is None else datasets)
+    order = np.argsort(pooled, kind="stable")
+    pooled, labels = pooled[order], np.repeat(np.arange(k), [len(data) for data in datasets])[order]
+    counts = (np.ones(len(pooled)) if weights is None else
+              np.concatenate(weights).astype(np.float64)[order])
+
+    # Find the first and last position of the run of equal values of each value, the runs of more than one value
+    # holding the ties
+    new_value = np.ones(len(pooled), dtype=bool)
+    new_value[1:] = pooled[1:] != pooled[:-1]
+    starts = np.flatnonzero(new_value)
+    shared = len(starts) < len(pooled)
+    if shared:
+        run = np.cumsum(new_value) - 1
+        run_start, run_end = starts[run], np.append(starts[1:], len(pooled))[run] - 1
+        in_ties = np.flatnonzero(np.add.reduceat(counts, starts)[run] > 1)
+        tied_start, tied_end = run_start[in_ties], run_end[in_ties]
+    else:
+        in_ties = tied_start = tied_end = np.flatnonzero(counts > 1)
+    tied_labels, tied_counts = labels[in_ties], counts[in_ties]
+
+    # For each column set, count its values before each position, and add the number of them below the run of each
+    # value, and in the run for the ties, to the row of the set of the value
+    for j in range(k):
+        column = labels == j if weights is None else np.where(labels == j, counts, 0.0)
+        seen = np.cumsum(column, dtype=np.float64)
+        before = seen - column
+        lower = before[run_start] if shared else before
+        below[:, j] = np.bincount(labels, weights=lower if weights is None else counts * lower, minlength=k)
+        if len(in_ties):
+            same = seen[tied_end] - before[tied_start]
+            tied[:, j] = np.bincount(tied_labels, weights=tied_counts * same, minlength=k)
+            squares[j] = np.bincount(tied_labels, weights=tied_counts * same * same, minlength=k)
+
+    # The squares hold the sum of ab^2 of each pair, and a^3 of each set on its own on the diagonal
+    own = np.diag(squares) - np.bincount(tied_labels, weights=tied_counts, minlength=k)
+    return below, tied, own[:, None] + own[None, :] + 3 * (squares + squares.T)
+
+
+def _mannwhitneyu_pvalue(higher, lower, pairs, n, tie_terms):
+    """
+    The two-sided MannWhitneyU-test with the normal approximation, tie correction and continuity correction of
+    the larger U statistic, like scipy.stats.mannwhitneyu with the asymptotic method.
+
+    :param higher: The number of pairs where the value of the first set is higher
+    :param lower: The number of pairs where the value of the first set is lower
+    :param pairs: The number of pairs
+    :param n: The number of values of both sets combined
+    :param tie_terms: The sum of t^3 - t over the runs of t equal values of both sets combined
+    :return: The p-value, 1 if there is no spread
+    """
+    from scipy import stats
+
+    sigma = np.sqrt(pairs / 12 * ((n + 1) - tie_terms / (n * (n - 1))))
+    u = np.maximum(higher, lower) + (pairs - higher - lower) / 2
+    return np.where(sigma > 0, np.minimum(2 * stats.norm.sf((u - pairs / 2 - 0.5) / sigma), 1.0), 1.0)
+
+
+def adjust_pvalues(p_values, correction="holm"):
+    """
+    Correct p-values for multiple comparisons. NaN p-values are left out of the family and stay NaN.
+
+    :param p_values: The array of p-values
+    :param correction: "holm" (Holm-Bonferroni), "bonferroni", "fdr_bh" (Benjamini-Hochberg false discovery
+    rate) or "none"
+    :return: The array of the corrected p-values
+    """
+    p_values = np.asarray(p_values, dtype=np.float64)
+    adjusted = p_values.copy()
+    valid = np.flatnonzero(~np.isnan(p_values))
+    m = len(valid)
+    if correction == "none" or m == 0:
+        return adjusted
+
+    # Scale the sorted p-values by their rank and keep them monotonic, in the direction of the procedure
+    order = valid[np.argsort(p_values[valid], kind="stable")]
+    sorted_p = p_values[order]
+    if correction == "bonferroni":
+        scaled = sorted_p * m
+    elif correction == "holm":
+        scaled = np.maximum.accumulate(sorted_p * (m - np.arange(m)))
+    elif correction == "fdr_bh":
+        scaled = np.minimum.accumulate((sorted_p * m / np.arange(1, m + 1))[::-1])[::-1]
+    else:
+        raise ValueError(f"Unknown multiple comparison correction: {correction}")
+    adjusted[order] = np.minimum(scaled, 1.0)
+    return adjusted
+
+
+def shared_bins(data1, data2, max_bins=MAX_BINS, weights1=None, weights2=None):
+    """
+    Count the values of both sets in shared bins, so they can be resampled as bin counts at a cost that does not
+    depend on the number of values. Up to max_bins values are kept exactly, more values are counted in max_bins
+    equally wide bins represented by the mean of their values.
+
+    :param data1: The array of values of the first set
+    :param data2: The array of values of the second set
+    :param max_bins: The maximum number of bins
+    :param weights1: The array of the count of each value of the first set, None for all 1
+    :param weights2: The array of the count of each value of the second set, None for all 1
+    :return: The array of the value of each bin and the arrays of the counts of both sets in the bins
+    """
+    pooled = np.concatenate((data1, data2))
+    weights = None if weights1 is None else np.concatenate((weights1, weights2)).astype(np.float64)
+    if len(pooled) <= max_bins:
+        values, index = np.unique(pooled, return_inverse=True)
+    else:
+        minimum, maximum = pooled.min(), pooled.max()
+        width = (maximum - minimum) / max_bins or 1.0
+        index = np.minimum(((pooled - minimum) / width).astype(np.int64), max_bins - 1)
+        values = np.bincount(index, weights=pooled if weights is None else pooled * weights, minlength=max_bins)
+
+    # Count the values of each set in the bins and leave out the empty bins
+    counts1 = np.bincount(index[:len(data1)], weights=None if weights is None else weights[:len(data1)],
+                          minlength=len(values)).astype(np.int64)
+    counts2 = np.bincount(index[len(data1):], weights=None if weights is None else weights[len(data1):],
+                          minlength=len(values)).astype(np.int64)
+    occupied = (counts1 + counts2) > 0
+    values, counts1, counts2 = values[occupied], counts1[occupied], counts2[occupied]
+
+    # Represent the equally wide bins by the mean of their values
+    if len(pooled) > max_bins:
+        values = values / (counts1 + counts2)
+    return values, counts1, counts2
+
+
+def permutation_pvalue(values, counts1, counts2, observed, n_resamples, rng):
+    """
+    The two-sided permutation test of the difference in mean of two binned sets. Each permutation draws the bin
+    counts of the first set from the pooled counts (a multivariate hypergeometric draw), in batches.
+
+    :param values: The array of the value of each bin
+    :param counts1: The array of counts of the first set in the bins
+    :param counts2: The array of counts of the second set in the bins
+    :param observed: The observed difference in mean
+    :param n_resamples: The number of permutations
+    :param rng: The numpy random Generator
+    :return: The p-value, NaN if either set is empty
+    """
+    n1, n2 = counts1.sum(), counts2.sum()
+    if n1 == 0 or n2 == 0:
+        return np.nan
+    pooled = counts1 + counts2
+    total = pooled @ values
+
+    # Count the permutations with a difference at least as extreme as the observed one
+    extreme = 0
+    for batch in _batches(n_resamples, len(values)):
+        sums1 = rng.multivariate_hypergeometric(pooled, n1, size=batch, method="marginals") @ values
+        differences = sums1 / n1 - (total - sums1) / n2
+        extreme += np.count_nonzero(np.abs(differences) >= abs(observed) * (1 - 1e-9))
+    return (extreme + 1) / (n_resamples + 1)
+
+
+def bootstrap_interval(values, counts1, counts2, observed, n_resamples, rng, confidence=0.95):
+    """
+    The bootstrap percentile confidence interval of the difference in mean of two binned sets. Each resample
+    draws the bin counts of each set from its own counts (a multinomial draw), in batches.
+
+    :param values: The array of the value of each bin
+    :param counts1: The array of counts of the first set in the bins
+    :param counts2: The array of counts of the second set in the bins
+    :param observed: The observed difference in mean
+    :param n_resamples: The number of resamples
+    :param rng: The numpy random Generator
+    :param confidence: The confidence level of the interval
+    :return: The (low, high) bounds of the interval, NaN if either set is empty
+    """
+    n1, n2 = counts1.sum(), counts2.sum()
+    if n1 == 0 or n2 == 0:
+        return np.nan, np.nan
+
+    # Resample the differences, shifted so the binning does not bias the interval around the observed difference
+    differences = []
+    for batch in _batches(n_resamples, len(values)):
+        means1 = rng.multinomial(n1, counts1 / n1, size=batch) @ values / n1
+        means2 = rng.multinomial(n2, counts2 / n2, size=batch) @ values / n2
+        differences.append(means1 - means2)
+    binned = (counts1 @ values) / n1 - (counts2 @ values) / n2
+    differences = np.concatenate(differences) - binned + observed
+
+    alpha = (1 - confidence) / 2
+    low, high = np.quantile(differences, [alpha, 1 - alpha])
+    return low, high
+
+
+def _batches(n_resamples, n_bins):
+    """
+    Split the resamples into batches that keep at most BATCH_CELLS resampled bin counts in memory.
+
+    :param n_resamples: The total number of resamples
+    :param n_bins: The number of bins of each resample
+    :return: The list of batch sizes
+    """
+    size = max(1, BATCH_CELLS // max(n_bins, 1))
+    return [min(size, n_resamples - start) for start in range(0, n_resamples, size)]
@@ -0,0 +1,65 @@
+import argparse
+import hashlib
+import sys
+
+from archive import ARCHIVE_EXTENSION, write_archive
+from reader import PARSER_VERSION, POWER, TIME, file_name, find_data_column, load_runs, read_csv_header
+from utils import find_files
+
+
+def convert_files(files, path, bin_width=0.1, workers=None):
+    """
+    Convert EnergiBridge CSV files into one archive holding the de-duplicated time-power data and total energy
+    of each file, with the hash of the source file, the column used and the settings they were extracted with.
+
+    :param files: The list of paths of the CSV files
+    :param path: The path to write the archive to
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+    :param workers: The number of processes to load the files with, None for all CPU cores and 1 for serial
+    :return: The list of the metadata of the runs written to the archive
+    """
+    loaded = load_runs(files, bin_width=bin_width, workers=workers)
+
+    runs = []
+    for file, (power_tdf, total_energy) in zip(files, loaded):
+        # Hash the source so an archived run can be traced back to the exact file it was extracted from
+        digest = hashlib.sha256()
+        with open(file, "rb") as f:
+            for block in iter(lambda: f.read(2 ** 20), b""):
+                digest.update(block)
+
+        runs.append({"name": file_name(file), "time": power_tdf[TIME].to_numpy(),
+                     "power": power_tdf[POWER].to_numpy(), "total_energy": float(total_energy),
+                     "source_sha256": digest.hexdigest(), "column": find_data_column(read_csv_header(file)),
+                     "bin_width": bin_width, "parser_version": PARSER_VERSION})
+
+    write_archive(path, runs)
+    return [{**{key: value for key, value in run.items() if key not in ("time", "power")},
+             "samples": len(run["time"])} for run in runs]
+
+
+def main():
+    """
+    Parse the command line arguments and convert the CSV files into an archive.
+    """
+    parser = argparse.ArgumentParser(description="Convert EnergiBridge CSV files into a compact EnergiReporter "
+                                                 f"archive ({ARCHIVE_EXTENSION}) that loads without parsing.")
+    parser.add_argument("output", help=f"The path to write the archive to, usually ending in {ARCHIVE_EXTENSION}")
+    parser.add_argument("inputs", nargs="+", metavar="PATH",
+                        help="The directories and glob patterns of the CSV files to convert")
+    parser.add_argument("--bin-width", type=float, default=0.1,
+                        help="The width of the time bins in seconds that duplicate times are averaged over")
+    parser.add_argument("--workers", type=int, help="The number of processes to load the files with")
+
+    args = parser.parse_args()
+    files = [file for file in find_files(args.inputs) if not file.endswith(ARCHIVE_EXTENSION)]
+    if not files:
+        parser.error(f"no CSV files found: {' '.join(args.inputs)}")
+
+    runs = convert_files(files, args.output, args.bin_width, args.workers)
+    print(f"Wrote {len(runs)} runs with {sum(run['samples'] for run in runs)} samples to {args.output}",
+          file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
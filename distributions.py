@@ -0,0 +1,87 @@
+import io
+
+import numpy as np
+
+# The number of points of the grid the densities are estimated on
+GRID_POINTS = 512
+
+
+def binned_kde(values, minimum, maximum, bandwidth, grid_points=GRID_POINTS, weights=None):
+    """
+    Estimate the Gaussian kernel density of the values on a fixed grid between their minimum and maximum. The
+    values are linearly binned onto the grid and the bins are convolved with the kernel, so the cost grows only
+    linearly with the number of values instead of with the number of values times the grid points.
+
+    :param values: The array of values
+    :param minimum: The minimum of the values
+    :param maximum: The maximum of the values
+    :param bandwidth: The standard deviation of the Gaussian kernel
+    :param grid_points: The number of points of the grid
+    :param weights: The array of the weight of each value, such as the counts of binned values, None for all 1
+    :return: The grid array and the array of the density at each grid point, constant if there is no spread
+    """
+    grid = np.linspace(minimum, maximum, grid_points)
+    if len(values) == 0 or not maximum > minimum or not bandwidth > 0:
+        return grid, np.ones(grid_points)
+
+    # Spread the weight of each value over the two grid points around it
+    spacing = grid[1] - grid[0]
+    weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+    position = np.clip((np.asarray(values, dtype=np.float64) - minimum) / spacing, 0, grid_points - 1)
+    lower = np.minimum(position.astype(np.int64), grid_points - 2)
+    fraction = position - lower
+    counts = (np.bincount(lower, weights=weights * (1 - fraction), minlength=grid_points) +
+              np.bincount(lower + 1, weights=weights * fraction, minlength=grid_points))
+
+    # Convolve the bins with the kernel, which never has to reach further than the grid itself
+    sigma = bandwidth / spacing
+    reach = min(int(np.ceil(4 * sigma)), grid_points - 1)
+    offsets = np.arange(-reach, reach + 1)
+    kernel = np.exp(-0.5 * (offsets / sigma) ** 2) / (np.sqrt(2 * np.pi) * bandwidth)
+    density = np.convolve(counts, kernel)[reach:reach + grid_points] if reach else counts / spacing
+    return grid, density / weights.sum()
+
+
+def violin_stats(values, moments, median, weights=None):
+    """
+    Compute the statistics matplotlib draws a violin from, with the density estimated by binned_kde using
+    Scott's rule for the bandwidth, like matplotlib does itself.
+
+    :param values: The array of values
+    :param moments: The power_statistics.Moments of the values
+    :param median: The median of the values
+    :param weights: The array of the weight of each value, None for all 1
+    :return: The dict with the coords, vals, mean, median, min and max of the violin
+    """
+    if moments.count == 0:
+        return {"coords": np.full(1, np.nan), "vals": np.ones(1), "mean": np.nan, "median": np.nan,
+                "min": np.nan, "max": np.nan}
+    bandwidth = moments.std * moments.count ** -0.2 if moments.count > 1 else 0.0
+    coords, density = binned_kde(values, moments.minimum, moments.maximum, bandwidth, weights=weights)
+    return {"coords": coords, "vals": density, "mean": moments.mean, "median": median,
+            "min": moments.minimum, "max": moments.maximum}
+
+
+def violin_figure(names, stats):
+    """
+    Create the violin charts figure of the individual data files and all files combined from their precomputed
+    violin statistics, rendered as an image.
+
+    :param names: The names of the uploaded files
+    :param stats: The list of violin statistics (see violin_stats) of all the files
+    :return: The PNG image bytes of the figure with the violin charts
+    """
+    import matplotlib.pyplot as plt
+
+    # Create the violin plots of the data files on a figure of its own
+    figure, axes = plt.subplots()
+    axes.violin(stats, positions=range(1, len(stats) + 1), showmedians=True)
+    axes.set_ylabel("Power (W)")
+    axes.set_xlabel("File")
+    axes.set_xticks(range(1, len(names) + 1), labels=names)
+
+    # Render the figure to an image once, so it does not have to be drawn again on the next reruns
+    image = io.BytesIO()
+    figure.savefig(image, format="png", bbox_inches="tight")
+    plt.close(figure)
+    return image.getvalue()
@@ -0,0 +1,144 @@
+import numpy as np
+
+# The width of the charts in pixels (the default Streamlit content width) and the points drawn per pixel
+CHART_WIDTH = 704
+POINTS_PER_PIXEL = 2
+
+# The supported downsampling methods
+METHODS = ["minmax", "lttb"]
+
+
+def target_points(width=CHART_WIDTH, points_per_pixel=POINTS_PER_PIXEL):
+    """
+    Get the number of points to downsample a chart to from the width of the chart.
+
+    :param width: The width of the chart in pixels
+    :param points_per_pixel: The number of points to keep per pixel
+    :return: The target number of points
+    """
+    return int(width * points_per_pixel)
+
+
+def downsample_indices(x, y, n_points, method="minmax"):
+    """
+    Select the indices of the samples to keep so the shape of the series is preserved with at most about
+    n_points samples. The first and last samples are always kept.
+
+    :param x: The array of x values (time), increasing
+    :param y: The array of y values (power), can contain NaN
+    :param n_points: The target number of points
+    :param method: "minmax" to keep the minimum and maximum of each bucket, or "lttb" for
+    largest-triangle-three-buckets
+    :return: The sorted array of the indices to keep
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if len(y) <= max(n_points, 2):
+        return np.arange(len(y))
+    if method == "minmax":
+        return _minmax_indices(y, n_points)
+    if method == "lttb":
+        return _lttb_indices(x, y, n_points)
+    raise ValueError(f"Unknown downsampling method: {method}")
+
+
+def downsample_frame(df, x, columns, n_points=None, method="minmax"):
+    """
+    Downsample the rows of a DataFrame so the shape of the given columns is preserved. The same rows are
+    kept for all the columns, so error bands stay consistent with their line. When multiple columns are given
+    the rows selected for any of them are kept.
+
+    :param df: The DataFrame to downsample, sorted on the x column
+    :param x: The name of the x (time) column
+    :param columns: The name or list of names of the columns to preserve the shape of
+    :param n_points: The target number of points per column, defaults to target_points()
+    :param method: The downsampling method, "minmax" or "lttb"
+    :return: The downsampled DataFrame
+    """
+    n_points = n_points or target_points()
+    columns = [columns] if isinstance(columns, str) else columns
+    if len(df) <= n_points:
+        return df
+
+    # Select the indices for each column and keep the rows selected for any of them
+    x_values = df[x].to_numpy()
+    indices = [downsample_indices(x_values, df[column].to_numpy(), n_points, method) for column in columns]
+    return df.iloc[np.unique(np.concatenate(indices))]
+
+
+def bucket_means(x, values, n_points):
+    """
+    Downsample many columns at once by averaging the rows in n_points buckets of equally many rows, which keeps
+    the sum of stacked columns consistent with the sum of their averages.
+
+    :param x: The array of x values (time), increasing
+    :param values: The 2-D array of the values, a row per x value and a column per series
+    :param n_points: The target number of points
+    :return: The array of the mean x value and the 2-D array of the mean values of each bucket
+    """
+    x = np.asarray(x, dtype=np.float64)
+    if len(x) <= n_points:
+        return x, values
+    starts = np.unique(np.linspace(0, len(x), n_points, endpoint=False).astype(np.int64))
+    counts = np.diff(np.append(starts, len(x)))
+    return (np.add.reduceat(x, starts) / counts,
+            np.add.reduceat(np.asarray(values).T, starts, axis=1).T / counts[:, None])
+
+
+def _minmax_indices(y, n_points):
+    """
+    Select the indices of the minimum and maximum of each bucket, with n_points / 2 buckets.
+
+    :param y: The array of y values
+    :param n_points: The target number of points
+    :return: The sorted array of indices
+    """
+    # Pad the values into equally sized buckets, ignoring NaN values for the minimum and maximum
+    n_buckets = max(1, n_points // 2)
+    size = int(np.ceil(len(y) / n_buckets))
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:len(y)] = y
+    buckets = padded.reshape(n_buckets, size)
+    offsets = np.arange(n_buckets) * size
+
+    # Find the minimum and maximum of each bucket
+    low = offsets + np.argmin(np.where(np.isnan(buckets), np.inf, buckets), axis=1)
+    high = offsets + np.argmax(np.where(np.isnan(buckets), -np.inf, buckets), axis=1)
+
+    indices = np.unique(np.concatenate(([0, len(y) - 1], low, high)))
+    return indices[indices < len(y)]
+
+
+def _lttb_indices(x, y, n_points):
+    """
+    Select the indices with the largest-triangle-three-buckets algorithm. Each bucket keeps the sample
+    forming the largest triangle with the previously kept sample and the average of the next bucket.
+
+    :param x: The array of x values
+    :param y: The array of y values
+    :param n_points: The target number of points
+    :return: The sorted array of indices
+    """
+    # The buckets between the first and last sample, NaN values are treated as zero
+    y = np.nan_to_num(y)
+    edges = np.linspace(1, len(y) - 1, n_points - 1).astype(int)
+    indices = np.empty(n_points, dtype=int)
+    indices[0] = 0
+    indices[-1] = len(y) - 1
+
+    previous = 0
+    for bucket in range(n_points - 2):
+        start, end = edges[bucket], max(edges[bucket + 1], edges[bucket] + 1)
+
+        # The average point of the next bucket, or the last sample for the final bucket
+        next_start, next_end = end, edges[bucket + 2] if bucket + 2 < len(edges) else len(y)
+        next_x = x[next_start:next_end].mean() if next_end > next_start else x[-1]
+        next_y = y[next_start:next_end].mean() if next_end > next_start else y[-1]
+
+        # Keep the sample with the largest triangle area
+        areas = np.abs((x[previous] - next_x) * (y[start:end] - y[previous]) -
+                       (x[previous] - x[start:end]) * (next_y - y[previous]))
+        previous = start + int(np.argmax(areas))
+        indices[bucket + 1] = previous
+
+    return np.unique(indices)
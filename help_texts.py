@@ -1,12 +1,14 @@
 global help_text_insert_files_analysis
 help_text_insert_files_analysis = ("Here you can insert the files to be analyzed. Note that you can upload **multiple** files, "
-                                   "in which case extra data analysis will be provided, such as mean charts with standard deviation.")
+                                   "in which case extra data analysis will be provided, such as mean charts with standard deviation. "
+                                   "Archives created with `convert.py` load faster than CSV files and can hold multiple files each.")
 
 global help_text_insert_files_comparison
 help_text_insert_files_comparison = ("Here you can insert the files to be analyzed. Note that you can upload **multiple** files, "
                                      "for both the first and second set, "
                                      "in which case extra data analysis will be provided, such as average and standard deviation of"
-                                     "the first and second set")
+                                     "the first and second set. "
+                                     "Archives created with `convert.py` load faster than CSV files and can hold multiple files each.")
 
 global help_text_mean_chart_modal
 help_text_mean_chart_modal = ("This graph provides the average power consumption in Watts over time. Note that if there is only "
@@ -19,11 +21,43 @@ help_text_errorband_chart_modal = ("This graph provides the average power consum
                                    "The Conf Chart-file indicates the average power consumption as the dark-blue line, "
                                    "with the light-blue area being the interval upto *two* standard deviation difference to the mean.")
 
+global help_text_channel_chart_modal
+help_text_channel_chart_modal = ("This graph provides the power consumption in Watts over time of each channel of a file, such as each "
+                                 "CPU core, stacked on top of each other so the total height is the power of all the channels "
+                                 "together. The table reports the total energy used by each channel, its mean power, and its share "
+                                 "of the energy used by all the channels. Only CSV files have the channels, archives do not.")
+
 global help_text_boxplot_modal
 help_text_boxplot_modal = ("This graph provides an overview of the data distribution using a boxplot. The black lines indicate the outer "
                            "25th percentiles of the data. The blue box indicates the central 50% of data, where the line in the middle "
                            "indicates the median. The data in the the graph can be changed with the outlier removal option. "
-                           "Furthermore, the table indicates if the data is likely normally distributed.")
+                           "Furthermore, the table indicates if the data is likely normally distributed, using the Shapiro-Wilk "
+                           "test for up to 5000 samples and the D'Agostino-Pearson test for more. The second table "
+                           "summarizes the distribution of each file and the total.")
+
+global help_text_pairwise_comparison
+help_text_pairwise_comparison = ("Every pair of sets is compared with Welch's t-test, the MannWhitneyU-test and the Percentage of Pairs "
+                                 "test. Comparing many pairs makes it likely that some differences look significant by chance, so the "
+                                 "p-values are corrected for the number of pairs: Holm-Bonferroni and Bonferroni control the chance of "
+                                 "any false positive, Benjamini-Hochberg the expected fraction of false positives. The heatmap shows "
+                                 "the selected test of the set of each row compared to the set of each column, and a pair is marked "
+                                 "significant when both corrected p-values are below 0.05.")
+
+global help_text_live_monitor
+help_text_live_monitor = ("Enter the path of an EnergiBridge CSV file on this machine that is still being written, for example "
+                          "while a benchmark runs. Only the rows appended since the last refresh are read, so long captures "
+                          "stay responsive. The totals cover the whole capture, while the chart shows the most recent samples. "
+                          "When the file is replaced by a new capture it is followed from its start again.")
+
+global help_text_export
+help_text_export = ("The bundle holds the chart data, tables, violin densities and test results of the report, and opens "
+                    "instantly on the Report Viewer page without the data files. The HTML report can be viewed in any browser.")
+
+global help_text_report_viewer
+help_text_report_viewer = ("Upload a report bundle exported from the data analysis or data comparison page. The bundle holds "
+                           "everything the report shows already computed, so it is shown without the data files and without "
+                           "recomputing anything. The outlier removal of the distribution statistics and the correction of the "
+                           "pairwise comparison are the ones set when the bundle was exported.")
 
 global help_text_
 help_text_ = "help_text"
@@ -0,0 +1,275 @@
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+import os
+import threading
+import time
+
+from archive import is_archive
+from instrumentation import stage
+from reader import TIME, combine_file_sets, file_name, load_archive, load_run, run_frame, source_cache_key
+from runset import upload_key
+
+# The environment variable setting the number of processes of the shared ingestion pool, all CPU cores by default
+WORKERS_ENV = "ENERGIREPORTER_INGEST_WORKERS"
+
+
+class IngestJob:
+    """
+    The background loading of a single uploaded file, with the times it was submitted and finished.
+    """
+
+    def __init__(self, name, future, cached=False, task=None):
+        """
+        :param name: The name of the file
+        :param future: The future of the list of (name, (time-power DataFrame, total energy)) tuples of the file
+        :param cached: Whether the runs were taken from an archive or the run cache instead of being parsed
+        :param task: The future of the parse of the file in the worker pool, None when it is not parsed
+        """
+        self.name = name
+        self.future = future
+        self.cached = cached
+        self.task = task
+        self.submitted = time.perf_counter()
+        self.finished = self.submitted if future.done() else None
+        future.add_done_callback(self._finish)
+
+    def _finish(self, future):
+        if self.finished is None:
+            self.finished = time.perf_counter()
+
+    def keep(self, named_runs):
+        """
+        Replace the runs of the finished job, such as with views of the block they were packed into, and let go of
+        the parse of the file so the runs it loaded can be freed.
+
+        :param named_runs: The list of (name, (time-power DataFrame, total energy)) tuples to keep instead
+        """
+        self.future = _completed(lambda: named_runs)
+        self.task = None
+
+    @property
+    def status(self):
+        """
+        :return: The status of the job: queued, parsing, failed, cached or done
+        """
+        future = self.future
+        if not future.done():
+            return "parsing" if (self.task or future).running() else "queued"
+        if future.exception() is not None:
+            return "failed"
+        return "cached" if self.cached else "done"
+
+    @property
+    def seconds(self):
+        """
+        :return: The seconds since the job was submitted, or that it took when it is finished
+        """
+        return (self.finished or time.perf_counter()) - self.submitted
+
+
+class Ingestion:
+    """
+    Loads uploaded files in the background as soon as they are uploaded. Each file is submitted to a worker pool
+    shared by all the sessions on its own, so the first files are loaded while others are still uploading and the
+    runs finished so far can already be shown. Files that are uploaded again are not submitted twice, and the
+    runs found in the run cache or an archive are available right away.
+    """
+
+    def __init__(self, engine="vectorized", bin_width=0.1, cache=None, executor=None):
+        """
+        :param engine: The extraction engine used to extract the data of each file
+        :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+        :param cache: The RunCache to reuse previously loaded runs from and add the loaded runs to, None for none
+        :param executor: The executor to load the files with, None for the pool shared by all the sessions
+        """
+        self.engine = engine
+        self.bin_width = bin_width
+        self.cache = cache
+        self.executor = executor
+        self._jobs = {}
+
+    def submit(self, files):
+        """
+        Start loading the files that are not loaded or loading yet, and forget the files that are no longer
+        uploaded. Files whose loading failed because the worker pool broke are submitted again.
+
+        :param files: The list of paths or uploaded files
+        """
+        keys = [upload_key(file) for file in files]
+        self._jobs = {key: job for key, job in self._jobs.items() if key in set(keys) and not _pool_broke(job)}
+        new = [(key, file) for key, file in zip(keys, files) if key not in self._jobs]
+        with stage("submit files", rows=len(new)):
+            for key, file in new:
+                self._jobs[key] = self._start(file)
+
+    def _start(self, file):
+        """
+        :param file: The path or uploaded file to load
+        :return: The IngestJob of the file
+        """
+        name = file_name(file)
+
+        # Archives hold runs that were already extracted, so they are read right away
+        if is_archive(file):
+            return IngestJob(name, _completed(lambda: load_archive(file, self.bin_width)), cached=True)
+
+        # Take the run from the cache if it was loaded before, keyed on the file bytes
+        source = file if isinstance(file, (str, os.PathLike)) else file.getvalue()
+        key = None
+        if self.cache is not None:
+            key = source_cache_key(self.cache, source, self.bin_width)
+            run = self.cache.get(key)
+            if run is not None:
+                return IngestJob(name, _completed(lambda: [(name, run)]), cached=True)
+
+        # Parse the file in the worker pool, adding the run to the cache when it is finished
+        future = _submit(self.executor, load_run, source, self.engine, self.bin_width)
+        named = Future()
+        future.add_done_callback(lambda done: self._loaded(done, named, name, key))
+        return IngestJob(name, named, task=future)
+
+    def _loaded(self, future, named, name, key):
+        """
+        Pass the run of a finished parse on to the job as its named runs, and add it to the cache.
+        """
+        try:
+            run = future.result()
+        except BaseException as error:
+            named.set_exception(error)
+            return
+        if self.cache is not None and key is not None:
+            self.cache.put(key, run)
+        named.set_result([(name, run)])
+
+    def jobs(self, files):
+        """
+        :param files: The list of paths or uploaded files, which must have been submitted
+        :return: The list of IngestJobs of the files
+        """
+        return [self._jobs[upload_key(file)] for file in files]
+
+    def finished(self, files):
+        """
+        :param files: The list of paths or uploaded files, which must have been submitted
+        :return: Whether the loading of all the files finished, successfully or not
+        """
+        return all(job.future.done() for job in self.jobs(files))
+
+    def wait(self, files, timeout=None):
+        """
+        Wait until the loading of one of the files finishes, or until the timeout passes.
+
+        :param files: The list of paths or uploaded files, which must have been submitted
+        :param timeout: The largest number of seconds to wait, None to wait without limit
+        """
+        pending = [job.future for job in self.jobs(files) if not job.future.done()]
+        if pending:
+            wait(pending, timeout, return_when=FIRST_COMPLETED)
+
+    def named_runs(self, files):
+        """
+        :param files: The list of paths or uploaded files, which must have been submitted
+        :return: The list of (name, (time-power DataFrame, total energy)) lists of each file, None for the files
+        that are not loaded (yet)
+        """
+        return [job.future.result() if job.status in ("cached", "done") else None for job in self.jobs(files)]
+
+    def read_file_sets(self, file_sets, alignment=None, precision=None):
+        """
+        Combine the loaded runs of multiple sets of files, like read_uploaded_file_sets does after loading them.
+        The loading of all the files must have finished, a file that failed to load raises its error here.
+
+        The power of the runs is packed into a RunBlock per set, so afterwards the jobs keep their runs as views of
+        the blocks instead of the arrays they were loaded into. The power values of a session are then kept only
+        once, next to the copies of the run cache, which are bounded by its memory budget. The runs keep the
+        precision of their block.
+
+        :param file_sets: The list of sets (lists) of files that have been submitted
+        :param alignment: The keyword arguments of align_runs (step, policy, interpolation), None for the defaults
+        :param precision: The precision of the power values, "float64" or "float32", None for the default
+        :return: A list with for each set the information returned by read_uploaded_files
+        """
+        files = [file for files in file_sets for file in files]
+        jobs = self.jobs(files)
+        named_runs = [job.future.result() for job in jobs]
+        results = combine_file_sets(file_sets, named_runs, self.bin_width, alignment, precision)
+
+        # Replace the runs of the jobs with views of the block of their set, in the order they were packed in
+        start = 0
+        for set_files, (*_, block) in zip(file_sets, results):
+            index = 0
+            for job, file_runs in zip(jobs[start:start + len(set_files)], named_runs[start:start + len(set_files)]):
+                job.keep([(name, (run_frame(power_tdf[TIME].to_numpy(), block.run_power(index + i)), total_energy))
+                          for i, (name, (power_tdf, total_energy)) in enumerate(file_runs)])
+                index += len(file_runs)
+            start += len(set_files)
+        return results
+
+
+def _completed(function):
+    """
+    :param function: The function to call now
+    :return: A finished future with the result or error of the function
+    """
+    future = Future()
+    try:
+        future.set_result(function())
+    except Exception as error:
+        future.set_exception(error)
+    return future
+
+
+def _pool_broke(job):
+    """
+    :param job: The IngestJob
+    :return: Whether the job failed because the worker pool broke, such as when a worker process was killed
+    """
+    return job.future.done() and isinstance(job.future.exception(), BrokenProcessPool)
+
+
+# The worker pool shared by all the sessions, created on first use
+_default_executor = None
+_default_executor_lock = threading.Lock()
+
+
+def default_executor(replace_broken=False):
+    """
+    Get the process pool shared by all the sessions, which outlives the reruns of the pages. The number of
+    processes is configured with the ENERGIREPORTER_INGEST_WORKERS environment variable. If no process pool can
+    be started, a thread pool is used instead.
+
+    :param replace_broken: Whether to replace the pool with a new one, as the current one broke
+    :return: The shared executor
+    """
+    global _default_executor
+    with _default_executor_lock:
+        if _default_executor is None or replace_broken:
+            workers = int(os.environ.get(WORKERS_ENV) or os.cpu_count() or 1)
+            try:
+                _default_executor = ProcessPoolExecutor(max_workers=workers)
+            except OSError:
+                _default_executor = ThreadPoolExecutor(max_workers=workers)
+        return _default_executor
+
+
+def _submit(executor, function, *args):
+    """
+    Submit a function to the executor, or to the shared pool when no executor is given. A shared pool that broke
+    is replaced, and if no new pool can be started either the function runs right away in the calling thread,
+    returning a finished future.
+
+    :param executor: The executor, None for the shared pool
+    :param function: The function to run
+    :param args: The arguments of the function
+    :return: The future of the result of the function
+    """
+    if executor is not None:
+        return executor.submit(function, *args)
+    try:
+        return default_executor().submit(function, *args)
+    except BrokenProcessPool:
+        pass
+    try:
+        return default_executor(replace_broken=True).submit(function, *args)
+    except (OSError, BrokenProcessPool):
+        return _completed(lambda: function(*args))
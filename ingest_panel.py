@@ -0,0 +1,106 @@
+import streamlit as st
+
+# The seconds between the updates of the progress while files are loading
+PROGRESS_INTERVAL = 0.25
+
+
+def get_ingestion(key, **kwargs):
+    """
+    Get the ingestion of a page and session, which keeps the background loading of the uploaded files over the
+    reruns of the page.
+
+    :param key: The key of the session state to keep the ingestion of the page in
+    :param kwargs: The keyword arguments of the Ingestion (engine, bin_width), a new one is made when they change
+    :return: The ingestion of the page
+    """
+    from cache import default_run_cache
+    from ingest import Ingestion
+
+    ingestion = st.session_state.get(key)
+    if ingestion is None or (ingestion.engine, ingestion.bin_width) != (kwargs.get("engine", "vectorized"),
+                                                                        kwargs.get("bin_width", 0.1)):
+        ingestion = Ingestion(cache=default_run_cache(), **kwargs)
+        st.session_state[key] = ingestion
+    return ingestion
+
+
+def load_in_background(ingestion, file_sets, set_names=None):
+    """
+    Start loading the uploaded files in the background, and show the progress of each file with the mean power of
+    the runs loaded so far until all the files are loaded. Nothing is shown when all the files were already loaded.
+
+    :param ingestion: The ingestion of the page
+    :param file_sets: The list of sets (lists) of files that have been uploaded
+    :param set_names: The names of the sets for the chart, None for a single set
+    """
+    files = [file for files in file_sets for file in files]
+    ingestion.submit(files)
+    if ingestion.finished(files):
+        return
+
+    # Update the progress and the chart until all the files are loaded, the chart only when more runs are loaded
+    progress, chart = st.empty(), st.empty()
+    shown = None
+    while True:
+        jobs = ingestion.jobs(files)
+        show_progress(progress, jobs)
+        loaded = sum(job.status in ("cached", "done") for job in jobs)
+        if loaded and loaded != shown:
+            show_partial_means(chart, ingestion, file_sets, set_names)
+            shown = loaded
+        if ingestion.finished(files):
+            break
+        ingestion.wait(files, PROGRESS_INTERVAL)
+
+    # The full charts replace the progress once all the files are loaded
+    progress.empty()
+    chart.empty()
+
+
+def show_progress(placeholder, jobs):
+    """
+    Show the progress bar and the status of each file in the placeholder.
+
+    :param placeholder: The placeholder of the progress
+    :param jobs: The IngestJobs of the uploaded files
+    """
+    import pandas as pd
+
+    finished = sum(job.future.done() for job in jobs)
+    with placeholder.container():
+        st.progress(finished / len(jobs), text=f"Loaded {finished} of {len(jobs)} files")
+        st.dataframe(pd.DataFrame(data={"FILE": [job.name for job in jobs],
+                                        "STATUS": [job.status for job in jobs],
+                                        "TIME (s)": [round(job.seconds, 2) for job in jobs]}),
+                     hide_index=True, use_container_width=True)
+
+
+def show_partial_means(placeholder, ingestion, file_sets, set_names=None):
+    """
+    Show the mean power of the runs loaded so far of each set in the placeholder.
+
+    :param placeholder: The placeholder of the chart
+    :param ingestion: The ingestion of the page
+    :param file_sets: The list of sets (lists) of files that have been uploaded
+    :param set_names: The names of the sets for the chart, None for a single set
+    """
+    import pandas as pd
+    from downsampling import downsample_frame
+    from reader import POWER, TIME, combine_runs
+
+    # Combine the loaded runs of each set that has any
+    means = {}
+    for i, files in enumerate(file_sets):
+        set_runs = [named_run for named_runs in ingestion.named_runs(files) if named_runs
+                    for named_run in named_runs]
+        if set_runs:
+            mean_df = combine_runs([name for name, _ in set_runs], [run for _, run in set_runs],
+                                   {"step": ingestion.bin_width})[1]
+            means[set_names[i] if set_names else POWER] = mean_df[POWER]
+
+    # Show the means, downsampled for the chart
+    means_df = pd.concat(means, axis=1)
+    means_tdf = downsample_frame(means_df.reset_index(), TIME, means_df.columns.tolist())
+    with placeholder.container():
+        st.caption("Mean power of the files loaded so far:")
+        st.line_chart(means_tdf, x=TIME, y=means_df.columns.tolist(), use_container_width=True)
@@ -0,0 +1,189 @@
+from contextvars import ContextVar
+import json
+import os
+import threading
+import time
+import tracemalloc
+
+# The environment variable enabling the instrumentation, "1" to record the timings and "memory" to also trace
+# the memory allocated by each stage
+PROFILE_ENV = "ENERGIREPORTER_PROFILE"
+
+
+class Profiler:
+    """
+    Records the wall time, call count, rows processed and memory allocated of the stages of the pipeline. The
+    stages are marked with the stage function, which only records anything while a profiler is enabled and
+    activated for the current thread, so the instrumentation costs next to nothing when it is disabled.
+    """
+
+    def __init__(self, enabled=False, trace_memory=False):
+        """
+        :param enabled: Whether to record the stages
+        :param trace_memory: Whether to also trace the memory allocated by each stage with tracemalloc, which
+        slows down the stages themselves
+        """
+        self.enabled = enabled
+        self.trace_memory = trace_memory
+        self.events = []
+        self.origin = time.perf_counter()
+        self._stack = []
+
+    @classmethod
+    def from_environment(cls):
+        """
+        :return: A profiler configured with the ENERGIREPORTER_PROFILE environment variable
+        """
+        value = os.environ.get(PROFILE_ENV, "").strip().lower()
+        return cls(enabled=value not in ("", "0", "false", "no"), trace_memory=value == "memory")
+
+    def reset(self):
+        """
+        Remove all the recorded stages, for example at the start of a new page run.
+        """
+        self.events = []
+        self.origin = time.perf_counter()
+
+    def summary(self):
+        """
+        :return: A DataFrame with per stage the number of calls, the total and mean wall time in seconds, the rows
+        processed and the allocated and peak memory in MiB (when traced), in the order the stages first ran
+        """
+        import pandas as pd
+
+        columns = ["STAGE", "CALLS", "TOTAL (s)", "MEAN (s)", "ROWS", "ALLOCATED (MiB)", "PEAK (MiB)"]
+        if not self.events:
+            return pd.DataFrame(columns=columns)
+        # The rows and memory are None when not known, which must be NaN to sum them
+        events = pd.DataFrame(self.events).astype({"rows": float, "allocated": float, "peak": float})
+        grouped = events.groupby("name", sort=False)
+        summary = pd.DataFrame({"STAGE": grouped.size().index,
+                                "CALLS": grouped.size().to_numpy(),
+                                "TOTAL (s)": grouped["duration"].sum().to_numpy(),
+                                "MEAN (s)": grouped["duration"].mean().to_numpy(),
+                                "ROWS": grouped["rows"].sum(min_count=1).to_numpy(),
+                                "ALLOCATED (MiB)": grouped["allocated"].sum(min_count=1).to_numpy() / 2 ** 20,
+                                "PEAK (MiB)": grouped["peak"].max().to_numpy() / 2 ** 20})
+        return summary[columns]
+
+    def chrome_trace(self):
+        """
+        Export the recorded stages in the Chrome trace event format, which can be opened in chrome://tracing,
+        Perfetto or speedscope.
+
+        :return: The JSON string of the trace
+        """
+        events = [{"name": event["name"], "ph": "X", "ts": event["start"] * 1e6, "dur": event["duration"] * 1e6,
+                   "pid": os.getpid(), "tid": event["thread"],
+                   "args": {key: event[key] for key in ("rows", "allocated", "peak") if event[key] is not None}}
+                  for event in self.events]
+        return json.dumps({"traceEvents": events, "displayTimeUnit": "ms"})
+
+    def stage(self, name, rows=None):
+        """
+        :param name: The name of the stage
+        :param rows: The number of rows processed by the stage, can also be set on the stage while it runs
+        :return: The context manager recording the stage, or a no-op one when the profiler is disabled
+        """
+        return _Stage(self, name, rows) if self.enabled else _NULL_STAGE
+
+
+class _Stage:
+    """
+    The context manager recording a single run of a stage.
+    """
+
+    def __init__(self, profiler, name, rows):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+        self.peak = 0
+
+    def __enter__(self):
+        profiler = self.profiler
+        if profiler.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+            # Hand the peak so far to the enclosing stage, as the peak is reset to measure this stage
+            current, peak = tracemalloc.get_traced_memory()
+            if profiler._stack:
+                parent = profiler._stack[-1]
+                parent.peak = max(parent.peak, peak - parent.memory)
+            tracemalloc.reset_peak()
+            self.memory = current
+        profiler._stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        profiler = self.profiler
+        profiler._stack.pop()
+
+        # The memory still allocated at the end and the peak above the memory allocated at the start
+        allocated = peak = None
+        if profiler.trace_memory and tracemalloc.is_tracing():
+            current, traced_peak = tracemalloc.get_traced_memory()
+            allocated = current - self.memory
+            peak = max(self.peak, traced_peak - self.memory)
+            if profiler._stack:
+                parent = profiler._stack[-1]
+                parent.peak = max(parent.peak, traced_peak - parent.memory)
+
+        profiler.events.append({"name": self.name, "start": self.start - profiler.origin,
+                                "duration": end - self.start, "rows": self.rows, "allocated": allocated,
+                                "peak": peak, "thread": threading.get_ident()})
+        return False
+
+
+class _NullStage:
+    """
+    The context manager of a stage when no profiler is recording, it does nothing.
+    """
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+# The profiler of the current thread (or context), and the disabled one used when none is activated, so stages run
+# outside a page or report run, such as in the workers of the ingestion, are never kept
+_current = ContextVar("profiler", default=None)
+_default = Profiler()
+
+
+def activate(profiler):
+    """
+    Make a profiler record the stages run by the current thread, such as the run of a page of a session.
+
+    :param profiler: The profiler to activate
+    """
+    _current.set(profiler)
+
+
+def current_profiler():
+    """
+    :return: The profiler activated for the current thread, or else a disabled one recording nothing
+    """
+    return _current.get() or _default
+
+
+def stage(name, rows=None):
+    """
+    Mark a stage of the pipeline, recorded by the profiler activated for the current thread if it is enabled:
+    with stage("parse", rows=len(df)): ...
+
+    :param name: The name of the stage
+    :param rows: The number of rows processed by the stage, can also be set on the stage while it runs
+    :return: The context manager recording the stage
+    """
+    return current_profiler().stage(name, rows)
@@ -0,0 +1,112 @@
+import csv
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from reader import POWER, POWER_COLUMNS, TIME, StreamExtractor, find_data_column, float_options
+
+# The default number of time bins kept for the chart, and the largest number of new bytes parsed per poll
+HISTORY_POINTS = 6000
+MAX_POLL_BYTES = 64 * 2 ** 20
+
+
+class LiveTail:
+    """
+    Follows an EnergiBridge CSV file that is still being written. Each poll only reads and parses the bytes
+    appended since the last one, and feeds the complete rows to a StreamExtractor, which carries the last time
+    and energy value and the running totals over between the polls. Only the last time bins are kept for the
+    chart, so the cost of a poll depends on the number of new rows instead of the length of the file.
+    """
+
+    def __init__(self, path, bin_width=0.1, history_points=HISTORY_POINTS, max_poll_bytes=MAX_POLL_BYTES):
+        """
+        :param path: The path of the CSV file to follow
+        :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+        :param history_points: The number of most recent time bins to keep for the chart
+        :param max_poll_bytes: The largest number of new bytes to parse per poll, so catching up with a long
+        capture is spread over multiple polls
+        """
+        self.path = path
+        self.bin_width = bin_width
+        self.history_points = history_points
+        self.max_poll_bytes = max_poll_bytes
+        self.restart()
+
+    def restart(self):
+        """
+        Forget everything read so far, to follow the file from its start again.
+        """
+        self.offset = 0
+        self.columns = None
+        self.key = None
+        self.extractor = None
+        self.caught_up = False
+        self._partial = b""
+        self._time = np.empty(0)
+        self._power = np.empty(0)
+
+    def poll(self):
+        """
+        Read and extract the rows appended to the file since the last poll. A file that became shorter was
+        replaced by a new capture, which is then followed from its start.
+
+        :return: The number of new rows extracted
+        """
+        # Start over when the file was truncated or replaced
+        size = os.path.getsize(self.path)
+        if size < self.offset:
+            self.restart()
+
+        # Read the new bytes, keeping an unfinished last line for the next poll
+        with open(self.path, "rb") as f:
+            f.seek(self.offset)
+            data = f.read(self.max_poll_bytes)
+        self.offset += len(data)
+        self.caught_up = self.offset >= size
+        data = self._partial + data
+        end = data.rfind(b"\n") + 1
+        data, self._partial = data[:end], data[end:]
+
+        # The first complete line is the header, which gives the column to extract
+        if self.columns is None:
+            if not data:
+                return 0
+            header, data = data.split(b"\n", 1)
+            self.columns = next(csv.reader([header.decode("utf-8-sig").rstrip("\r")]), [])
+            self.key = find_data_column(self.columns)
+            self.extractor = StreamExtractor(self.key in POWER_COLUMNS, self.bin_width)
+        if not data:
+            return 0
+
+        # Parse only the columns needed from the new rows and extract them
+        rows = pd.read_csv(io.BytesIO(data), header=None, names=self.columns, usecols=["Time", self.key],
+                           dtype={"Time": np.float64, self.key: np.float64}, engine="c", **float_options("c"))
+        power_tdf = self.extractor.feed(rows["Time"].to_numpy(), rows[self.key].to_numpy())
+
+        # Append the completed time bins to the bounded history
+        self._time = np.concatenate((self._time, power_tdf[TIME].to_numpy()))[-self.history_points:]
+        self._power = np.concatenate((self._power, power_tdf[POWER].to_numpy()))[-self.history_points:]
+        return len(rows)
+
+    @property
+    def history(self):
+        """
+        :return: A time-power DataFrame of the most recent completed time bins
+        """
+        return pd.DataFrame(data={TIME: self._time, POWER: self._power})
+
+    @property
+    def totals(self):
+        """
+        :return: A dict with the rows, duration (s), total energy (J), mean power (W) and last power (W) so far
+        """
+        extractor = self.extractor
+        if extractor is None or extractor.rows < 3:
+            return {"rows": extractor.rows if extractor else 0, "duration": 0.0, "total_energy": 0.0,
+                    "mean_power": np.nan, "last_power": np.nan}
+        return {"rows": extractor.rows, "duration": float(extractor.total_time),
+                "total_energy": extractor.total_energy,
+                "mean_power": extractor.total_energy / extractor.total_time if extractor.total_time else np.nan,
+                "last_power": float(self._power[-1]) if len(self._power) else np.nan}
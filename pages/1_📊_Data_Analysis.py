@@ -1,14 +1,16 @@
-import altair as alt
-import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
-from scipy import stats
 import statistics
 import streamlit as st
 from streamlit_modal import Modal
 
+from archive import ARCHIVE_EXTENSION
+from bundle_panel import show_export
 from help_texts import *
-from reader import read_uploaded_files, POWER, TIME
+from ingest_panel import get_ingestion, load_in_background
+from instrumentation import stage
+from profiling_panel import show_profile, start_profiling
+
+# Only the modules needed to show the uploader are imported here, the data, charting and statistics modules are
+# imported by the sections using them, so the page renders before they are loaded
 
 st.set_page_config(page_title="Data Analysis", page_icon="📊")
 
@@ -20,18 +22,18 @@ st.markdown("""
     """)
 
 
-def show_mean_charts(single, mean_df, names, total_energies):
+def show_mean_charts(run_set):
     """
     This method shows the mean power consumption of all the files in various chart formats. Along with this
     it displays extra information about the average energy usage and the totals of each file.
 
-    :param single: Whether a single file was uploaded
-    :param mean_df: The DataFrame with the mean data
-    :param names: The names of the uploaded files
-    :param total_energies: The list of total energy usage of each file
+    :param run_set: The RunSet of the uploaded files
     """
-    # Retrieve the time column from the index
-    mean_tdf = mean_df.reset_index()
+    import pandas as pd
+    from reader import POWER, TIME
+
+    single = run_set.single
+    total_energies = run_set.total_energies
 
     # Set the columns for the subheader and information icon
     header, help_modal = st.columns([10, 1])
@@ -49,6 +51,9 @@ def show_mean_charts(single, mean_df, names, total_energies):
     # Show the (average) total energy used and average power consumption
     st.info(f"{'Total' if single else 'Average total'} energy usage: {round(statistics.mean(total_energies), 2)}J")
 
+    # Show a time range selector and get the mean data of that range at a resolution fit for the charts
+    mean_tdf = select_time_range(run_set)
+
     # Create a tab element with the different chart variations
     tab_line, tab_area, tab_bar = st.tabs(["Line Chart", "Area Chart", "Bar Chart"])
     tab_line.line_chart(mean_tdf, x=TIME, y=POWER, use_container_width=True)
@@ -58,34 +63,51 @@ def show_mean_charts(single, mean_df, names, total_energies):
     # Show a DataFrame with the total energy consumption for each file, if there are multiple
     if not single:
         st.markdown("Total energy consumption of all the uploaded files:")
-        energy_usage_df = pd.DataFrame(data={"FILE": names,
-                                             "TOTAL ENERGY": [f"{round(te, 2)}J" for te in total_energies]})
+        summary = run_set.summary
+        energy_usage_df = pd.DataFrame(data={"FILE": summary["FILE"],
+                                             "TOTAL ENERGY": [f"{round(te, 2)}J" for te in summary["TOTAL ENERGY"]]})
         st.dataframe(energy_usage_df, hide_index=True)
     st.markdown("---")
 
 
-def show_errorband_charts(single, mean_df, power_df):
+def select_time_range(run_set):
+    """
+    Show a time range selector for the mean data and retrieve the data of the selected range from a
+    multi-resolution index, at the coarsest resolution that still has enough points for the charts. The samples
+    with the min and max power of each bucket are kept, so the peaks show at any zoom level.
+
+    :param run_set: The RunSet of the uploaded files
+    :return: A DataFrame with the time and power of the samples kept of the selected range
+    """
+    from downsampling import target_points
+    from pyramid import TimePyramid
+    from reader import POWER, TIME
+
+    # Index the mean data once and show the selector over its full time span
+    mean_df = run_set.mean_df
+    pyramid = run_set.memoize("pyramid", lambda: TimePyramid(mean_df.index, mean_df[POWER]))
+    start, end = (float(t) for t in pyramid.span)
+    if end > start:
+        start, end = st.slider("Time range (s):", min_value=start, max_value=end, value=(start, end), step=0.1)
+
+    # Retrieve the min and max samples of the selected range with the number of points of the charts
+    return pyramid.extremes(start, end, target_points()).rename(columns={"VALUE": POWER})
+
+
+def show_errorband_charts(run_set):
     """
     This method shows the mean power consumption of all the files with std and confidence intervals in
     various chart formats.
 
-    :param single: Whether a single file was uploaded
-    :param mean_df: The DataFrame with the mean data
-    :param power_df: The DataFrame with all the files' data
+    :param run_set: The RunSet of the uploaded files
     """
-    # Only show these if not just a single file
-    if not single:
-        # Get a time column mean df and a time indexed power column
-        mean_tdf = mean_df.reset_index()
-        mean_pdf = mean_df[POWER]
-
-        # Calculate the std and conf data across the DataFrames
-        std_data = power_df.std(axis=1)
-        conf_data = std_data * 2
+    import altair as alt
+    from reader import POWER, TIME
 
-        # Combine the data into one time, mean, std/conf DataFrame
-        std_df = pd.concat([mean_pdf, std_data], axis=1, keys=["MEAN", "STD"]).reset_index()
-        conf_df = pd.concat([mean_pdf, conf_data], axis=1, keys=["MEAN", "CONF"]).reset_index()
+    # Only show these if not just a single file
+    if not run_set.single:
+        # Get the time, mean, std/conf DataFrames downsampled for the charts, keeping the same rows for all
+        std_df, conf_df, mean_tdf = run_set.memoize("errorband_frames", lambda: errorband_frames(run_set))
 
         # Set the columns for the subheader and information icon
         header, help_modal = st.columns([10, 1])
@@ -119,36 +141,146 @@ def show_errorband_charts(single, mean_df, power_df):
         st.markdown("---")
 
 
-def normality_check(names, orv_pdfs_values):
+def errorband_frames(run_set):
+    """
+    Get the time, mean, std/conf DataFrames of the error band charts, downsampled with the same rows for all.
+
+    :param run_set: The RunSet of the uploaded files
+    :return: The downsampled std, conf and mean DataFrames
+    """
+    from downsampling import downsample_frame
+    from reader import TIME
+
+    std_df = downsample_frame(run_set.std_df, TIME, "MEAN")
+    return std_df, run_set.conf_df.loc[std_df.index], run_set.mean_df.reset_index().loc[std_df.index]
+
+
+def show_channel_charts(run_set, uploaded_files):
+    """
+    This method shows the power consumption of each channel (such as each core) of a file stacked over time,
+    along with the total energy usage of each channel.
+
+    :param run_set: The RunSet of the uploaded files
+    :param uploaded_files: The list of uploaded files, the channels are read from the CSV files
+    """
+    import altair as alt
+    import numpy as np
+    import pandas as pd
+    from archive import is_archive
+    from downsampling import bucket_means, target_points
+    from reader import POWER, TIME, file_name, load_channels
+
+    # Only the CSV files hold the channels, archives only hold the total power
+    files = {file_name(file): file for file in uploaded_files if not is_archive(file)}
+    if not files:
+        return
+
+    # Set the columns for the subheader and information icon
+    header, help_modal = st.columns([10, 1])
+    header.subheader("Power consumption per channel over time:")
+
+    # Create help modal
+    channel_chart_modal = Modal("Power per channel charts", key="channel_chart_modal")
+    open_modal = help_modal.button("❔", key="channel_chart_modal")
+    if open_modal:
+        with channel_chart_modal.container():
+            st.markdown(help_text_channel_chart_modal)
+
+    # Read the channels of the selected file, memoized per file
+    name = st.selectbox("File:", list(files)) if len(files) > 1 else next(iter(files))
+    channel_tdf, total_energies = run_set.memoize(("channels", name), lambda: load_channels(files[name]))
+    channels = total_energies.index.tolist()
+    if not channels:
+        st.info("This file has no per-channel (such as per-core) energy or power columns.")
+        st.markdown("---")
+        return
+
+    # Average the channels over the same buckets of time, keeping the number of drawn points bounded, and show them
+    # stacked so the height is the power of all the channels together
+    time, power = bucket_means(channel_tdf[TIME].to_numpy(), channel_tdf[channels].to_numpy(),
+                               max(100, min(target_points(), 50000 // len(channels))))
+    stacked_df = pd.DataFrame(data={TIME: np.repeat(time, len(channels)), "Channel": np.tile(channels, len(time)),
+                                    "Index": np.tile(np.arange(len(channels)), len(time)), POWER: power.ravel()})
+    st.altair_chart(alt.Chart(stacked_df).mark_area()
+                    .encode(x=TIME, y=alt.Y(POWER, stack="zero"), color=alt.Color("Channel:N", sort=channels),
+                            order="Index:Q", tooltip=["Channel", TIME, POWER]),
+                    use_container_width=True)
+
+    # Show the total energy and mean power of each channel, with its share of the energy of all channels
+    channel_df = pd.DataFrame(data={"CHANNEL": channels,
+                                    "TOTAL ENERGY (J)": total_energies.to_numpy(),
+                                    "MEAN POWER (W)": channel_tdf[channels].mean().to_numpy(),
+                                    "SHARE (%)": 100 * total_energies.to_numpy() / total_energies.sum()})
+    st.dataframe(channel_df, hide_index=True)
+    st.markdown("---")
+
+
+def show_statistics(run_set):
     """
-    Perform the normality checks of the individual data files and all files combined and display them.
+    Show the data statistics section, the outlier removal input with the normality checks and violin charts
+    of the outlier removed data. Changing the outlier removal value only recomputes the stages depending on it,
+    all stages are memoized per outlier removal value in the run set.
+
+    :param run_set: The RunSet of the uploaded files
+    :return: The outlier removal value
+    """
+    from distributions import violin_figure
+
+    # Set the columns for the subheader and information icon
+    header, help_modal = st.columns([10, 1])
+    header.subheader("Data distribution of Power")
+
+    # Create help modal
+    boxplot_modal = Modal("Power data distribution", key="boxplot_modal")
+    open_modal = help_modal.button("❔", key="boxplot_modal")
+    if open_modal:
+        with boxplot_modal.container():
+            st.markdown(help_text_boxplot_modal)
+
+    # Perform outlier removal for the data statistics
+    st.markdown("""
+        The information below reports statistics about the power data. 
+        A common convention is to apply outlier removal on the data which we provide below.
+        Set the number of standard deviations to keep included (default 3).
+        """)
+    orv = st.number_input("Outlier removal:", value=3, step=1, min_value=1)
+    names = run_set.names + ["Total"]
+
+    # Show the data statistics charts
+    normality_check(names, run_set.normality_tests(orv), run_set.distribution_summary(orv, names))
+    generate_power_violin_charts(run_set.memoize(("violin", orv),
+                                                 lambda: violin_figure(names, run_set.violin_stats(orv))))
+    return orv
+
+
+def normality_check(names, tests, summary):
+    """
+    Display the normality checks and distribution statistics of the individual data files and all files combined.
 
     :param names: The names of the uploaded files
-    :param orv_pdfs_values: The outlier removed values of all the files
+    :param tests: The normality test (p-value, test name) of all the files
+    :param summary: The DataFrame with the distribution statistics of all the files
     """
-    # Calculate the p values and get the corresponding normality values
-    p_values = list(map(lambda data: stats.shapiro(data).pvalue, orv_pdfs_values))
+    import pandas as pd
+
+    # Get the normality values corresponding to the p values
+    p_values, test_names = zip(*tests)
     normality_values = list(map(lambda pval: str(pval > 0.05), p_values))
 
-    # Display the p and normality values in a DataFrame
-    normality_df = pd.DataFrame(data={"FILE": names, "NORMAL": normality_values, "P-VALUE": p_values})
+    # Display the p and normality values in a DataFrame, followed by the distribution statistics
+    normality_df = pd.DataFrame(data={"FILE": names, "NORMAL": normality_values, "P-VALUE": p_values,
+                                      "TEST": test_names})
     st.dataframe(normality_df, hide_index=True)
+    st.dataframe(summary, hide_index=True)
 
 
-def generate_power_violin_charts(names, orv_pdfs_values):
+def generate_power_violin_charts(image):
     """
-    Generate the violin charts of the individual data files and all files combined and display them.
+    Display the violin charts of the individual data files and all files combined.
 
-    :param names: The names of the uploaded files
-    :param orv_pdfs_values: The outlier removed values of all the files
+    :param image: The PNG image bytes of the figure with the violin charts
     """
-    # Create the violin plots of the data files
-    plt.violinplot(dataset=orv_pdfs_values, showmedians=True)
-    plt.ylabel("Power (W)")
-    plt.xlabel("File")
-    plt.xticks(range(1, len(names) + 1), labels=names)
-
-    st.pyplot(plt.gcf())
+    st.image(image)
     st.markdown("---")
 
 
@@ -158,8 +290,11 @@ def main():
     The file uploader with some help information is displayed. Then when one or more files is uploaded all
     the data analysis charts and information is called to be displayed.
     """
+    profiler = start_profiling("analysis_profiler")
+
     # Upload multiple files
-    uploaded_files = st.file_uploader("Upload CSV files", type=["csv"], accept_multiple_files=True)
+    uploaded_files = st.file_uploader("Upload CSV files or archives", type=["csv", ARCHIVE_EXTENSION[1:]],
+                                      accept_multiple_files=True)
 
     # Create help modal
     insert_files_modal = Modal("Inserting files", key="insert_files_modal")
@@ -170,43 +305,36 @@ def main():
 
     # Process the uploaded files
     if uploaded_files:
+        from bundle import build_bundle
+        from runset import load_run_sets
+
         st.markdown("---")
-        # Retrieve the useful data formats and information from the uploaded files
-        power_df, mean_df, total_energies, names, stat_pdfs = read_uploaded_files(uploaded_files)
+        # Load the files in the background as they are uploaded, showing the progress until all are loaded
+        ingestion = get_ingestion("analysis_ingestion")
+        load_in_background(ingestion, [uploaded_files])
 
-        # Whether a single file was uploaded, this is handled in each chart for all changes
-        single = len(uploaded_files) == 1
+        # Retrieve the useful data formats and information from the loaded files
+        with stage("load run sets", rows=len(uploaded_files)):
+            run_set = load_run_sets([uploaded_files], st.session_state, "analysis_run_sets", ingestion=ingestion)[0]
 
         # Show the power data analysis charts
-        show_mean_charts(single, mean_df, names, total_energies)
-        show_errorband_charts(single, mean_df, power_df)
-
-        # Set the columns for the subheader and information icon
-        header, help_modal = st.columns([10, 1])
-        header.subheader("Data distribution of Power")
-
-        # Create help modal
-        boxplot_modal = Modal("Power data distribution", key="boxplot_modal")
-        open_modal = help_modal.button("❔", key="boxplot_modal")
-        if open_modal:
-            with boxplot_modal.container():
-                st.markdown(help_text_boxplot_modal)
-
-        # Perform outlier removal for the data statistics
-        st.markdown("""
-            The information below reports statistics about the power data. 
-            A common convention is to apply outlier removal on the data which we provide below.
-            Set the number of standard deviations to keep included (default 3).
-            """)
-        orv = st.number_input("Outlier removal:", value=3, step=1, min_value=1)
-        orv_pdfs_values = [stat_pdf[(np.abs(stats.zscore(stat_pdf)) < orv)].tolist() for stat_pdf in stat_pdfs]
-
-        orv_pdfs_values.append([x for xs in orv_pdfs_values for x in xs])
-        names.append("Total")
-
-        # Show the data statistics charts
-        normality_check(names, orv_pdfs_values)
-        generate_power_violin_charts(names, orv_pdfs_values)
+        with stage("show mean charts"):
+            show_mean_charts(run_set)
+        with stage("show errorband charts"):
+            show_errorband_charts(run_set)
+        with stage("show channel charts"):
+            show_channel_charts(run_set, uploaded_files)
+
+        # Show the power data statistics
+        with stage("show statistics"):
+            orv = show_statistics(run_set)
+
+        # Show the export of the report
+        with stage("show export"):
+            show_export(run_set, (orv,), lambda: build_bundle(["Uploaded files"], [run_set], orv),
+                        "energireporter_analysis")
+
+    show_profile(profiler)
 
 
 # Run the main script
@@ -1,28 +1,28 @@
-import altair as alt
-import matplotlib.pyplot as plt
-import numpy as np
-import pandas as pd
-from scipy import stats
 import streamlit as st
 from streamlit_modal import Modal
 
+from archive import ARCHIVE_EXTENSION
+from bundle_panel import show_export
 from help_texts import *
-from reader import read_uploaded_files, POWER, TIME
+from ingest_panel import get_ingestion, load_in_background
+from instrumentation import stage
+from profiling_panel import show_profile, start_profiling
+
+# Only the modules needed to show the uploaders are imported here, the data, charting and statistics modules are
+# imported by the sections using them, so the page renders before they are loaded
 
 st.set_page_config(page_title="Data Comparison", page_icon="📈")
 
 # Page information/text
 st.markdown("# Data Comparison")
 st.markdown("""
-    This page compares the energy data between two single or sets sets of measurements.
+    This page compares the energy data between two or more single or sets sets of measurements.
     Upload your (sets of) CSV files adhering to the format specified on the home page to generate the charts.
     """)
 
-# Category colors for the compare plots
-category_colors = alt.Color("Set:N", scale=alt.Scale(
-    domain=["Set #1", "Set #2"],
-    range=["#1f77b4", '#ff7f0e']
-))
+# The largest number of sets that can be compared, with the ordinal used to indicate each set
+MAX_SETS = 10
+ORDINALS = ["first", "second", "third", "fourth", "fifth", "sixth", "seventh", "eighth", "ninth", "tenth"]
 
 
 def show_mean_charts(singles, means_df, name_lists, all_total_energies):
@@ -35,8 +35,14 @@ def show_mean_charts(singles, means_df, name_lists, all_total_energies):
     :param name_lists: A list with the names of the uploaded files for each set
     :param all_total_energies: A list of lists of the total energy usage of each file for each set
     """
-    # Retrieve the time column from the index
-    means_tdf = means_df.reset_index()
+    import altair as alt
+    import pandas as pd
+    from bundle import category_colors, mean_chart
+    from downsampling import downsample_frame
+    from reader import POWER, TIME
+
+    # Retrieve the time column from the index and downsample it for the charts, preserving the shape of each set
+    means_tdf = downsample_frame(means_df.reset_index(), TIME, means_df.columns.tolist())
 
     # Melt the dataframe to have a column for the power value and another for the power number
     melted_means_tdf = means_tdf.melt(id_vars=[TIME], var_name="Set", value_name=POWER)
@@ -45,7 +51,7 @@ def show_mean_charts(singles, means_df, name_lists, all_total_energies):
     header, help_modal = st.columns([10, 1])
 
     # Show the header of this chart and information
-    header.subheader(f"Power consumption {'' if singles[0] and singles[1]  else 'averages '}over time:")
+    header.subheader(f"Power consumption {'' if all(singles) else 'averages '}over time:")
 
     # Create help modal
     boxplot_mean_chart_modal = Modal("Power mean charts", key="boxplot_mean_chart_modal_comparison")
@@ -58,35 +64,36 @@ def show_mean_charts(singles, means_df, name_lists, all_total_energies):
     tab_line, tab_area = st.tabs(["Line Chart", "Area Chart"])
 
     # Assign the tabs altair charts (using with notation) to label the axis and indicate set colors
+    colors = category_colors(means_df.columns.tolist())
     with tab_line:
-        st.altair_chart(alt.Chart(melted_means_tdf).mark_line()
-                        .encode(x=TIME, y=POWER, color=category_colors, tooltip=["Set", POWER]),
-                        use_container_width=True)
+        st.altair_chart(mean_chart(melted_means_tdf, colors), use_container_width=True)
     with tab_area:
         st.altair_chart(alt.Chart(melted_means_tdf).mark_area(opacity=0.7)
-                        .encode(x=TIME, y=POWER, color=category_colors, tooltip=["Set", POWER]),
+                        .encode(x=TIME, y=POWER, color=colors, tooltip=["Set", POWER]),
                         use_container_width=True)
 
-    # Show DataFrames with the total energy consumption for each file
+    # Show DataFrames with the total energy consumption for each file, two sets per row
     st.markdown("Total energy consumption of all the uploaded files:")
-    energy_usage_dfs = st.columns(2)
-    for i in range(2):
+    for i in range(len(name_lists)):
+        if i % 2 == 0:
+            energy_usage_dfs = st.columns(2)
         energy_usage_df = pd.DataFrame(data={"FILE": name_lists[i],
                                              "TOTAL ENERGY": [f"{round(te, 2)}J" for te in all_total_energies[i]]})
-        energy_usage_dfs[i].dataframe(energy_usage_df, hide_index=True)
+        energy_usage_dfs[i % 2].dataframe(energy_usage_df, hide_index=True)
     st.markdown("---")
 
 
-def show_errorband_charts(singles, mean_dfs, power_dfs):
+def show_errorband_charts(singles, run_sets):
     """
     This method shows the mean power consumption of all the files with std and confidence intervals in
-    various chart formats. It does this for 2 (extendable to more) sets of data/information showing them
-    both in the same charts.
+    various chart formats. It does this for all the sets of data/information showing them in the same charts.
 
     :param singles: A list indicating for each set whether a single file was uploaded
-    :param mean_dfs: A list of DataFrames with the mean data for each set
-    :param power_dfs: A list of DataFrames with all the files' data for each set
+    :param run_sets: The list of RunSets of the uploaded files for each set
     """
+    import pandas as pd
+    from bundle import category_colors, errorband_chart
+
     if not any(singles):
         # Create the list to add the chart information in
         mean_tdfs = []
@@ -94,30 +101,20 @@ def show_errorband_charts(singles, mean_dfs, power_dfs):
         conf_dfs = []
 
         # Get the mean and errorband DataFrames for each set
-        for i, mean_df in enumerate(mean_dfs):
-            # Get the current power df as well and the set indication to add everywhere
-            power_df = power_dfs[i]
+        for i, run_set in enumerate(run_sets):
+            # Get the set indication to add everywhere
             set_indicator = f"Set #{i+1}"
 
-            # Get the mean time restored DataFrame, with its set indication added and add it to the list
-            mean_tdf = mean_df.reset_index()
-            mean_tdf["Set"] = set_indicator
-            mean_tdfs.append(mean_tdf)
-
-            # Calculate the mean, std, and conf data across the DataFrames, all time indexed
-            mean_pdf = mean_df[POWER]
-            std_data = power_df.std(axis=1)
-            conf_data = std_data * 2
+            # Get the time, mean, std/conf DataFrames downsampled for the charts, keeping the same rows for all
+            std_df, conf_df, mean_tdf = run_set.memoize("errorband_frames", lambda: errorband_frames(run_set))
 
-            # Combine the data into one time, mean, std/conf DataFrame
-            std_df = pd.concat([mean_pdf, std_data], axis=1, keys=["MEAN", "STD"]).reset_index()
-            std_df["Set"] = set_indicator
-            std_dfs.append(std_df)
-            conf_df = pd.concat([mean_pdf, conf_data], axis=1, keys=["MEAN", "CONF"]).reset_index()
-            conf_df["Set"] = set_indicator
-            conf_dfs.append(conf_df)
+            # Add the set indication to the DataFrames and add them to the lists
+            mean_tdfs.append(mean_tdf.assign(Set=set_indicator))
+            std_dfs.append(std_df.assign(Set=set_indicator))
+            conf_dfs.append(conf_df.assign(Set=set_indicator))
 
         # Concatenate the chart information to get all the entries into one list
+        colors = category_colors([f"Set #{i+1}" for i in range(len(run_sets))])
         means_tdf = pd.concat(mean_tdfs, ignore_index=True)
         stds_df = pd.concat(std_dfs, ignore_index=True)
         confs_df = pd.concat(conf_dfs, ignore_index=True)
@@ -139,46 +136,57 @@ def show_errorband_charts(singles, mean_dfs, power_dfs):
         tab_std, tab_conf = st.tabs(["STD Chart", "Conf Chart"])
 
         # Add the tab charts with the error bands
-        tab_std.altair_chart(alt.Chart(means_tdf)
-                             .mark_line().interactive()
-                             .encode(x=TIME, y=POWER, color=category_colors, tooltip=["Set", POWER]) +
-                             alt.Chart(stds_df).mark_errorband(extent="ci")
-                             .encode(x=TIME, y=alt.Y("MEAN", title=POWER), yError="STD", color="Set:N"),
-                             use_container_width=True)
-        tab_conf.altair_chart(alt.Chart(means_tdf)
-                              .mark_line().interactive()
-                              .encode(x=TIME, y=POWER, color=category_colors, tooltip=["Set", POWER]) +
-                              alt.Chart(confs_df).mark_errorband(extent="ci")
-                              .encode(x=TIME, y=alt.Y("MEAN", title=POWER), yError="CONF", color="Set:N"),
-                              use_container_width=True)
+        tab_std.altair_chart(errorband_chart(means_tdf, stds_df, "STD", colors), use_container_width=True)
+        tab_conf.altair_chart(errorband_chart(means_tdf, confs_df, "CONF", colors), use_container_width=True)
         st.markdown("---")
 
 
-def normality_check(names, orv_pdfs_values):
+def errorband_frames(run_set):
     """
-    Perform the normality checks of the individual data files and all files combined and display them.
+    Get the time, mean, std/conf DataFrames of the error band charts, downsampled with the same rows for all.
+
+    :param run_set: The RunSet of the uploaded files of a set
+    :return: The downsampled std, conf and mean DataFrames
+    """
+    from downsampling import downsample_frame
+    from reader import TIME
+
+    std_df = downsample_frame(run_set.std_df, TIME, "MEAN")
+    return std_df, run_set.conf_df.loc[std_df.index], run_set.mean_df.reset_index().loc[std_df.index]
+
+
+def normality_check(names, tests, summary):
+    """
+    Display the normality checks and distribution statistics of the individual data files and all files combined.
 
     :param names: The names of the uploaded files
-    :param orv_pdfs_values: The outlier removed values of all the files
+    :param tests: The normality test (p-value, test name) of all the files
+    :param summary: The DataFrame with the distribution statistics of all the files
     """
-    # Calculate the p values and get the corresponding normality values
-    p_values = list(map(lambda data: stats.shapiro(data).pvalue, orv_pdfs_values))
+    import pandas as pd
+
+    # Get the normality values corresponding to the p values
+    p_values, test_names = zip(*tests)
     normality_values = list(map(lambda pval: str(pval > 0.05), p_values))
 
-    # Display the p and normality values in a DataFrame
-    normality_df = pd.DataFrame(data={"FILE": names, "NORMAL": normality_values, "P-VALUE": p_values})
+    # Display the p and normality values in a DataFrame, followed by the distribution statistics
+    normality_df = pd.DataFrame(data={"FILE": names, "NORMAL": normality_values, "P-VALUE": p_values,
+                                      "TEST": test_names})
     st.dataframe(normality_df, hide_index=True)
+    st.dataframe(summary, hide_index=True)
 
 
-def generate_power_boxplot_charts(string, names, orv_pdfs_values):
+def generate_power_boxplot_charts(string, run_set):
     """
     Generate the violin charts of the individual data files and all files combined and display them,
     all the information displayed is indicated with a string related to the set.
 
     :param string: The string used to indicate the set of data used for the charts and more
-    :param names: The names of the uploaded files
-    :param orv_pdfs_values: The outlier removed values of all the files
+    :param run_set: The RunSet of the uploaded files of the set
+    :return: The outlier removal value of the set
     """
+    from distributions import violin_figure
+
     # Set the columns for the subheader and information icon
     header, help_modal = st.columns([10, 1])
 
@@ -199,68 +207,133 @@ def generate_power_boxplot_charts(string, names, orv_pdfs_values):
                 Set the number of standard deviations to keep included (default 3).
                 """)
     orv = st.number_input("Outlier removal:", value=3, step=1, min_value=1, key=string)
-    orv_pdfs_values = [stat_pdf[(np.abs(stats.zscore(stat_pdf)) < orv)].tolist() for stat_pdf in orv_pdfs_values]
-
-    orv_pdfs_values.append([x for xs in orv_pdfs_values for x in xs])
-    names.append("Total of " + string)
-
-    normality_check(names, orv_pdfs_values)
-
-    # Create the violin plots of the data files
-    plt.figure()
-    plt.violinplot(dataset=orv_pdfs_values, showmedians=True)
-    plt.ylabel("Power (W)")
-    plt.xlabel("File")
-    plt.xticks(range(1, len(names) + 1), labels=names)
+    names = run_set.names + ["Total of " + string]
 
-    st.pyplot(plt.gcf())
+    # Show the normality checks and the violin plots, both memoized per outlier removal value
+    normality_check(names, run_set.normality_tests(orv), run_set.distribution_summary(orv, names))
+    st.image(run_set.memoize(("violin", orv, string), lambda: violin_figure(names, run_set.violin_stats(orv))))
     st.markdown("---")
+    return orv
 
 
-def compare_statistical_analysis(data1, data2):
+def compare_statistical_analysis(run_set1, run_set2):
     """
     Statistical analysis is performed to find any significant relations between the data.
     The results from various tests are reported to the user.
 
-    :param data1: The data of the first set
-    :param data2: The data of the second set
+    :param run_set1: The RunSet of the first set
+    :param run_set2: The RunSet of the second set
     """
-    # The header and the arrays
+    from bundle import resampling_table
+    from comparison import compare_sets
+
+    # The header and the test results, memoized for this pair of sets
     st.subheader("Comparing the data with statistical analysis")
-    data1 = [x for xs in data1 for x in xs]
-    data2 = [x for xs in data2 for x in xs]
+    results = run_set1.memoize(("comparison", run_set2),
+                               lambda: compare_sets(run_set1.pooled, run_set2.pooled,
+                                                    run_set1.total_energies, run_set2.total_energies))
 
     # Show the Welch's t-test results
-    _, p_value1 = stats.ttest_ind(data1, data2, alternative="two-sided")
+    p_value1 = results["welch"]
     st.markdown(f"According to [Welch\'s t-test](https://en.wikipedia.org/wiki/Welch%27s_t-test) "
                 f"the difference is **{'NOT ' if p_value1 >= 0.05 else ''}SIGNIFICANT** "
                 f"(with p-value {round(p_value1, 4)})")
 
     # Show the MannWhitneyU-test results
-    _, p_value2 = stats.mannwhitneyu(data1, data2, alternative="two-sided")
+    p_value2 = results["mannwhitneyu"]
     st.markdown(f"According to the [MannWhitneyU-test](https://en.wikipedia.org/wiki/Mann%E2%80%93Whitney_U_test) "
                 f"the difference is **{'NOT ' if p_value2 >= 0.05 else ''}SIGNIFICANT** "
                 f"(with p-value {round(p_value2, 4)})")
 
     # Show the Percentage of Pairs test results
-    data1higher = round(min(100, 100 * len(list(filter(lambda s: s[0] > s[1], zip(data1, data2)))) /
-                            min(len(data1), len(data2))), 2)
     st.markdown(f"According to the Percentage of Pairs test, the first set has a higher power than the second set "
-                f"in {data1higher}% of the measurements")
+                f"in {results['higher']}% of all pairs of measurements")
+
+    # Show the resampling tests of the differences in mean power and mean total energy with the effect sizes
+    resampling_df = resampling_table(results)
+    st.markdown("The differences (first minus second set) with their bootstrap confidence intervals and "
+                "permutation tests:")
+    st.dataframe(resampling_df, hide_index=True)
+    st.markdown(f"The effect size of the difference in power is {round(results['cohens_d'], 3)} (Cohen's d) "
+                f"and {round(results['cliffs_delta'], 3)} (Cliff's delta)")
+
+
+def compare_all_sets(set_names, run_sets):
+    """
+    Statistical analysis is performed on every pair of sets, with the p-values corrected for the number of pairs
+    compared. The results are shown as a heatmap of the selected test and a table of all the pairs.
+
+    :param set_names: The names of the sets
+    :param run_sets: The list of RunSets of the sets
+    :return: The multiple comparison correction selected
+    """
+    import altair as alt
+    import pandas as pd
+    from bundle import pairwise_table
+    from comparison import CORRECTIONS, compare_many
+
+    # Set the columns for the subheader and information icon
+    header, help_modal = st.columns([10, 1])
+    header.subheader("Comparing all pairs of sets with statistical analysis")
+
+    # Create help modal
+    pairwise_modal = Modal("Pairwise comparison", key="pairwise_comparison_modal")
+    open_modal = help_modal.button("❔", key="pairwise_comparison_modal")
+    if open_modal:
+        with pairwise_modal.container():
+            st.markdown(help_text_pairwise_comparison)
+
+    # The test to show and the correction for comparing all the pairs, the results are memoized for these sets
+    columns = st.columns(2)
+    measures = {"Welch's t-test p-value": "welch_adjusted", "MannWhitneyU-test p-value": "mannwhitneyu_adjusted",
+                "Percentage of Pairs (%)": "higher", "Difference in mean power (W)": "mean_difference"}
+    measure = columns[0].selectbox("Show:", list(measures))
+    corrections = dict(zip(["Holm-Bonferroni", "Bonferroni", "Benjamini-Hochberg (FDR)", "None"], CORRECTIONS))
+    correction = corrections[columns[1].selectbox("Multiple comparison correction:", list(corrections))]
+    results = run_sets[0].memoize(("pairwise", tuple(run_sets[1:]), correction),
+                                  lambda: compare_many([run_set.pooled for run_set in run_sets], correction))
+
+    # Show the heatmap of the selected test, a row set compared to a column set
+    k = len(set_names)
+    heatmap_df = pd.DataFrame(data={"Set": [set_names[i] for i in range(k) for _ in range(k)],
+                                    "Compared to": [set_names[j] for _ in range(k) for j in range(k)],
+                                    "Value": results[measures[measure]].ravel()}).dropna()
+    is_p_value = measures[measure].endswith("_adjusted")
+    color_scale = (alt.Scale(domain=[0, 0.05, 1], range=["#d62728", "#fdd49e", "#f7f7f7"]) if is_p_value
+                   else alt.Scale(scheme="redblue", domainMid=50 if measures[measure] == "higher" else 0,
+                                  reverse=True))
+    base = alt.Chart(heatmap_df).encode(x=alt.X("Compared to:N", sort=set_names),
+                                        y=alt.Y("Set:N", sort=set_names))
+    st.altair_chart(base.mark_rect().encode(color=alt.Color("Value:Q", scale=color_scale, title=measure),
+                                            tooltip=["Set", "Compared to", "Value"]) +
+                    base.mark_text(fontSize=11).encode(text=alt.Text("Value:Q", format=".3g")),
+                    use_container_width=True)
+
+    # Show all the pairs with the corrected p-values
+    pairs_df = pairwise_table(set_names, results)
+    st.markdown("The tests of all the pairs of sets, with the p-values corrected for the number of pairs:")
+    st.dataframe(pairs_df, hide_index=True)
+    return correction
 
 
 # The main script to run but scoped now
 def main():
     """
-    The file uploader with some help information is displayed. Then when one or more files is uploaded for both
-    sets all the data comparison charts and information is called to be displayed.
+    The file uploaders with some help information are displayed. Then when one or more files is uploaded for all
+    the sets all the data comparison charts and information is called to be displayed, with the comparison of
+    the two sets, or of all the pairs of sets when more sets are compared.
     """
-    # File uploaders for both sets of files
-    upload_columns = st.columns(2)
-    uploaded_files1 = upload_columns[0].file_uploader("Upload first set of CSV files",
-                                                      type=["csv"], accept_multiple_files=True)
-    uploaded_files2 = upload_columns[1].file_uploader("Upload second set of CSV files",
-                                                      type=["csv"], accept_multiple_files=True)
+    profiler = start_profiling("comparison_profiler")
+
+    # File uploaders for each set of files, two per row
+    set_count = st.number_input("Number of sets:", value=2, step=1, min_value=2, max_value=MAX_SETS)
+    uploaded_file_sets = []
+    for i in range(set_count):
+        if i % 2 == 0:
+            upload_columns = st.columns(2)
+        uploaded_file_sets.append(upload_columns[i % 2].file_uploader(
+            f"Upload {ORDINALS[i]} set of CSV files or archives", type=["csv", ARCHIVE_EXTENSION[1:]],
+            accept_multiple_files=True))
 
     # Create help modal
     boxplot_insert_files_comparison = Modal("Inserting files", key="boxplot_insert_files_comparison")
@@ -269,42 +342,62 @@ def main():
         with boxplot_insert_files_comparison.container():
             st.markdown(help_text_insert_files_comparison)
 
+    # Start loading the files in the background as they are uploaded, also while other sets are still empty
+    ingestion = get_ingestion("comparison_ingestion")
+    ingestion.submit([file for files in uploaded_file_sets for file in files])
+
     # Process the uploaded sets of files
-    if uploaded_files1 and uploaded_files2:
+    if all(uploaded_file_sets):
+        import pandas as pd
+        from bundle import build_bundle
+        from reader import POWER
+        from runset import load_run_sets
+
         st.markdown("---")
 
-        # Initialize the lists to store the dataframes and additional information
-        power_dfs = []
-        stat_pdfs = []
-        name_lists = []
-        mean_dfs = []
-        all_total_energies = []
-        singles = []
-
-        # Iterate over the uploaded sets of files
-        for i, uploaded_files in enumerate([uploaded_files1, uploaded_files2]):
-            # Retrieve the useful data formats and information from the uploaded files and set it in the lists
-            power_df, mean_df, total_energies, names, stat_pdf = read_uploaded_files(uploaded_files)
-            power_dfs.append(power_df)
-            stat_pdfs.append(stat_pdf)
-            mean_dfs.append(mean_df)
-            name_lists.append(names)
-            all_total_energies.append(total_energies)
-            singles.append(len(uploaded_files) == 1)
+        # Show the progress until all the files are loaded, then retrieve the run sets from all sets of files
+        file_sets = uploaded_file_sets
+        set_names = [f"Set #{i + 1}" for i in range(len(file_sets))]
+        load_in_background(ingestion, file_sets, set_names)
+        with stage("load run sets", rows=sum(len(files) for files in file_sets)):
+            run_sets = load_run_sets(file_sets, st.session_state, "comparison_run_sets", ingestion=ingestion)
+
+        # Get the additional information of each set
+        singles = [run_set.single for run_set in run_sets]
+        name_lists = [run_set.names for run_set in run_sets]
+        all_total_energies = [run_set.total_energies for run_set in run_sets]
 
         # Concatenate the DataFrames power columns indicated by which set they belong to
-        means_df = pd.concat([mean_df[POWER] for mean_df in mean_dfs], axis=1, keys=["Set #1", "Set #2"])
+        means_df = pd.concat([run_set.mean_df[POWER] for run_set in run_sets], axis=1, keys=set_names)
 
         # Show the data analysis charts
-        show_mean_charts(singles, means_df, name_lists, all_total_energies)
-        show_errorband_charts(singles, mean_dfs, power_dfs)
+        with stage("show mean charts"):
+            show_mean_charts(singles, means_df, name_lists, all_total_energies)
+        with stage("show errorband charts"):
+            show_errorband_charts(singles, run_sets)
 
         # Show the power statistic charts
-        generate_power_boxplot_charts("First dataset", name_lists[0], stat_pdfs[0])
-        generate_power_boxplot_charts("Second dataset", name_lists[1], stat_pdfs[1])
+        strings = [f"{ordinal.capitalize()} dataset" for ordinal in ORDINALS[:len(run_sets)]]
+        with stage("show statistics"):
+            orvs = [generate_power_boxplot_charts(string, run_set) for string, run_set in zip(strings, run_sets)]
 
         # Show the statistical analysis comparison information
-        compare_statistical_analysis(stat_pdfs[0], stat_pdfs[1])
+        correction = "holm"
+        with stage("show comparison"):
+            if len(run_sets) == 2:
+                compare_statistical_analysis(run_sets[0], run_sets[1])
+            else:
+                correction = compare_all_sets(set_names, run_sets)
+
+        # Show the export of the report, memoized for these sets with the first set
+        with stage("show export"):
+            st.markdown("---")
+            show_export(run_sets[0], (tuple(run_sets[1:]), tuple(orvs), correction),
+                        lambda: build_bundle(set_names, run_sets, orvs, correction,
+                                             [f"Total of {string}" for string in strings]),
+                        "energireporter_comparison")
+
+    show_profile(profiler)
 
 
 # Run the main script
@@ -0,0 +1,111 @@
+import os
+import time
+
+import streamlit as st
+from streamlit_modal import Modal
+
+from help_texts import *
+
+# Only the modules needed to show the inputs are imported here, the data modules are imported once a file is
+# followed, so the page renders before they are loaded
+
+st.set_page_config(page_title="Live Monitor", page_icon="📡")
+
+# Page information/text
+st.markdown("# Live Monitor")
+st.markdown("""
+    This page follows an EnergiBridge CSV file that is still being written, showing the energy used so far and
+    the most recent power consumption while the measurement runs.
+    """)
+
+
+def get_live_tail(path, bin_width, history_points):
+    """
+    Get the LiveTail of the followed file from the session state, so the file is not read again on every rerun.
+    A new one is created when the file or its settings change.
+
+    :param path: The path of the CSV file to follow
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+    :param history_points: The number of most recent time bins to keep for the chart
+    :return: The LiveTail of the file
+    """
+    from live import LiveTail
+
+    key = (path, bin_width)
+    if st.session_state.get("live_tail_key") != key:
+        st.session_state["live_tail_key"] = key
+        st.session_state["live_tail"] = LiveTail(path, bin_width, history_points)
+    tail = st.session_state["live_tail"]
+    tail.history_points = history_points
+    return tail
+
+
+def show_live_data(tail, metrics, chart):
+    """
+    Show the running totals and the recent power of the followed file in the placeholders.
+
+    :param tail: The LiveTail of the file
+    :param metrics: The placeholder of the running totals
+    :param chart: The placeholder of the power chart
+    """
+    from reader import POWER, TIME
+
+    totals = tail.totals
+    with metrics.container():
+        columns = st.columns(4)
+        columns[0].metric("Total energy", f"{totals['total_energy']:.2f}J")
+        columns[1].metric("Mean power", f"{totals['mean_power']:.2f}W")
+        columns[2].metric("Current power", f"{totals['last_power']:.2f}W")
+        columns[3].metric("Duration", f"{totals['duration']:.1f}s")
+    chart.line_chart(tail.history, x=TIME, y=POWER, use_container_width=True)
+
+
+# The main script to run but scoped now
+def main():
+    """
+    The inputs for the file to follow with some help information are displayed. Then while following is on, the
+    new rows of the file are read and the totals and chart are updated at the refresh interval.
+    """
+    # The file to follow and the refresh settings
+    path = st.text_input("Path of the CSV file to follow")
+    columns = st.columns(3)
+    interval = columns[0].number_input("Refresh interval (s):", value=1.0, step=0.5, min_value=0.1)
+    history_points = columns[1].number_input("Samples shown:", value=6000, step=1000, min_value=100)
+    bin_width = columns[2].number_input("Time bin width (s):", value=0.1, step=0.1, min_value=0.01)
+    follow = st.toggle("Follow the file", value=True)
+
+    # Create help modal
+    live_monitor_modal = Modal("Live monitor", key="live_monitor_modal")
+    open_modal = st.button("❔", key="live_monitor_modal")
+    if open_modal:
+        with live_monitor_modal.container():
+            st.markdown(help_text_live_monitor)
+
+    if not path:
+        return
+    if not os.path.isfile(path):
+        st.warning(f"The file {path} does not exist (yet)")
+        return
+
+    st.markdown("---")
+    tail = get_live_tail(path, bin_width, int(history_points))
+    metrics, chart = st.empty(), st.empty()
+
+    # Read the new rows and update the page, until following is turned off or the page reruns
+    while True:
+        try:
+            tail.poll()
+        except (OSError, ValueError) as error:
+            st.error(str(error))
+            return
+        show_live_data(tail, metrics, chart)
+        if not follow:
+            return
+
+        # Catch up with a long capture without waiting, as each poll only reads part of it
+        if tail.caught_up:
+            time.sleep(interval)
+
+
+# Run the main script
+main()
@@ -0,0 +1,160 @@
+import streamlit as st
+from streamlit_modal import Modal
+
+from help_texts import *
+
+# Only the modules needed to show the uploader are imported here, the bundle holds everything the report shows
+# already computed, so opening it does not load or recompute any data
+
+st.set_page_config(page_title="Report Viewer", page_icon="📦")
+
+# Page information/text
+st.markdown("# Report Viewer")
+st.markdown("""
+    This page shows a report bundle exported from the data analysis or data comparison page, without the data
+    files it was made from. Upload the bundle to view the report.
+    """)
+
+
+def get_bundle(uploaded_file):
+    """
+    Read an uploaded bundle and draw its violin charts, once per upload of the session.
+
+    :param uploaded_file: The uploaded bundle file
+    :return: The dict of the bundle and the PNG image bytes of the violin charts of each set
+    """
+    from bundle import bundle_violin_stats, read_bundle
+    from distributions import violin_figure
+
+    key = (uploaded_file.name, getattr(uploaded_file, "file_id", None) or uploaded_file.size)
+    stored = st.session_state.get("viewer_bundle")
+    if stored is None or stored[0] != key:
+        bundle = read_bundle(uploaded_file.getvalue())
+        images = [violin_figure(set_data["violins"]["names"], bundle_violin_stats(set_data))
+                  for set_data in bundle["sets"]]
+        stored = (key, bundle, images)
+        st.session_state["viewer_bundle"] = stored
+    return stored[1], stored[2]
+
+
+def show_mean_charts(sets):
+    """
+    Show the mean power of each set over time, with the std and confidence error bands of the sets with
+    multiple files.
+
+    :param sets: The list of set dicts of the bundle
+    """
+    import pandas as pd
+    from bundle import category_colors, errorband_chart, mean_chart
+    from reader import POWER, TIME
+
+    set_names = [set_data["name"] for set_data in sets]
+    colors = category_colors(set_names)
+    st.subheader("Power consumption over time:")
+
+    # The mean of each set, in one chart
+    means_df = pd.concat([pd.DataFrame(data={TIME: set_data["mean"]["time"], POWER: set_data["mean"]["power"],
+                                             "Set": set_data["name"]}) for set_data in sets], ignore_index=True)
+    st.altair_chart(mean_chart(means_df, colors).interactive(), use_container_width=True)
+
+    # The error bands of the sets with multiple files, the confidence interval being 2 std
+    bands = [pd.DataFrame(data={TIME: set_data["errorband"]["time"], "MEAN": set_data["errorband"]["mean"],
+                                "STD": set_data["errorband"]["std"], "CONF": 2 * set_data["errorband"]["std"],
+                                "Set": set_data["name"]})
+             for set_data in sets if set_data["errorband"] is not None]
+    if bands:
+        bands_df = pd.concat(bands, ignore_index=True)
+        band_means_df = bands_df.rename(columns={"MEAN": POWER})
+        st.subheader("Power consumption averages over time with error bands:")
+        for tab, error in zip(st.tabs(["STD Chart", "Conf Chart"]), ["STD", "CONF"]):
+            tab.altair_chart(errorband_chart(band_means_df, bands_df, error, colors), use_container_width=True)
+    st.markdown("---")
+
+
+def show_set(set_data, image):
+    """
+    Show the total energy of each file of a set, its normality and distribution tables and its violin charts.
+
+    :param set_data: The set dict of the bundle
+    :param image: The PNG image bytes of the violin charts of the set
+    """
+    import pandas as pd
+
+    st.subheader(set_data["name"])
+    summary = pd.DataFrame(set_data["summary"])
+    st.info(f"Average total energy usage: {round(summary['TOTAL ENERGY'].mean(), 2)}J")
+    st.dataframe(summary, hide_index=True)
+
+    # The distribution statistics of the outlier removed data
+    st.markdown(f"Data distribution of power, with an outlier removal of {set_data['outlier_removal']} standard "
+                f"deviations:")
+    st.dataframe(pd.DataFrame(set_data["normality"]), hide_index=True)
+    st.dataframe(pd.DataFrame(set_data["distribution"]), hide_index=True)
+    st.image(image)
+    st.markdown("---")
+
+
+def show_comparison(bundle):
+    """
+    Show the statistical comparison of two sets, or the corrected comparison of all the pairs of more sets.
+
+    :param bundle: The dict of the bundle
+    """
+    from bundle import pairwise_table, resampling_table
+
+    st.subheader("Comparing the data with statistical analysis")
+    if "comparison" in bundle:
+        results = bundle["comparison"]
+        for name, key in [("Welch's t-test", "welch"), ("MannWhitneyU-test", "mannwhitneyu")]:
+            st.markdown(f"According to the {name} the difference is "
+                        f"**{'NOT ' if results[key] >= 0.05 else ''}SIGNIFICANT** "
+                        f"(with p-value {round(results[key], 4)})")
+        st.markdown(f"According to the Percentage of Pairs test, the first set has a higher power than the second "
+                    f"set in {results['higher']}% of all pairs of measurements")
+        st.markdown("The differences (first minus second set) with their bootstrap confidence intervals and "
+                    "permutation tests:")
+        st.dataframe(resampling_table(results), hide_index=True)
+        st.markdown(f"The effect size of the difference in power is {round(results['cohens_d'], 3)} (Cohen's d) "
+                    f"and {round(results['cliffs_delta'], 3)} (Cliff's delta)")
+    else:
+        st.markdown(f"The tests of all the pairs of sets, with the p-values corrected for the number of pairs "
+                    f"({bundle['pairwise']['correction']}):")
+        st.dataframe(pairwise_table([set_data["name"] for set_data in bundle["sets"]], bundle["pairwise"]),
+                     hide_index=True)
+
+
+# The main script to run but scoped now
+def main():
+    """
+    The bundle uploader with some help information is displayed. Then when a bundle is uploaded the report it
+    holds is displayed.
+    """
+    uploaded_file = st.file_uploader("Upload a report bundle", type=["erbundle"])
+
+    # Create help modal
+    report_viewer_modal = Modal("Report viewer", key="report_viewer_modal")
+    open_modal = st.button("❔", key="report_viewer_modal")
+    if open_modal:
+        with report_viewer_modal.container():
+            st.markdown(help_text_report_viewer)
+
+    if uploaded_file is None:
+        return
+
+    try:
+        bundle, images = get_bundle(uploaded_file)
+    except ValueError as error:
+        st.error(str(error))
+        return
+
+    st.markdown("---")
+    st.caption(f"Data {bundle['kind']} report, created {bundle['created']}")
+    show_mean_charts(bundle["sets"])
+    for set_data, image in zip(bundle["sets"], images):
+        show_set(set_data, image)
+    if "comparison" in bundle or "pairwise" in bundle:
+        show_comparison(bundle)
+
+
+# Run the main script
+main()
@@ -0,0 +1,255 @@
+import numpy as np
+
+# The largest sample size the Shapiro-Wilk test is reliable for, and the supported normality test methods
+SHAPIRO_MAX_SAMPLES = 5000
+NORMALITY_METHODS = ["auto", "shapiro", "dagostino", "subsample"]
+
+
+class Moments:
+    """
+    The count, mean, central moment sums (up to the fourth), minimum and maximum of a sample. Moments of
+    separate samples can be merged into the moments of the combined sample without rescanning the data.
+    """
+
+    def __init__(self, count=0, mean=0.0, m2=0.0, m3=0.0, m4=0.0, minimum=np.inf, maximum=-np.inf):
+        """
+        :param count: The number of values
+        :param mean: The mean of the values
+        :param m2: The sum of the squared deviations from the mean
+        :param m3: The sum of the cubed deviations from the mean
+        :param m4: The sum of the fourth power deviations from the mean
+        :param minimum: The minimum value
+        :param maximum: The maximum value
+        """
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.m3 = m3
+        self.m4 = m4
+        self.minimum = minimum
+        self.maximum = maximum
+
+    @classmethod
+    def from_values(cls, values, counts=None):
+        """
+        Calculate the moments of an array of values.
+
+        :param values: The array of values
+        :param counts: The array of the number of times each value occurs, such as the counts of binned values,
+        None for once each
+        :return: The moments of the values
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if counts is not None:
+            counts = np.asarray(counts)
+            values, counts = values[counts > 0], counts[counts > 0].astype(np.float64)
+        if len(values) == 0:
+            return cls()
+        if counts is None:
+            mean = values.mean()
+            deviations = values - mean
+            squared = deviations * deviations
+            return cls(len(values), mean, squared.sum(), (squared * deviations).sum(), (squared * squared).sum(),
+                       values.min(), values.max())
+
+        # Weigh the deviations of each value by its count
+        count = counts.sum()
+        mean = counts @ values / count
+        deviations = values - mean
+        squared = deviations * deviations
+        return cls(int(count), mean, counts @ squared, counts @ (squared * deviations), counts @ (squared * squared),
+                   values.min(), values.max())
+
+    def merge(self, other):
+        """
+        Merge the moments with those of another sample, with the pairwise update formulas of Chan and Pebay.
+
+        :param other: The moments of the other sample
+        :return: The moments of the combined sample
+        """
+        if other.count == 0:
+            return self
+        if self.count == 0:
+            return other
+
+        n_a, n_b = self.count, other.count
+        n = n_a + n_b
+        delta = other.mean - self.mean
+        delta_n = delta / n
+        m2 = self.m2 + other.m2 + delta * delta_n * n_a * n_b
+        m3 = (self.m3 + other.m3 + delta * delta_n ** 2 * n_a * n_b * (n_a - n_b) +
+              3 * delta_n * (n_a * other.m2 - n_b * self.m2))
+        m4 = (self.m4 + other.m4 + delta * delta_n ** 3 * n_a * n_b * (n_a * n_a - n_a * n_b + n_b * n_b) +
+              6 * delta_n ** 2 * (n_a * n_a * other.m2 + n_b * n_b * self.m2) +
+              4 * delta_n * (n_a * other.m3 - n_b * self.m3))
+        return Moments(n, self.mean + delta_n * n_b, m2, m3, m4,
+                       min(self.minimum, other.minimum), max(self.maximum, other.maximum))
+
+    @property
+    def std(self):
+        """
+        :return: The sample (ddof=1) standard deviation
+        """
+        return np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+
+    @property
+    def skewness(self):
+        """
+        :return: The (biased) sample skewness, like scipy.stats.skew
+        """
+        return np.sqrt(self.count) * self.m3 / self.m2 ** 1.5 if self.m2 > 0 else np.nan
+
+    @property
+    def kurtosis(self):
+        """
+        :return: The (biased, Pearson) sample kurtosis, like scipy.stats.kurtosis(fisher=False)
+        """
+        return self.count * self.m4 / self.m2 ** 2 if self.m2 > 0 else np.nan
+
+
+class QuantileSketch:
+    """
+    A mergeable quantile sketch counting the values in fixed-width bins, so quantiles are accurate up to the
+    resolution and sketches of separate samples merge by adding their counts.
+    """
+
+    def __init__(self, resolution=0.01, bins=None, counts=None):
+        """
+        :param resolution: The width of the bins, the accuracy of the quantiles
+        :param bins: The sorted array of the occupied bin numbers
+        :param counts: The array of the number of values in each of those bins
+        """
+        self.resolution = resolution
+        self.bins = np.empty(0, dtype=np.int64) if bins is None else bins
+        self.counts = np.empty(0, dtype=np.int64) if counts is None else counts
+
+    @classmethod
+    def from_values(cls, values, resolution=0.01):
+        """
+        Create the sketch of an array of values, NaN values are left out.
+
+        :param values: The array of values
+        :param resolution: The width of the bins
+        :return: The sketch of the values
+        """
+        values = np.asarray(values, dtype=np.float64)
+        bins, counts = np.unique(np.floor(values[~np.isnan(values)] / resolution).astype(np.int64),
+                                 return_counts=True)
+        return cls(resolution, bins, counts)
+
+    def merge(self, other):
+        """
+        Merge the sketch with the sketch of another sample with the same resolution.
+
+        :param other: The sketch of the other sample
+        :return: The sketch of the combined sample
+        """
+        if other.resolution != self.resolution:
+            raise ValueError("Only quantile sketches with the same resolution can be merged")
+        bins, inverse = np.unique(np.concatenate((self.bins, other.bins)), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate((self.counts, other.counts))).astype(np.int64)
+        return QuantileSketch(self.resolution, bins, counts)
+
+    def quantiles(self, qs):
+        """
+        Estimate the quantiles, each as the center of the bin holding it.
+
+        :param qs: The quantile or list of quantiles, between 0 and 1
+        :return: The array of estimated quantiles, NaN for an empty sketch
+        """
+        qs = np.atleast_1d(np.asarray(qs, dtype=np.float64))
+        if len(self.counts) == 0:
+            return np.full(len(qs), np.nan)
+        cumulative = np.cumsum(self.counts)
+        index = np.searchsorted(cumulative, qs * (cumulative[-1] - 1), side="right")
+        return self.centers[np.minimum(index, len(self.bins) - 1)]
+
+    @property
+    def centers(self):
+        """
+        :return: The array of the center value of each occupied bin
+        """
+        return (self.bins + 0.5) * self.resolution
+
+
+def merge_all(parts, empty):
+    """
+    Merge a list of mergeable summaries (Moments or QuantileSketch) into one.
+
+    :param parts: The list of summaries
+    :param empty: The summary to start from when the list is empty
+    :return: The merged summary
+    """
+    merged = empty
+    for part in parts:
+        merged = merged.merge(part)
+    return merged
+
+
+def normality_test(values, method="auto", moments=None, seed=0):
+    """
+    Test whether a sample is likely normally distributed, with a test suited to its size. Shapiro-Wilk is
+    unreliable above 5000 samples, so "auto" switches to the D'Agostino-Pearson test there.
+
+    :param values: The array of values, only needed for the Shapiro-Wilk based methods
+    :param method: "auto", "shapiro", "dagostino" (from the moments) or "subsample" (Shapiro-Wilk on a fixed
+    size random subsample)
+    :param moments: The moments of the values, calculated from the values if not given
+    :param seed: The seed of the random subsample
+    :return: The p-value and the name of the test used
+    """
+    from scipy import stats
+
+    if method not in NORMALITY_METHODS:
+        raise ValueError(f"Unknown normality test method: {method}")
+    count = moments.count if moments is not None else len(values)
+
+    # Use Shapiro-Wilk on small samples and D'Agostino-Pearson on large ones
+    if method == "auto":
+        method = "shapiro" if count <= SHAPIRO_MAX_SAMPLES else "dagostino"
+    if method == "shapiro" or (method == "subsample" and count <= SHAPIRO_MAX_SAMPLES):
+        return stats.shapiro(values).pvalue, "Shapiro-Wilk"
+    if method == "subsample":
+        sample = np.random.default_rng(seed).choice(values, SHAPIRO_MAX_SAMPLES, replace=False)
+        return stats.shapiro(sample).pvalue, f"Shapiro-Wilk ({SHAPIRO_MAX_SAMPLES} subsample)"
+    return dagostino_pearson(moments if moments is not None else Moments.from_values(values)), "D'Agostino-Pearson"
+
+
+def dagostino_pearson(moments):
+    """
+    The D'Agostino-Pearson normality test (scipy.stats.normaltest) computed from the moments of a sample, so
+    pooled samples can be tested from their merged moments.
+
+    :param moments: The moments of the sample
+    :return: The p-value of the test, NaN for fewer than 8 values or a constant sample
+    """
+    from scipy import stats
+
+    n = moments.count
+    if n < 8 or not moments.m2 > 0:
+        return np.nan
+
+    # The skewness test statistic
+    y = moments.skewness * np.sqrt((n + 1) * (n + 3) / (6.0 * (n - 2)))
+    beta2 = 3.0 * (n * n + 27 * n - 70) * (n + 1) * (n + 3) / ((n - 2.0) * (n + 5) * (n + 7) * (n + 9))
+    w2 = -1 + np.sqrt(2 * (beta2 - 1))
+    delta = 1 / np.sqrt(0.5 * np.log(w2))
+    alpha = np.sqrt(2.0 / (w2 - 1))
+    y = 1 if y == 0 else y
+    z_skew = delta * np.log(y / alpha + np.sqrt((y / alpha) ** 2 + 1))
+
+    # The kurtosis test statistic
+    expected = 3.0 * (n - 1) / (n + 1)
+    variance = 24.0 * n * (n - 2) * (n - 3) / ((n + 1) * (n + 1.0) * (n + 3) * (n + 5))
+    x = (moments.kurtosis - expected) / np.sqrt(variance)
+    sqrt_beta1 = (6.0 * (n * n - 5 * n + 2) / ((n + 7) * (n + 9)) *
+                  np.sqrt((6.0 * (n + 3) * (n + 5)) / (n * (n - 2) * (n - 3))))
+    a = 6.0 + 8.0 / sqrt_beta1 * (2.0 / sqrt_beta1 + np.sqrt(1 + 4.0 / sqrt_beta1 ** 2))
+    denominator = 1 + x * np.sqrt(2 / (a - 4.0))
+    if denominator == 0:
+        return np.nan
+    term = np.sign(denominator) * ((1 - 2.0 / a) / abs(denominator)) ** (1 / 3.0)
+    z_kurtosis = (1 - 2 / (9.0 * a) - term) / np.sqrt(2 / (9.0 * a))
+
+    # Combine both into the chi-squared distributed statistic
+    return stats.chi2.sf(z_skew ** 2 + z_kurtosis ** 2, 2)
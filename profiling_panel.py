@@ -0,0 +1,50 @@
+import tracemalloc
+
+import streamlit as st
+
+from instrumentation import Profiler, activate
+
+
+def start_profiling(key):
+    """
+    Activate the profiler of the session for a run of a page. The profiler records when it is enabled with the
+    ENERGIREPORTER_PROFILE environment variable or the toggle in the sidebar.
+
+    :param key: The key of the session state to keep the profiler of the page in
+    :return: The profiler of the page, reset for this run
+    """
+    # Keep one profiler per page and session, configured with the environment by default
+    if key not in st.session_state:
+        st.session_state[key] = Profiler.from_environment()
+    profiler = st.session_state[key]
+
+    # Let the sidebar toggles turn the profiling and memory tracing on and off
+    profiler.enabled = st.sidebar.toggle("Profile the pipeline", value=profiler.enabled, key=f"{key}_enabled")
+    profiler.trace_memory = st.sidebar.checkbox("Trace memory", value=profiler.trace_memory,
+                                                disabled=not profiler.enabled, key=f"{key}_memory")
+    if not (profiler.enabled and profiler.trace_memory) and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+    profiler.reset()
+    activate(profiler)
+    return profiler
+
+
+def show_profile(profiler):
+    """
+    Display the timing breakdown of the stages recorded during the run of a page in a collapsed expander, with a
+    download of the stages in the Chrome trace format.
+
+    :param profiler: The profiler of the page
+    """
+    if not profiler.enabled:
+        return
+
+    with st.expander("Timing breakdown"):
+        summary = profiler.summary()
+        if summary.empty:
+            st.caption("No stages ran, the data was already loaded or no files are uploaded.")
+            return
+        st.dataframe(summary, hide_index=True, use_container_width=True)
+        st.download_button("Download Chrome trace", profiler.chrome_trace(), file_name="energireporter_trace.json",
+                           mime="application/json")
@@ -0,0 +1,145 @@
+import numpy as np
+import pandas as pd
+
+from reader import TIME
+
+
+class TimePyramid:
+    """
+    A multi-resolution index over a time series. Level 0 holds the samples themselves and every next level
+    aggregates pairs of buckets of the level below into the min, max, sum and count of 2^level samples, with the
+    index of the sample of the min and the max, so a time range can be read at the coarsest resolution that still
+    gives enough points for it.
+    """
+
+    def __init__(self, time, values):
+        """
+        :param time: The increasing array of time values
+        :param values: The array of values at those times, NaN values are left out of the aggregates
+        """
+        time = np.asarray(time, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        missing = np.isnan(values)
+
+        # The level with the samples themselves
+        level = {"time": time,
+                 "min": np.where(missing, np.inf, values),
+                 "max": np.where(missing, -np.inf, values),
+                 "sum": np.where(missing, 0.0, values),
+                 "count": (~missing).astype(np.int64),
+                 "argmin": np.arange(len(time)),
+                 "argmax": np.arange(len(time))}
+        self.levels = [level]
+
+        # Aggregate pairs of buckets until a single bucket is left
+        while len(level["time"]) > 1:
+            level = _aggregate_pairs(level)
+            self.levels.append(level)
+
+    def level_for(self, start, end, min_points):
+        """
+        Get the coarsest level that still has at least min_points buckets within the time range.
+
+        :param start: The start of the time range
+        :param end: The end of the time range
+        :param min_points: The minimum number of points wanted in the time range
+        :return: The level number
+        """
+        times = self.levels[0]["time"]
+        samples = np.searchsorted(times, end, side="right") - np.searchsorted(times, start, side="left")
+        if samples <= min_points:
+            return 0
+        return min(int(np.log2(samples / min_points)), len(self.levels) - 1)
+
+    def query(self, start, end, min_points):
+        """
+        Get the aggregates of the time range at the coarsest level that gives at least min_points buckets.
+        Only the buckets overlapping the range are read, so the cost does not depend on the series length.
+
+        :param start: The start of the time range
+        :param end: The end of the time range
+        :param min_points: The minimum number of points wanted in the time range
+        :return: A DataFrame with the bucket start time, mean, min, max and count of each bucket
+        """
+        level = self.levels[self.level_for(start, end, min_points)]
+
+        # Find the buckets overlapping the time range, including the one the start falls in
+        first = max(np.searchsorted(level["time"], start, side="right") - 1, 0)
+        last = np.searchsorted(level["time"], end, side="right")
+        window = slice(first, last)
+
+        # Return the aggregates, leaving the buckets without values NaN
+        count = level["count"][window]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            mean = level["sum"][window] / count
+        return pd.DataFrame(data={TIME: level["time"][window], "MEAN": mean,
+                                  "MIN": np.where(count > 0, level["min"][window], np.nan),
+                                  "MAX": np.where(count > 0, level["max"][window], np.nan),
+                                  "COUNT": count})
+
+    def extremes(self, start, end, n_points):
+        """
+        Get the samples with the min and the max value of each bucket of the time range, at the coarsest level that
+        gives at least n_points / 2 buckets, like the minmax downsampling does. The peaks of the range are kept at
+        their own times at any resolution, while only the buckets within the range and the samples of the two
+        buckets at its edges are read.
+
+        :param start: The start of the time range
+        :param end: The end of the time range
+        :param n_points: The target number of points
+        :return: A DataFrame with the time and value of the samples within the range, in time order
+        """
+        number = self.level_for(start, end, max(1, n_points // 2))
+        level, size = self.levels[number], 2 ** number
+
+        # Find the samples of the range, and the buckets of the level that lie entirely within it, a bucket
+        # aggregating the samples from its number times its size
+        samples = self.levels[0]
+        first = np.searchsorted(samples["time"], start, side="left")
+        last = np.searchsorted(samples["time"], end, side="right")
+        inner = slice(-(-first // size), max(last // size, -(-first // size)))
+
+        # Take the min and max samples of the buckets within the range that have values
+        filled = level["count"][inner] > 0
+        indices = [level["argmin"][inner][filled], level["argmax"][inner][filled]]
+
+        # The buckets at the edges lie partly outside the range, so their min and max are found in their samples
+        for edge in (slice(first, min(inner.start * size, last)), slice(max(inner.stop * size, first), last)):
+            if np.isfinite(samples["min"][edge]).any():
+                indices.append(edge.start + np.array([np.argmin(samples["min"][edge]),
+                                                      np.argmax(samples["max"][edge])]))
+
+        indices = np.unique(np.concatenate(indices))
+        return pd.DataFrame(data={TIME: samples["time"][indices], "VALUE": samples["sum"][indices]})
+
+    @property
+    def span(self):
+        """
+        :return: The (first, last) time of the series, or (0, 0) if it is empty
+        """
+        times = self.levels[0]["time"]
+        return (times[0], times[-1]) if len(times) else (0.0, 0.0)
+
+
+def _aggregate_pairs(level):
+    """
+    Aggregate each pair of consecutive buckets of a level into one bucket, a last unpaired bucket is kept alone.
+
+    :param level: The dict with the time, min, max, sum and count arrays of the level
+    :return: The dict with the arrays of the next level
+    """
+    # Pad an odd length level with an empty bucket so the arrays can be reshaped into pairs
+    odd = len(level["time"]) % 2
+    padding = {"time": np.nan, "min": np.inf, "max": -np.inf, "sum": 0.0, "count": 0, "argmin": 0, "argmax": 0}
+    pairs = {key: (np.append(values, padding[key]) if odd else values).reshape(-1, 2) for key, values in level.items()}
+
+    # Keep the sample index of the bucket of each pair that holds the min and the max
+    low = np.argmin(pairs["min"], axis=1)[:, None]
+    high = np.argmax(pairs["max"], axis=1)[:, None]
+    return {"time": pairs["time"][:, 0],
+            "min": np.take_along_axis(pairs["min"], low, axis=1)[:, 0],
+            "max": np.take_along_axis(pairs["max"], high, axis=1)[:, 0],
+            "sum": pairs["sum"].sum(axis=1),
+            "count": pairs["count"].sum(axis=1),
+            "argmin": np.take_along_axis(pairs["argmin"], low, axis=1)[:, 0],
+            "argmax": np.take_along_axis(pairs["argmax"], high, axis=1)[:, 0]}
@@ -1,149 +1,730 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import csv
+from functools import lru_cache
+import io
+from itertools import repeat
+import os
+import re
+
+import numpy as np
 import pandas as pd
 
+from alignment import align_runs, aligned_mean_std, bin_time
+from archive import is_archive, read_archive
+from instrumentation import stage
+from runblock import RunBlock
+
 # Easy to use/rename variables for the columns used
 TIME = "Time (s)"
 POWER = "Power (W)"
 
+# The supported total power and energy columns, in order of preference
+POWER_COLUMNS = ["CPU_POWER (Watts)", "SYSTEM_POWER (Watts)"]
+ENERGY_COLUMNS = ["CPU_ENERGY (J)", "PACKAGE_ENERGY (J)"]
+
+# The per-channel (such as per-core) energy and power columns, the name of the channel followed by the unit
+CHANNEL_PATTERN = re.compile(r"^(?P<channel>.+)_(?P<unit>ENERGY \(J\)|POWER \(Watts\))$")
+
+# The version of the parser, increase it when the extracted data changes so cached runs are not reused
+PARSER_VERSION = 1
+
+# The file size above which files are read in chunks, and the number of rows per chunk
+STREAMING_THRESHOLD = 256 * 2 ** 20
+CHUNK_ROWS = 250000
+
+# The total size of the files below which they are loaded serially, as parsing them takes less time than starting
+# the worker processes would
+POOL_THRESHOLD = 32 * 2 ** 20
 
-def read_uploaded_files(uploaded_files):
+
+def read_uploaded_files(uploaded_files, engine="vectorized", bin_width=0.1, workers=None, cache=None,
+                        alignment=None, precision=None):
     """
     Read in a list of uploaded files and retrieve useful power df, power mean df, total energy usage, and
     filenames information from them.
 
     :param uploaded_files: The list of files that have been uploaded
+    :param engine: The extraction engine used to extract the data of each file
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+    :param workers: The number of processes to load the files with, None for all CPU cores and 1 for serial
+    :param cache: The RunCache to reuse previously loaded runs from, None to always load the files
+    :param alignment: The keyword arguments of align_runs (step, policy, interpolation), None for the defaults
+    :param precision: The precision of the power values, "float64" or "float32", None for the default
     :return: A full power DataFrame of all the files, the same but then the mean over all the files,
-    the list of total energy usage of all the files and the filenames
+    the list of total energy usage of all the files, the filenames and the RunBlock with the power of each file
     """
-    # Initialize the values to (intermediately) store the data
-    total_energies = []
-    pdfs = []
-    names = []
+    return read_uploaded_file_sets([uploaded_files], engine, bin_width, workers, cache, alignment, precision)[0]
+
 
-    # Iterate over the uploaded files
-    for uploaded_file in uploaded_files:
-        # Read the CSV file and store the name
-        df = pd.read_csv(uploaded_file)
-        names.append(uploaded_file.name[:-4])
+def read_uploaded_file_sets(file_sets, engine="vectorized", bin_width=0.1, workers=None, cache=None,
+                            alignment=None, precision=None):
+    """
+    Read in multiple sets of uploaded files in one (parallel) batch, and retrieve the same information as
+    read_uploaded_files for each set.
 
-        # Extract the time-power DataFrame and the total energy used
-        power_tdf, total_energy = extract_df(df)
+    :param file_sets: The list of sets (lists) of files that have been uploaded
+    :param engine: The extraction engine used to extract the data of each file
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+    :param workers: The number of processes to load the files with, None for all CPU cores and 1 for serial
+    :param cache: The RunCache to reuse previously loaded runs from, None to always load the files
+    :param alignment: The keyword arguments of align_runs (step, policy, interpolation), None for the defaults
+    :param precision: The precision of the power values, "float64" or "float32", None for the default
+    :return: A list with for each set the information returned by read_uploaded_files
+    """
+    # Load all the CSV files of all the sets in one batch, the archives hold runs that were already extracted
+    files = [uploaded_file for uploaded_files in file_sets for uploaded_file in uploaded_files]
+    with stage("load archives"):
+        archived = {i: load_archive(file, bin_width) for i, file in enumerate(files) if is_archive(file)}
+    loaded = iter(load_runs([file for i, file in enumerate(files) if i not in archived],
+                            engine, bin_width, workers, cache))
 
-        # Add the total energy to the list
-        total_energies.append(total_energy)
+    # Expand each file into its named runs, an archive can hold multiple runs
+    named_runs = [archived[i] if i in archived else [(file_name(file), next(loaded))] for i, file in enumerate(files)]
+    return combine_file_sets(file_sets, named_runs, bin_width, alignment, precision)
 
-        # Index the pdf over time and add the power column to the pdfs list
-        power_tdf.set_index(TIME, inplace=True)
-        pdfs.append(power_tdf[POWER])
 
-    # Concatenate the DataFrames along the POWER columns and calculate the mean data across the DataFrames
-    power_df = pd.concat(pdfs, axis=1, keys=names)
-    mean_df = power_df.mean(axis=1).to_frame().rename(columns={0: POWER})
+def combine_file_sets(file_sets, named_runs, bin_width=0.1, alignment=None, precision=None):
+    """
+    Split the loaded runs of the files back into their sets and combine the runs of each set.
 
-    # Create a pdfs copy without the time indexing for the data statistics
-    stat_pdfs = [df.reset_index(drop=True) for df in pdfs]
+    :param file_sets: The list of sets (lists) of files that have been uploaded
+    :param named_runs: The list of (name, (time-power DataFrame, total energy)) lists of each file of all the sets,
+    in order, an archive can hold multiple runs
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+    :param alignment: The keyword arguments of align_runs (step, policy, interpolation), None for the defaults
+    :param precision: The precision of the power values, "float64" or "float32", None for the default
+    :return: A list with for each set the information returned by read_uploaded_files
+    """
+    # Split the loaded runs back into their sets, in the input order, aligned on a grid of the bin width
+    alignment = {"step": bin_width, **(alignment or {})}
+    results = []
+    start = 0
+    for uploaded_files in file_sets:
+        end = start + len(uploaded_files)
+        set_runs = [named_run for file_runs in named_runs[start:end] for named_run in file_runs]
+        results.append(combine_runs([name for name, _ in set_runs], [run for _, run in set_runs], alignment,
+                                    precision))
+        start = end
+
+    return results
+
+
+def load_archive(file, bin_width=0.1):
+    """
+    Load the runs of an archive, as views of the memory-mapped (or uploaded) archive instead of copies.
+
+    :param file: The path or uploaded file of the archive
+    :param bin_width: The width of the time bins in seconds the runs should have been de-duplicated with
+    :return: The list of (name, (time-power DataFrame, total energy)) tuples of the runs in the archive
+    """
+    source = file if isinstance(file, (str, os.PathLike)) else file.getvalue()
+    runs = read_archive(source)
+
+    named_runs = []
+    for run in runs:
+        if run.get("bin_width") != bin_width:
+            raise ValueError(f"The run {run['name']} of the archive was extracted with a time bin width of "
+                             f"{run.get('bin_width')}s instead of {bin_width}s")
+        named_runs.append((run["name"], (run_frame(run["time"], run["power"]), run["total_energy"])))
+    return named_runs
+
+
+def run_frame(time, power):
+    """
+    Create the time-power DataFrame of a run from its arrays without copying them. Each column is given as a Series
+    of its own, so the columns are not consolidated into a copied 2-D block and each column can be kept or freed on
+    its own.
+
+    :param time: The time array of the run
+    :param power: The power array of the run
+    :return: The time-power DataFrame with its columns as views of the arrays
+    """
+    return pd.DataFrame(data={TIME: pd.Series(time, copy=False), POWER: pd.Series(power, copy=False)}, copy=False)
+
+
+def combine_runs(names, runs, alignment=None, precision=None):
+    """
+    Combine the loaded runs into a full power df, power mean df, total energy usage, and filenames information.
+    The runs are aligned on one shared regular time grid, so the full power df is dense. The power values of the
+    runs are packed into one RunBlock, which the per-run and combined values used for the statistics are views of.
+
+    :param names: The names of the files the runs were loaded from
+    :param runs: The list of (time-power DataFrame, total energy) tuples of the runs
+    :param alignment: The keyword arguments of align_runs (step, policy, interpolation), None for the defaults
+    :param precision: The precision of the power values, "float64" or "float32", None for the default
+    :return: A full power DataFrame of all the files, the same but then the mean over all the files,
+    the list of total energy usage of all the files, the filenames and the RunBlock with the power of each file
+    """
+    # Get the total energy of each run
+    total_energies = [total_energy for _, total_energy in runs]
+
+    # Pack the power of all the runs into one block, the power values the run set keeps
+    with stage("pack runs", rows=sum(len(power_tdf) for power_tdf, _ in runs)):
+        block = RunBlock.from_runs([power_tdf[POWER].to_numpy() for power_tdf, _ in runs], precision)
+
+    # Index the power of each run over time, as views of the block and the time arrays of the runs
+    pdfs = [pd.Series(block.run_power(i), index=pd.Index(power_tdf[TIME].to_numpy(), name=TIME, copy=False),
+                      name=POWER, copy=False) for i, (power_tdf, _) in enumerate(runs)]
+
+    # Align the power columns on a shared time grid and calculate the mean data across them
+    with stage("align runs", rows=len(block.power)):
+        grid, values = align_runs(pdfs, dtype=block.power.dtype, **(alignment or {}))
+    with stage("mean over runs", rows=len(grid)):
+        time_index = pd.Index(grid, name=TIME)
+        power_df = pd.DataFrame(values, index=time_index, columns=names, copy=False)
+        mean_df = pd.DataFrame(data={POWER: aligned_mean_std(values)[0]}, index=time_index)
 
     # Return the retrieved data formats and information
-    return power_df, mean_df, total_energies, names, stat_pdfs
+    return power_df, mean_df, total_energies, names, block
+
+
+def load_runs(files, engine="vectorized", bin_width=0.1, workers=None, cache=None):
+    """
+    Read and extract a list of files, in parallel over a process pool when more than one worker is used and the
+    files are large enough. If the process pool cannot be used the files are loaded serially instead. When a
+    cache is given, the files that were loaded before are taken from it and only the other files are loaded.
+
+    :param files: The list of paths or (uploaded) file-like objects to load
+    :param engine: The extraction engine used to extract the data of each file
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+    :param workers: The number of processes to load the files with, None for all CPU cores and 1 for serial
+    :param cache: The RunCache to reuse previously loaded runs from, None to always load the files
+    :return: The list of (time-power DataFrame, total energy) tuples, in the order of the files
+    """
+    # Uploaded files are sent to the workers as their bytes, paths are opened by the workers themselves
+    sources = [file if isinstance(file, (str, os.PathLike)) else file.getvalue() for file in files]
+    runs = [None] * len(sources)
+
+    # Take the runs that are in the cache, keyed on the file bytes
+    keys = []
+    if cache is not None:
+        with stage("cache lookup", rows=len(sources)):
+            for i, source in enumerate(sources):
+                keys.append(source_cache_key(cache, source, bin_width))
+                runs[i] = cache.get(keys[i])
+
+    # Load the runs that were not cached and add them to the cache
+    missing = [i for i, run in enumerate(runs) if run is None]
+    with stage("parse and extract") as parse_stage:
+        loaded = _load_sources([sources[i] for i in missing], engine, bin_width, workers)
+        parse_stage.rows = sum(len(power_tdf) for power_tdf, _ in loaded)
+    for i, run in zip(missing, loaded):
+        runs[i] = run
+        if cache is not None:
+            cache.put(keys[i], run)
+
+    return runs
+
+
+def source_cache_key(cache, source, bin_width=0.1):
+    """
+    Get the key of a file in a RunCache, from the bytes of the file and the parser settings. Files on disk are
+    hashed block by block, so the memory use does not grow with the file size.
+
+    :param cache: The RunCache to get the key for
+    :param source: The path or the bytes of the CSV file
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+    :return: The cache key of the file
+    """
+    if isinstance(source, bytes):
+        return cache.key(source, PARSER_VERSION, bin_width)
+    with open(source, "rb") as f:
+        return cache.key(iter(lambda: f.read(2 ** 20), b""), PARSER_VERSION, bin_width)
+
+
+def _load_sources(sources, engine, bin_width, workers):
+    """
+    Load a list of sources over a process pool, or serially for a single worker, for files too small to be worth
+    starting the worker processes for, or if the pool fails. Without a given number of workers the pool shared
+    with the background ingestion is used, so repeated loads do not each start processes of their own.
+
+    :param sources: The list of paths or bytes of the CSV files
+    :param engine: The extraction engine used to extract the data of each file
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+    :param workers: The number of processes to load the files with, None for the shared pool and 1 for serial
+    :return: The list of (time-power DataFrame, total energy) tuples, in the order of the sources
+    """
+    size = sum(len(source) if isinstance(source, bytes) else os.path.getsize(source) for source in sources)
+    chunksize = max(1, len(sources) // (4 * (workers or os.cpu_count() or 1)))
 
+    # Load the files over a process pool, keeping the input order
+    if len(sources) > 1 and size >= POOL_THRESHOLD and workers != 1:
+        arguments = (load_run, sources, repeat(engine), repeat(bin_width))
+        try:
+            if workers is None:
+                from ingest import default_executor
+                return list(default_executor().map(*arguments, chunksize=chunksize))
+            with ProcessPoolExecutor(max_workers=min(workers, len(sources))) as executor:
+                return list(executor.map(*arguments, chunksize=chunksize))
+        except (OSError, BrokenProcessPool):
+            # Replace the shared pool that broke, so the next loads can use it again
+            if workers is None:
+                default_executor(replace_broken=True)
 
-def extract_df(df):
+    # Load the files serially
+    return [load_run(source, engine, bin_width) for source in sources]
+
+
+def load_run(source, engine="vectorized", bin_width=0.1):
+    """
+    Read and extract a single file, this is the unit of work of the process pool.
+
+    :param source: The path or the bytes of the CSV file
+    :param engine: The extraction engine used to extract the data of the file
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+    :return: A time-power DataFrame and the total energy consumption of the file
+    """
+    # Large files on disk are streamed in chunks to keep the memory use bounded
+    if not isinstance(source, bytes) and os.path.getsize(source) > STREAMING_THRESHOLD:
+        return read_energy_csv_streamed(source, bin_width=bin_width)
+
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    with stage("read csv") as read_stage:
+        df = read_energy_csv(source)
+        read_stage.rows = len(df)
+    with stage("extract", rows=len(df)):
+        return extract_df(df, engine, bin_width)
+
+
+def file_name(file):
+    """
+    Get the name of a path or uploaded file without its extension.
+
+    :param file: The path or uploaded file
+    :return: The file name without the extension
+    """
+    name = os.path.basename(file) if isinstance(file, (str, os.PathLike)) else file.name
+    return os.path.splitext(name)[0]
+
+
+def read_energy_csv(file, csv_engine=None):
+    """
+    Read an EnergiBridge CSV file, only parsing the time column and the total energy or power column used.
+    The header is read first to find which supported column is present, all other columns are skipped.
+
+    :param file: The path or file-like object of the CSV file
+    :param csv_engine: The pandas CSV parser engine to use, defaults to the fastest one available
+    :return: A DataFrame with only the time and the total energy or power column
+    """
+    # Find the data column from the header and read only the columns needed as floats
+    key = find_data_column(read_csv_header(file))
+    csv_engine = csv_engine or default_csv_engine()
+    return pd.read_csv(file, usecols=["Time", key], dtype={"Time": np.float64, key: np.float64},
+                       engine=csv_engine, **float_options(csv_engine))
+
+
+@lru_cache(maxsize=None)
+def default_csv_engine():
+    """
+    Get the fastest pandas CSV parser engine available, the pyarrow engine is used when it can be imported.
+
+    :return: The name of the CSV parser engine
+    """
+    try:
+        import pyarrow  # noqa: F401
+        return "pyarrow"
+    except ImportError:
+        return "c"
+
+
+def float_options(csv_engine):
+    """
+    Get the read_csv options to parse the floats exactly with the given engine. The pyarrow engine always
+    does, while the c engine needs the round trip converter.
+
+    :param csv_engine: The pandas CSV parser engine
+    :return: A dict of the extra read_csv keyword arguments
+    """
+    return {"float_precision": "round_trip"} if csv_engine == "c" else {}
+
+
+def read_csv_header(file):
+    """
+    Read the column names from the first line of a CSV file without moving the file position.
+
+    :param file: The path or file-like object of the CSV file
+    :return: The list of column names
+    """
+    # Read the first line from the path or the file-like object, restoring its position afterwards
+    if isinstance(file, (str, bytes)) or hasattr(file, "__fspath__"):
+        with open(file, "rb") as f:
+            line = f.readline()
+    else:
+        position = file.tell()
+        line = file.readline()
+        file.seek(position)
+
+    # Parse the line as CSV so quoted column names are handled
+    if isinstance(line, bytes):
+        line = line.decode("utf-8-sig")
+    return next(csv.reader(io.StringIO(line)), [])
+
+
+def stream_energy_csv(file, chunk_rows=CHUNK_ROWS, bin_width=0.1):
+    """
+    Read an EnergiBridge CSV file in chunks and extract the time-power data of each chunk, so the memory
+    use is bounded by the chunk size instead of the file size. The previous row and the running totals are
+    carried over between the chunks, so the results match those of extract_df.
+
+    :param file: The path or file-like object of the CSV file
+    :param chunk_rows: The number of rows to read per chunk
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+    :return: A generator of (time-power DataFrame, total energy so far) tuples, one per chunk, the last
+    one holding the total energy consumption of the whole file
+    """
+    # Find the data column from the header and create the extractor carrying the state between the chunks
+    key = find_data_column(read_csv_header(file))
+    extractor = StreamExtractor(key in POWER_COLUMNS, bin_width)
+
+    # Read only the columns needed, chunk by chunk, and extract them
+    with pd.read_csv(file, usecols=["Time", key], dtype={"Time": np.float64, key: np.float64},
+                     chunksize=chunk_rows, engine="c", **float_options("c")) as chunks:
+        for chunk in chunks:
+            yield extractor.feed(chunk["Time"].to_numpy(), chunk[key].to_numpy()), extractor.total_energy
+
+    # Add the last time bin, which could still have continued in a next chunk
+    yield extractor.finish(), extractor.total_energy
+
+
+def read_energy_csv_streamed(file, chunk_rows=CHUNK_ROWS, bin_width=0.1):
+    """
+    Read and extract an EnergiBridge CSV file in chunks, only keeping the de-duplicated time-power data.
+
+    :param file: The path or file-like object of the CSV file
+    :param chunk_rows: The number of rows to read per chunk
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+    :return: A time-power DataFrame and the total energy consumption of the file
+    """
+    power_tdfs = []
+    total_energy = 0
+    for power_tdf, total_energy in stream_energy_csv(file, chunk_rows, bin_width):
+        power_tdfs.append(power_tdf)
+    return run_frame(*(np.concatenate([power_tdf[column].to_numpy() for power_tdf in power_tdfs])
+                       for column in [TIME, POWER])), total_energy
+
+
+class StreamExtractor:
+    """
+    Extracts the time-power data and total energy from consecutive chunks of EnergiBridge rows. The last
+    time and energy value, the running totals, and the last (possibly unfinished) time bin are carried
+    over between the chunks, so the chunks give the same results as extracting all the rows at once.
+    """
+
+    def __init__(self, is_power, bin_width=0.1):
+        """
+        :param is_power: Whether the data column reports power instead of energy
+        :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+        """
+        self.is_power = is_power
+        self.bin_width = bin_width
+        self.rows = 0
+        self.total_time = 0.0
+        self.total_energy = 0
+        self.last_time = None
+        self.last_value = None
+        self._pending = None
+
+    def feed(self, times, values):
+        """
+        Extract the next chunk of rows.
+
+        :param times: The array of the Time column values (ms) of the chunk
+        :param values: The array of the energy or power column values of the chunk
+        :return: A time-power DataFrame of the time bins completed by this chunk
+        """
+        times = np.asarray(times, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+
+        # The first row is skipped and the second one is only used as the previous row, like extract_df does
+        skip = min(max(2 - self.rows, 0), len(times))
+        self.rows += len(times)
+        if skip:
+            self.last_time, self.last_value = times[skip - 1], values[skip - 1]
+            times, values = times[skip:], values[skip:]
+        if len(times) == 0:
+            return remove_time_duplicates([], [])
+
+        # Calculate the deltas from the previous row and continue the cumulative time from the last chunk
+        deltas = np.diff(np.concatenate(([self.last_time], times))) / 1000
+        time = np.cumsum(np.concatenate(([self.total_time], deltas)))[1:]
+
+        # Calculate the power and the energy used over each delta
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if self.is_power:
+                power = values
+                energies = power * deltas
+            else:
+                energies = np.diff(np.concatenate(([self.last_value], values)))
+                power = energies / deltas
+
+        # Continue the totals and remember the last row for the next chunk
+        self.total_energy = float(np.cumsum(np.concatenate(([self.total_energy], energies)))[-1])
+        self.total_time = time[-1]
+        self.last_time, self.last_value = times[-1], values[-1]
+
+        # Average the duplicate times, merging the first bin with the unfinished bin of the last chunk
+        time = bin_time(time, self.bin_width)
+        starts = np.flatnonzero(np.concatenate(([True], time[1:] != time[:-1])))
+        sums = np.add.reduceat(power, starts)
+        counts = np.diff(np.append(starts, len(time)))
+        bins = time[starts]
+        if self._pending is not None:
+            if self._pending[0] == bins[0]:
+                sums[0] += self._pending[1]
+                counts[0] += self._pending[2]
+            else:
+                bins = np.concatenate(([self._pending[0]], bins))
+                sums = np.concatenate(([self._pending[1]], sums))
+                counts = np.concatenate(([self._pending[2]], counts))
+
+        # Keep the last bin as it can continue in the next chunk and return the completed bins
+        self._pending = (bins[-1], sums[-1], counts[-1])
+        return pd.DataFrame(data={TIME: bins[:-1], POWER: sums[:-1] / counts[:-1]})
+
+    def finish(self):
+        """
+        Finish the extraction, returning the last time bin.
+
+        :return: A time-power DataFrame of the last time bin, empty if no rows were extracted
+        """
+        if self._pending is None:
+            return remove_time_duplicates([], [])
+        time, power_sum, count = self._pending
+        self._pending = None
+        return pd.DataFrame(data={TIME: [time], POWER: [power_sum / count]})
+
+
+def extract_df(df, engine="vectorized", bin_width=0.1):
     """
     Extract the time-power and total energy information from a DataFrame that should follow the
     EnergiBridge CSV file format. Depending on which total energy or power column is present the
     data is retrieved.
 
     :param df: The DataFrame to extract
+    :param engine: The extraction engine, either "vectorized" (array based) or "loop" (row by row)
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
     :return: A time-power DataFrame and the total energy consumption retrieved from the df data
     """
+    # Get the data column to use and whether it reports power or energy
+    key = find_data_column(df.columns)
+    is_power = key in POWER_COLUMNS
+
+    # Extract the time, power, and total energy with the requested engine
+    if engine == "vectorized":
+        time, power, total_energy = _extract_vectorized(df, key, is_power)
+    elif engine == "loop":
+        time, power, total_energy = _extract_loop(df, key, is_power)
+    else:
+        raise ValueError(f"Unknown extraction engine: {engine}")
+
+    # Create a DataFrame for the time and power without duplicates
+    power_tdf = remove_time_duplicates(time, power, bin_width)
+
+    # Return the time-power DataFrame and the total energy consumption
+    return power_tdf, total_energy
+
+
+def find_channel_columns(columns):
+    """
+    Find the per-channel energy and power columns, such as CORE0_ENERGY (J) up to COREn_ENERGY (J), leaving out
+    the total energy and power columns.
+
+    :param columns: The column names available
+    :return: The list of the channel columns, in natural order (CORE2 before CORE10)
+    """
+    channels = [column for column in columns
+                if CHANNEL_PATTERN.match(column) and column not in POWER_COLUMNS + ENERGY_COLUMNS]
+    return sorted(channels, key=lambda column: [int(part) if part.isdigit() else part
+                                                for part in re.split(r"(\d+)", column)])
+
+
+def read_channels_csv(file, csv_engine=None):
+    """
+    Read an EnergiBridge CSV file, only parsing the time column and the per-channel energy and power columns.
+
+    :param file: The path or file-like object of the CSV file
+    :param csv_engine: The pandas CSV parser engine to use, defaults to the fastest one available
+    :return: A DataFrame with only the time and the channel columns
+    """
+    channels = find_channel_columns(read_csv_header(file))
+    csv_engine = csv_engine or default_csv_engine()
+    return pd.read_csv(file, usecols=["Time"] + channels, dtype=dict.fromkeys(["Time"] + channels, np.float64),
+                       engine=csv_engine, **float_options(csv_engine))
+
+
+def extract_channels(df, bin_width=0.1):
+    """
+    Extract the time-power data and total energy of every channel at once. The channels are handled as one
+    time by channel array, so the deltas, power and totals of all channels are computed in the same array
+    operations, like extract_df does for the total column.
+
+    :param df: The DataFrame with the Time column and the channel columns
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+    :return: A time-power DataFrame with a power column per channel (named after the channel) and a Series with
+    the total energy consumption of each channel
+    """
+    columns = find_channel_columns(df.columns)
+    names = [CHANNEL_PATTERN.match(column)["channel"] for column in columns]
+    is_power = np.array([CHANNEL_PATTERN.match(column)["unit"] != "ENERGY (J)" for column in columns])
+
+    # Get the time column and the channels as a 2-D array, the first row is skipped just like extract_df does
+    times = df["Time"].to_numpy(dtype=np.float64)
+    values = df[columns].to_numpy(dtype=np.float64)
+    if len(times) < 3:
+        return (pd.DataFrame(data={TIME: np.empty(0), **{name: np.empty(0) for name in names}}),
+                pd.Series(np.zeros(len(names)), index=names))
+
+    # Calculate the deltas in seconds and the cumulative time
+    deltas = np.diff(times[1:]) / 1000
+    time = np.cumsum(deltas)
+
+    # Calculate the power and the energy used over each delta of all channels, by the unit of each channel
+    with np.errstate(divide="ignore", invalid="ignore"):
+        energies = np.where(is_power, values[2:] * deltas[:, None], np.diff(values[1:], axis=0))
+        power = np.where(is_power, values[2:], energies / deltas[:, None])
+
+    # Accumulate the energies sequentially, like extract_df does, to get the total energy of each channel
+    total_energies = np.cumsum(energies, axis=0)[-1]
+
+    # Average the power of the duplicate times of all channels at once, summing each run of equal times along the
+    # rows of the transposed power array, which holds a channel per row, and dividing by the length of the run
+    time = bin_time(time, bin_width)
+    starts = np.flatnonzero(np.concatenate(([True], time[1:] != time[:-1])))
+    if len(starts) < len(time):
+        counts = np.diff(np.append(starts, len(time)))
+        power = np.add.reduceat(power.T, starts, axis=1).T / counts[:, None]
+
+    channel_tdf = pd.DataFrame(power, columns=names)
+    channel_tdf.insert(0, TIME, time[starts])
+    return channel_tdf, pd.Series(total_energies, index=names)
+
+
+def load_channels(source, bin_width=0.1):
+    """
+    Read and extract the per-channel data of a CSV file.
+
+    :param source: The path, bytes or uploaded file of the CSV file
+    :param bin_width: The width of the time bins in seconds that duplicate time values are averaged over
+    :return: The time-power DataFrame with a column per channel and the Series of total energy per channel
+    """
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    elif not isinstance(source, (str, os.PathLike)):
+        source = io.BytesIO(source.getvalue())
+    with stage("extract channels") as channel_stage:
+        channel_tdf, total_energies = extract_channels(read_channels_csv(source), bin_width)
+        channel_stage.rows = channel_tdf.size
+    return channel_tdf, total_energies
+
+
+def find_data_column(columns):
+    """
+    Find the total energy or power column to use from the given columns, power columns are preferred.
+
+    :param columns: The column names available
+    :return: The name of the column to extract the energy and power from
+    """
+    for key in POWER_COLUMNS + ENERGY_COLUMNS:
+        if key in columns:
+            return key
+    raise ValueError("None of the specified energy data columns are present in the CSV file")
+
+
+def _extract_loop(df, key, is_power):
+    """
+    Extract the time, power, and total energy by walking over the rows one by one.
+
+    :param df: The DataFrame to extract
+    :param key: The energy or power column to use
+    :param is_power: Whether the column reports power instead of energy
+    :return: The cumulative time list, the power list, and the total energy
+    """
     # The variables used to retrieve the energy and power
     total_time = 0
     time = []
     total_energy = 0
-    power = []
-
-    # Extract the power and energy corresponding to the data column available
-    if "CPU_POWER (Watts)" in df.columns or "SYSTEM_POWER (Watts)" in df.columns:
-        # Get the column key and the power immediately
-        key = "CPU_POWER (Watts)" if "CPU_POWER (Watts)" in df.columns else "SYSTEM_POWER (Watts)"
-        power = df[key].tolist()[2:]
+    power = df[key].tolist()[2:] if is_power else []
 
-        # Calculate the time and total energy
-        for i, row in df.iloc[2:].iterrows():
-            # Update the total time and add the 0.1s rounded time to the list
-            delta = (row["Time"] - df.at[i - 1, "Time"]) / 1000
-            total_time += delta
-            time.append(round(total_time, 1))
+    # Calculate the time, energy, and power
+    for i, row in df.iloc[2:].iterrows():
+        # Update the total time and add it to the list
+        delta = (row["Time"] - df.at[i - 1, "Time"]) / 1000
+        total_time += delta
+        time.append(total_time)
 
+        if is_power:
             # Calculate the energy used over the last delta and add it to the total
             total_energy += row[key] * delta
-    elif "CPU_ENERGY (J)" in df.columns or "PACKAGE_ENERGY (J)" in df.columns:
-        # Get the column key
-        key = "CPU_ENERGY (J)" if "CPU_ENERGY (J)" in df.columns else "PACKAGE_ENERGY (J)"
-
-        # Calculate the time, energy, and power
-        for i, row in df.iloc[2:].iterrows():
-            # Update the total time and add the 0.1s rounded time to the list
-            delta = (row["Time"] - df.at[i - 1, "Time"]) / 1000
-            total_time += delta
-            time.append(round(total_time, 1))
-
+        else:
             # Calculate the energy used in the delta from the difference and add it to the total
             energy = row[key] - df.at[i - 1, key]
             total_energy += energy
 
             # Calculate the power consumed used over the last delta and add it to the list
             power.append(energy / delta)
-    else:
-        raise ValueError("None of the specified energy data columns are present in the CSV file")
 
-    # Create a DataFrame for the time and power without duplicates
-    power_tdf = remove_time_duplicates(time, power)
+    return time, power, total_energy
 
-    # Return the time-power DataFrame and the total energy consumption
-    return power_tdf, total_energy
 
+def _extract_vectorized(df, key, is_power):
+    """
+    Extract the time, power, and total energy from whole columns at once. The sums are
+    accumulated in row order so the results are identical to those of the loop engine.
+
+    :param df: The DataFrame to extract
+    :param key: The energy or power column to use
+    :param is_power: Whether the column reports power instead of energy
+    :return: The cumulative time array, the power array, and the total energy
+    """
+    # Get the columns as arrays, the first row is skipped just like the loop does
+    times = df["Time"].to_numpy(dtype=np.float64)
+    values = df[key].to_numpy(dtype=np.float64)
+    if len(times) < 3:
+        return np.empty(0), np.empty(0), 0
+
+    # Calculate the deltas in seconds and the cumulative time
+    deltas = np.diff(times[1:]) / 1000
+    time = np.cumsum(deltas)
+
+    # Calculate the power and the energy used over each delta
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if is_power:
+            power = values[2:]
+            energies = power * deltas
+        else:
+            energies = np.diff(values[1:])
+            power = energies / deltas
+
+    # Accumulate the energies sequentially, like the loop does, to get the total energy
+    total_energy = float(np.cumsum(energies)[-1])
 
-def remove_time_duplicates(time, power):
+    return time, power, total_energy
+
+
+def remove_time_duplicates(time, power, bin_width=0.1):
     """
-    Removes the duplicate time value and the power values of the related indices
+    Removes the duplicate time values and averages the power values of the related indices. The time values
+    are first rounded to the bin width, then each run of equal rounded time values is reduced to one row.
 
-    :param time: The list of time values
-    :param power: The list of power values
+    :param time: The list or array of cumulative time values
+    :param power: The list or array of power values
+    :param bin_width: The width of the time bins in seconds (default 0.1s)
     :return: A time duplicate free time-power DataFrame
     """
-    # The time and power lists for the time duplicate free values
-    clean_time = []
-    clean_power = []
-
-    # Loop over the time values
-    skip_index = -1
-    time_len = len(time)
-    for i, t in enumerate(time):
-        # Continue if we are below the skip index
-        if i < skip_index:
-            continue
-
-        # If the next time value is different add the values to the clean list
-        if i + 1 == time_len or t != time[i + 1]:
-            clean_time.append(t)
-            clean_power.append(power[i])
-        # Else, the next time value is the same return an average row instead
-        else:
-            # Create the same time power sum for all values with the same time
-            p_sum = power[i]
-            duplicate_count = 1
-            for j in range(i + 1, time_len):
-                # If the time value is equal update the p sum, otherwise escape the loop
-                if time[j] == t:
-                    p_sum += power[j]
-                    duplicate_count += 1
-                else:
-                    break
-
-            # Add the time value and average power over all equal times to the clean lists, and update the skip index
-            clean_time.append(t)
-            clean_power.append(p_sum / duplicate_count)
-            skip_index = i + duplicate_count
+    # Get contiguous arrays of the rounded time and the power
+    time = bin_time(np.asarray(time, dtype=np.float64), bin_width)
+    power = np.asarray(power, dtype=np.float64)
+    if len(time) == 0:
+        return run_frame(time, power)
+
+    # Find where each run of equal time values starts and how long it is
+    starts = np.flatnonzero(np.concatenate(([True], time[1:] != time[:-1])))
+    counts = np.diff(np.append(starts, len(time)))
+
+    # Average the power over each run in one pass
+    clean_power = np.add.reduceat(power, starts) / counts
 
     # Return a time duplicate free time-power DataFrame
-    return pd.DataFrame(data={TIME: clean_time, POWER: clean_power})
+    return run_frame(time[starts], clean_power)
@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+from cache import RunCache
+from comparison import CORRECTIONS, compare_many, compare_sets
+from distributions import violin_figure, violin_stats
+from instrumentation import Profiler, activate
+from power_statistics import SHAPIRO_MAX_SAMPLES, Moments, QuantileSketch, normality_test
+from runblock import PRECISIONS
+from runset import RunSet
+from utils import find_files, to_json
+
+# The number of files loaded and summarized at once, which bounds the memory use, and the largest number of
+# runs of a set drawn as separate violins in the images
+BATCH_SIZE = 256
+MAX_VIOLINS = 20
+
+
+class SetReport:
+    """
+    The report of a set of runs, built up batch by batch. Each batch is summarized through a RunSet and only
+    its per-run summaries and the mergeable statistics of its outlier removed values are kept, so the memory
+    use does not grow with the number of samples. To compare sets, the power values of all the runs are kept as
+    mergeable statistics too: their moments and their counts in bins of the QuantileSketch resolution.
+    """
+
+    def __init__(self, name, orv=3, compare=False, keep_violins=False):
+        """
+        :param name: The name of the set
+        :param orv: The number of standard deviations to keep included in the distribution statistics
+        :param compare: Whether to keep the statistics of the power values of all the runs, to compare the set
+        with others
+        :param keep_violins: Whether to keep the violin statistics of each run, to draw them in the images
+        """
+        self.name = name
+        self.orv = orv
+        self.compare = compare
+        self.keep_violins = keep_violins
+        self.runs = []
+        self.total_energies = []
+        self.moments = Moments()
+        self.sketch = QuantileSketch()
+        self.power_moments = Moments()
+        self.power_sketch = QuantileSketch()
+        self.small_values = []
+        self.violins = []
+
+    def add(self, run_set):
+        """
+        Add the runs of a batch to the report.
+
+        :param run_set: The RunSet of the batch of runs
+        """
+        # Summarize each run, including the normality test of its outlier removed values
+        tests = run_set.normality_tests(self.orv)[:-1]
+        for row, (p_value, test) in zip(run_set.summary.to_dict("records"), tests):
+            self.runs.append({"file": row["FILE"], "total_energy": row["TOTAL ENERGY"],
+                              "mean_power": row["MEAN POWER"], "std_power": row["STD POWER"],
+                              "min_power": row["MIN POWER"], "max_power": row["MAX POWER"],
+                              "samples": row["SAMPLES"],
+                              "normality": {"p_value": p_value, "test": test, "normal": bool(p_value > 0.05)}})
+        self.total_energies.extend(run_set.total_energies)
+
+        # Merge the statistics of the outlier removed values, keeping the values only while they are few enough
+        # for the Shapiro-Wilk test of all the runs combined
+        self.moments = self.moments.merge(run_set.pooled_moments(self.orv))
+        self.sketch = self.sketch.merge(run_set.pooled_sketch(self.orv))
+        self.small_values = (self.small_values + [run_set.pooled_values(self.orv)]
+                             if self.moments.count <= SHAPIRO_MAX_SAMPLES else [])
+
+        if self.compare:
+            self.power_moments = self.power_moments.merge(Moments.from_values(run_set.pooled))
+            self.power_sketch = self.power_sketch.merge(QuantileSketch.from_values(run_set.pooled))
+        if self.keep_violins:
+            self.violins.extend(run_set.violin_stats(self.orv)[:-1])
+
+    def total_violin(self):
+        """
+        :return: The violin statistics of all the runs combined, estimated from the merged quantile sketch
+        """
+        return violin_stats(self.sketch.centers, self.moments, self.sketch.quantiles(0.5)[0],
+                            weights=self.sketch.counts)
+
+    def summary(self):
+        """
+        :return: The dict with the per-run summaries and the statistics of all the runs combined
+        """
+        values = np.concatenate(self.small_values) if self.small_values else None
+        p_value, test = normality_test(values, moments=self.moments)
+        p5, median, p95 = self.sketch.quantiles([0.05, 0.5, 0.95])
+        return {"name": self.name,
+                "runs": self.runs,
+                "total": {"runs": len(self.runs),
+                          "mean_total_energy": np.mean(self.total_energies) if self.total_energies else np.nan,
+                          "std_total_energy": (np.std(self.total_energies, ddof=1) if len(self.total_energies) > 1
+                                               else np.nan),
+                          "outlier_removal": self.orv,
+                          "samples": self.moments.count,
+                          "mean_power": self.moments.mean if self.moments.count else np.nan,
+                          "std_power": self.moments.std,
+                          "skewness": self.moments.skewness,
+                          "kurtosis": self.moments.kurtosis,
+                          "p5_power": p5,
+                          "median_power": median,
+                          "p95_power": p95,
+                          "normality": {"p_value": p_value, "test": test, "normal": bool(p_value > 0.05)}}}
+
+
+def build_report(file_sets, orv=3, batch_size=BATCH_SIZE, workers=None, cache=None, images=None,
+                 progress=None, correction="holm", precision=None):
+    """
+    Build the report of one set of files, or the comparison report of two or more sets of files.
+
+    :param file_sets: The list of lists of file paths of the sets
+    :param orv: The number of standard deviations to keep included in the distribution statistics
+    :param batch_size: The number of files to load and summarize at once
+    :param workers: The number of processes to load the files with, None for all CPU cores and 1 for serial
+    :param cache: The RunCache to reuse previously loaded runs from, None to always load the files
+    :param images: The directory to write the violin chart images to, None to not write images
+    :param progress: The function called with the set name, the number of files done and the total number of
+    files after each batch, None to not report progress
+    :param correction: The multiple comparison correction of the pairwise comparison of more than two sets
+    :param precision: The precision the power values are kept in, "float64" or "float32", None for the default
+    :return: The dict with the summaries of the sets and, for two sets, their comparison, or for more sets the
+    pairwise comparison of all of them
+    """
+    names = [f"Set #{i + 1}" for i in range(len(file_sets))]
+    reports = [SetReport(name, orv, compare=len(file_sets) > 1,
+                         keep_violins=images is not None and len(files) <= MAX_VIOLINS)
+               for name, files in zip(names, file_sets)]
+
+    # Load and summarize the files of each set in batches, in parallel within a batch
+    for report, files in zip(reports, file_sets):
+        for start in range(0, len(files), batch_size):
+            report.add(RunSet.from_files(files[start:start + batch_size], workers=workers, cache=cache,
+                                         precision=precision))
+            if progress is not None:
+                progress(report.name, min(start + batch_size, len(files)), len(files))
+
+    # Write the violin charts of each set, with the runs themselves if there are few enough of them
+    if images is not None:
+        os.makedirs(images, exist_ok=True)
+        for i, report in enumerate(reports):
+            labels = [run["file"] for run in report.runs] if report.keep_violins else []
+            image = violin_figure(labels + ["Total"], report.violins + [report.total_violin()])
+            with open(os.path.join(images, f"set{i + 1}_violin.png"), "wb") as f:
+                f.write(image)
+
+    # Compare the sets from the binned power values and their moments, pairs of values in the same bin are tied
+    result = {"sets": [report.summary() for report in reports]}
+    values = [report.power_sketch.centers for report in reports]
+    counts = [report.power_sketch.counts for report in reports]
+    moments = [report.power_moments for report in reports]
+    if len(reports) == 2:
+        result["comparison"] = compare_sets(*values, reports[0].total_energies, reports[1].total_energies,
+                                            weights=counts, moments=moments)
+    elif len(reports) > 2:
+        pairwise = compare_many(values, correction, counts, moments)
+        result["pairwise"] = {"sets": names, "correction": correction,
+                              **{test: matrix.tolist() for test, matrix in pairwise.items()}}
+    return result
+
+
+def main():
+    """
+    Parse the command line arguments and write the JSON report of the sets of files.
+    """
+    parser = argparse.ArgumentParser(description="Write the EnergiReporter report of a set of EnergiBridge CSV "
+                                                 "files, or the comparison report of two or more sets, as JSON.")
+    parser.add_argument("--set", action="append", nargs="+", required=True, metavar="PATH", dest="sets",
+                        help="The directories and glob patterns of the files of a set, give it multiple times to "
+                             "compare sets")
+    parser.add_argument("--output", default="-", help="The path to write the JSON report to, - for stdout")
+    parser.add_argument("--images", help="The directory to write the violin chart images to")
+    parser.add_argument("--correction", choices=CORRECTIONS, default="holm",
+                        help="The multiple comparison correction when comparing more than two sets (default holm)")
+    parser.add_argument("--outlier-removal", type=int, default=3,
+                        help="The number of standard deviations to keep included (default 3)")
+    parser.add_argument("--precision", choices=PRECISIONS,
+                        help="The precision to keep the power values in, float32 halves their memory (default "
+                             "float64, or the ENERGIREPORTER_PRECISION environment variable)")
+    parser.add_argument("--workers", type=int, help="The number of processes to load the files with")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE,
+                        help="The number of files to load and summarize at once")
+    parser.add_argument("--cache-dir", help="The directory to cache the loaded runs in across invocations")
+    parser.add_argument("--quiet", action="store_true", help="Do not report the progress on stderr")
+    parser.add_argument("--trace", help="The path to write the timings of the stages to, in the Chrome trace format")
+
+    args = parser.parse_args()
+    file_sets = [find_files(patterns) for patterns in args.sets]
+    for i, files in enumerate(file_sets):
+        if not files:
+            parser.error(f"no CSV files or archives found for set {i + 1}: {' '.join(args.sets[i])}")
+
+    # Report the progress on stderr, so it does not mix with the report on stdout
+    def progress(name, done, total):
+        print(f"{name}: {done}/{total} files", file=sys.stderr, flush=True)
+
+    # Record the stages when their timings are requested
+    profiler = Profiler.from_environment()
+    profiler.enabled = profiler.enabled or args.trace is not None
+    activate(profiler)
+
+    cache = RunCache(0, args.cache_dir) if args.cache_dir else None
+    result = build_report(file_sets, args.outlier_removal, args.batch_size, args.workers, cache, args.images,
+                          None if args.quiet else progress, args.correction, args.precision)
+
+    # Write the report
+    if args.output == "-":
+        json.dump(to_json(result), sys.stdout, indent=2)
+        print()
+    else:
+        with open(args.output, "w") as f:
+            json.dump(to_json(result), f, indent=2)
+
+    # Write the timings of the stages
+    if args.trace is not None:
+        with open(args.trace, "w") as f:
+            f.write(profiler.chrome_trace())
+    if profiler.enabled and not args.quiet:
+        print(profiler.summary().to_string(index=False), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+
+# The supported precisions of the power values and the environment variable to set the default precision with
+PRECISIONS = ["float64", "float32"]
+PRECISION_ENV = "ENERGIREPORTER_PRECISION"
+
+
+class RunBlock:
+    """
+    The power values of all the runs of a set in one contiguous block, with the runs stored one after another
+    and an offsets table marking where each run starts. The power of each run and of all the runs combined are
+    views of the block, so the values of each run are kept only once however they are used. Iterating over the
+    block gives the power array of each run.
+    """
+
+    def __init__(self, power, offsets):
+        """
+        :param power: The array of the power values of all the runs, one after another
+        :param offsets: The array of the start of each run in the block, followed by the end of the last run
+        """
+        self.power = power
+        self.offsets = offsets
+
+    @classmethod
+    def from_runs(cls, powers, precision=None):
+        """
+        Copy the power arrays of the runs into a new block. The arrays the runs were loaded into are no longer needed
+        afterwards, unless they are kept elsewhere, such as in the run cache.
+
+        :param powers: The list of power arrays of the runs
+        :param precision: The precision of the power values, "float64" or "float32", None for the default
+        :return: The block of the runs
+        """
+        offsets = np.zeros(len(powers) + 1, dtype=np.int64)
+        np.cumsum([len(power) for power in powers], out=offsets[1:])
+        block = np.empty(offsets[-1], dtype=resolve_precision(precision))
+        for power, start, end in zip(powers, offsets[:-1], offsets[1:]):
+            block[start:end] = power
+        return cls(block, offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        """
+        :param i: The index of the run
+        :return: The power array of the run, a view of the block
+        """
+        return self.run_power(i)
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def run_power(self, i):
+        """
+        :param i: The index of the run
+        :return: The power array of the run, a view of the block
+        """
+        return self.power[self.offsets[i]:self.offsets[i + 1]]
+
+    @property
+    def pooled(self):
+        """
+        :return: The array of the power values of all the runs combined, the power block itself
+        """
+        return self.power
+
+    @property
+    def nbytes(self):
+        """
+        :return: The number of bytes of the block and the offsets table
+        """
+        return self.power.nbytes + self.offsets.nbytes
+
+
+def resolve_precision(precision=None):
+    """
+    :param precision: The precision of the power values, "float64" or "float32", None for the one set with the
+    ENERGIREPORTER_PRECISION environment variable or else float64
+    :return: The numpy dtype of the precision
+    """
+    precision = precision or os.environ.get(PRECISION_ENV) or PRECISIONS[0]
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown precision: {precision}")
+    return np.dtype(precision)
@@ -0,0 +1,293 @@
+from functools import cached_property
+import os
+
+import numpy as np
+import pandas as pd
+
+from alignment import aligned_mean_std
+from distributions import violin_stats
+from instrumentation import stage
+from power_statistics import SHAPIRO_MAX_SAMPLES, Moments, QuantileSketch, merge_all, normality_test
+from reader import POWER, read_uploaded_file_sets, read_uploaded_files
+
+
+class RunSet:
+    """
+    A set of loaded runs, wrapping the output of read_uploaded_files. The derived data used by the charts and
+    statistics (std, error bands, z-scores, outlier filtered values and summaries) is computed on first access
+    and memoized, so no aggregate is computed twice. Stages depending on other inputs, such as the outlier
+    removal value, are memoized per value of those inputs with memoize.
+    """
+
+    def __init__(self, power_df, mean_df, total_energies, names, block):
+        """
+        :param power_df: The aligned power DataFrame of all the runs
+        :param mean_df: The DataFrame with the mean power over all the runs
+        :param total_energies: The list of total energy usage of each run
+        :param names: The names of the runs
+        :param block: The RunBlock holding the power of each run
+        """
+        self.power_df = power_df
+        self.mean_df = mean_df
+        self.total_energies = total_energies
+        self.names = names
+        self.block = block
+        self._memo = {}
+
+    @classmethod
+    def from_files(cls, uploaded_files, **kwargs):
+        """
+        Read in a list of uploaded files into a run set.
+
+        :param uploaded_files: The list of files that have been uploaded
+        :param kwargs: The keyword arguments of read_uploaded_files
+        :return: The run set of the files
+        """
+        return cls(*read_uploaded_files(uploaded_files, **kwargs))
+
+    @property
+    def single(self):
+        """
+        :return: Whether the set holds a single run
+        """
+        return len(self.names) == 1
+
+    @cached_property
+    def std(self):
+        """
+        :return: The time indexed std of the power over the runs
+        """
+        return pd.Series(aligned_mean_std(self.power_df.to_numpy())[1], index=self.power_df.index)
+
+    @cached_property
+    def std_df(self):
+        """
+        :return: A DataFrame with the time, mean (MEAN) and std (STD) columns for the error band charts
+        """
+        return pd.concat([self.mean_df[POWER], self.std], axis=1, keys=["MEAN", "STD"]).reset_index()
+
+    @cached_property
+    def conf_df(self):
+        """
+        :return: A DataFrame with the time, mean (MEAN) and confidence (CONF, 2 std) columns for the error band
+        charts
+        """
+        return pd.concat([self.mean_df[POWER], self.std * 2], axis=1, keys=["MEAN", "CONF"]).reset_index()
+
+    @cached_property
+    def values(self):
+        """
+        :return: The list of power arrays of each run, views of the block
+        """
+        return list(self.block)
+
+    @property
+    def pooled(self):
+        """
+        :return: The array of the power values of all the runs combined, the power block itself
+        """
+        return self.block.pooled
+
+    @cached_property
+    def zscores(self):
+        """
+        :return: The list of z-score arrays of the power of each run
+        """
+        from scipy import stats
+
+        return [stats.zscore(values) for values in self.values]
+
+    def memoize(self, key, compute):
+        """
+        Get the result of a stage, computing it only the first time it is requested for the key. The key should
+        name the stage and hold the values of all the inputs it depends on other than the runs themselves.
+
+        :param key: The hashable key of the stage and its inputs
+        :param compute: The function without arguments computing the result of the stage
+        :return: The (memoized) result of the stage
+        """
+        if key not in self._memo:
+            with stage(key[0] if isinstance(key, tuple) else key):
+                self._memo[key] = compute()
+        return self._memo[key]
+
+    def filtered_values(self, orv):
+        """
+        Get the power values of each run without the outliers, memoized per outlier removal value. The z-scores
+        are computed once and reused for every outlier removal value.
+
+        :param orv: The number of standard deviations to keep included
+        :return: The list of outlier removed power arrays of each run
+        """
+        return self.memoize(("filtered", orv), lambda: [values[np.abs(zscores) < orv]
+                                                        for values, zscores in zip(self.values, self.zscores)])
+
+    def pooled_values(self, orv):
+        """
+        Get the outlier removed power values of all the runs combined.
+
+        :param orv: The number of standard deviations to keep included
+        :return: The array of the outlier removed power values of all the runs
+        """
+        return self.memoize(("pooled", orv), lambda: np.concatenate(self.filtered_values(orv)))
+
+    def moments(self, orv):
+        """
+        Get the moments of the outlier removed values of each run, memoized per outlier removal value.
+
+        :param orv: The number of standard deviations to keep included
+        :return: The list of Moments of each run
+        """
+        return self.memoize(("moments", orv), lambda: [Moments.from_values(values)
+                                                       for values in self.filtered_values(orv)])
+
+    def pooled_moments(self, orv):
+        """
+        Get the moments of the outlier removed values of all the runs combined, merged from those of each run.
+
+        :param orv: The number of standard deviations to keep included
+        :return: The Moments of all the runs combined
+        """
+        return self.memoize(("pooled moments", orv), lambda: merge_all(self.moments(orv), Moments()))
+
+    def sketches(self, orv):
+        """
+        Get the quantile sketches of the outlier removed values of each run, memoized per outlier removal value.
+
+        :param orv: The number of standard deviations to keep included
+        :return: The list of QuantileSketch of each run
+        """
+        return self.memoize(("sketches", orv), lambda: [QuantileSketch.from_values(values)
+                                                        for values in self.filtered_values(orv)])
+
+    def pooled_sketch(self, orv):
+        """
+        Get the quantile sketch of the outlier removed values of all the runs combined, merged from those of
+        each run.
+
+        :param orv: The number of standard deviations to keep included
+        :return: The QuantileSketch of all the runs combined
+        """
+        return self.memoize(("pooled sketch", orv), lambda: merge_all(self.sketches(orv), QuantileSketch()))
+
+    def violin_stats(self, orv):
+        """
+        Get the violin statistics (density curve, median and extremes) of the outlier removed values of each run
+        and of all the runs combined, memoized per outlier removal value.
+
+        :param orv: The number of standard deviations to keep included
+        :return: The list of violin statistics (see distributions.violin_stats) of each run followed by those of
+        all the runs combined
+        """
+        def compute():
+            values = self.filtered_values(orv) + [self.pooled_values(orv)]
+            moments = self.moments(orv) + [self.pooled_moments(orv)]
+            sketches = self.sketches(orv) + [self.pooled_sketch(orv)]
+            return [violin_stats(run_values, run_moments, sketch.quantiles(0.5)[0])
+                    for run_values, run_moments, sketch in zip(values, moments, sketches)]
+
+        return self.memoize(("violin stats", orv), compute)
+
+    def normality_tests(self, orv, method="auto"):
+        """
+        Get the normality tests of the outlier removed values of each run and of all the runs combined, memoized
+        per outlier removal value. Large samples are tested with a test suited to their size (see
+        power_statistics.normality_test), the combined runs from their merged moments where possible.
+
+        :param orv: The number of standard deviations to keep included
+        :param method: The normality test method, one of power_statistics.NORMALITY_METHODS
+        :return: The list of (p-value, test name) of each run followed by that of all the runs combined
+        """
+        def compute():
+            # Test each run, reusing the moments of the runs
+            tests = [normality_test(values, method, moments)
+                     for values, moments in zip(self.filtered_values(orv), self.moments(orv))]
+            pooled = self.pooled_moments(orv)
+            # Only combine the values of the runs if the test of the combined runs needs them
+            needs_values = (method in ("shapiro", "subsample") or
+                            (method == "auto" and pooled.count <= SHAPIRO_MAX_SAMPLES))
+            return tests + [normality_test(self.pooled_values(orv) if needs_values else None, method, pooled)]
+
+        return self.memoize(("normality", orv, method), compute)
+
+    def distribution_summary(self, orv, names=None):
+        """
+        Get the distribution statistics of the outlier removed values of each run and of all the runs combined,
+        the combined statistics are merged from those of each run without rescanning the values.
+
+        :param orv: The number of standard deviations to keep included
+        :param names: The names of the runs followed by the name of all the runs combined, defaults to the run
+        names and "Total"
+        :return: A DataFrame with the samples, mean, std, skewness, kurtosis and 5th, 50th and 95th percentiles
+        """
+        moments = self.moments(orv) + [self.pooled_moments(orv)]
+        quantiles = [sketch.quantiles([0.05, 0.5, 0.95]) for sketch in self.sketches(orv) + [self.pooled_sketch(orv)]]
+        return pd.DataFrame(data={"FILE": names or self.names + ["Total"],
+                                  "SAMPLES": [moment.count for moment in moments],
+                                  "MEAN": [moment.mean if moment.count else np.nan for moment in moments],
+                                  "STD": [moment.std for moment in moments],
+                                  "SKEWNESS": [moment.skewness for moment in moments],
+                                  "KURTOSIS": [moment.kurtosis for moment in moments],
+                                  "P5": [quantile[0] for quantile in quantiles],
+                                  "MEDIAN": [quantile[1] for quantile in quantiles],
+                                  "P95": [quantile[2] for quantile in quantiles]})
+
+    @cached_property
+    def summary(self):
+        """
+        :return: A DataFrame with the summary statistics of each run: total energy, mean, std, min and max power
+        and the number of samples
+        """
+        return pd.DataFrame(data={"FILE": self.names,
+                                  "TOTAL ENERGY": self.total_energies,
+                                  "MEAN POWER": [np.mean(values) for values in self.values],
+                                  "STD POWER": [np.std(values, ddof=1) if len(values) > 1 else np.nan
+                                                for values in self.values],
+                                  "MIN POWER": [np.min(values, initial=np.inf) for values in self.values],
+                                  "MAX POWER": [np.max(values, initial=-np.inf) for values in self.values],
+                                  "SAMPLES": [len(values) for values in self.values]})
+
+
+def load_run_sets(file_sets, store, store_key, ingestion=None, **kwargs):
+    """
+    Read in multiple sets of uploaded files into run sets, reusing the run sets kept in the store by a
+    previous call when the same files are uploaded with the same settings. With a Streamlit session state as
+    the store, the run sets and everything they memoized survive the reruns of the page.
+
+    :param file_sets: The list of sets (lists) of files that have been uploaded
+    :param store: The dict-like store to keep the run sets in, such as st.session_state
+    :param store_key: The key to keep the run sets under in the store
+    :param ingestion: The Ingestion that loaded the files in the background, None to read the files here
+    :param kwargs: The keyword arguments of read_uploaded_file_sets, only alignment and precision when an
+    ingestion is given
+    :return: The list of run sets, one for each set of files
+    """
+    # The uploads are identified by their name and upload id, or their path
+    key = (tuple(tuple(upload_key(file) for file in files) for files in file_sets),
+           tuple(sorted(kwargs.items(), key=lambda item: item[0])),
+           None if ingestion is None else (ingestion.engine, ingestion.bin_width))
+
+    # Reuse the run sets of the previous call if they were read from the same files
+    stored = store.get(store_key)
+    if stored is not None and stored[0] == key:
+        return stored[1]
+
+    if ingestion is not None:
+        set_datas = ingestion.read_file_sets(file_sets, **kwargs)
+    else:
+        set_datas = read_uploaded_file_sets(file_sets, **kwargs)
+    run_sets = [RunSet(*set_data) for set_data in set_datas]
+    store[store_key] = (key, run_sets)
+    return run_sets
+
+
+def upload_key(file):
+    """
+    Get a key identifying an uploaded file or path, without reading its contents.
+
+    :param file: The path or uploaded file
+    :return: The hashable key of the file
+    """
+    if isinstance(file, (str, os.PathLike)):
+        return os.fspath(file), os.path.getmtime(file)
+    return file.name, getattr(file, "file_id", None) or file.size
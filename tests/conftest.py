@@ -0,0 +1,31 @@
+import os
+
+import pytest
+
+
+class UploadedFile:
+    """
+    An uploaded file like the ones Streamlit gives, with a name, an upload id and the bytes of the file.
+    """
+
+    def __init__(self, path, file_id=None):
+        """
+        :param path: The path of the file to upload
+        :param file_id: The id of the upload, None for the path
+        """
+        self.name = os.path.basename(path)
+        self.file_id = file_id or path
+        with open(path, "rb") as f:
+            self.data = f.read()
+        self.size = len(self.data)
+
+    def getvalue(self):
+        return self.data
+
+
+@pytest.fixture
+def upload():
+    """
+    :return: The function creating an uploaded file from a path
+    """
+    return UploadedFile
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from alignment import align_runs, aligned_mean_std
+
+
+def run(time, power):
+    """
+    :param time: The time values of the run
+    :param power: The power values of the run
+    :return: The time indexed power Series of the run
+    """
+    return pd.Series(power, index=pd.Index(time, dtype=np.float64), dtype=np.float64)
+
+
+# Two runs that overlap between 0.5s and 1s, sampled off the grid
+RUNS = [run([0.0, 0.35, 0.68, 1.0], [0.0, 3.5, 6.8, 10.0]), run([0.5, 1.25, 2.0], [5.0, 12.5, 20.0])]
+
+
+def test_pad_spans_all_runs():
+    grid, values = align_runs(RUNS, policy="pad")
+
+    np.testing.assert_allclose(grid, np.arange(21) / 10)
+    assert values.shape == (21, 2)
+    np.testing.assert_array_equal(np.isnan(values[:, 0]), grid > 1.0)
+    np.testing.assert_array_equal(np.isnan(values[:, 1]), grid < 0.5)
+
+
+def test_truncate_spans_the_overlap():
+    grid, values = align_runs(RUNS, policy="truncate")
+
+    np.testing.assert_allclose(grid, np.arange(5, 11) / 10)
+    assert not np.isnan(values).any()
+
+
+def test_interpolations():
+    # Both runs are linear in time (10W per second), the other methods take a sample of the run
+    grid, linear = align_runs(RUNS, interpolation="linear")
+    inside = ~np.isnan(linear)
+    np.testing.assert_allclose(linear[inside], np.broadcast_to(10 * grid[:, None], linear.shape)[inside])
+
+    grid, previous = align_runs(RUNS, policy="truncate", interpolation="previous")
+    np.testing.assert_array_equal(previous[:, 0], [3.5, 3.5, 6.8, 6.8, 6.8, 10.0])
+    np.testing.assert_array_equal(previous[:, 1], [5.0, 5.0, 5.0, 5.0, 5.0, 5.0])
+
+    grid, nearest = align_runs(RUNS, policy="truncate", interpolation="nearest")
+    np.testing.assert_array_equal(nearest[:, 0], [3.5, 6.8, 6.8, 6.8, 10.0, 10.0])
+    np.testing.assert_array_equal(nearest[:, 1], [5.0, 5.0, 5.0, 5.0, 12.5, 12.5])
+
+
+def test_runs_without_overlap_or_data():
+    grid, values = align_runs([run([0.0, 1.0], [1.0, 1.0]), run([2.0, 3.0], [2.0, 2.0])], policy="truncate")
+    assert len(grid) == 0 and values.shape == (0, 2)
+
+    grid, values = align_runs([run([0.0, 1.0], [1.0, 1.0]), run([], [])])
+    assert len(grid) == 11
+    assert np.isnan(values[:, 1]).all()
+
+    # The mean and std ignore the run without data, leaving the std NaN with one run left
+    mean, std = aligned_mean_std(values)
+    np.testing.assert_array_equal(mean, np.ones(11))
+    assert np.isnan(std).all()
+
+
+def test_unknown_options():
+    with pytest.raises(ValueError):
+        align_runs(RUNS, policy="unknown")
+    with pytest.raises(ValueError):
+        align_runs(RUNS, interpolation="unknown")
+
+
+def test_dtype():
+    _, values = align_runs(RUNS, dtype=np.float32)
+    assert values.dtype == np.float32
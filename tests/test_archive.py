@@ -0,0 +1,42 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+import reader
+from convert import convert_files
+from reader import POWER, TIME, load_archive, load_runs
+
+# The example EnergiBridge files shipped with the repository
+TEST_FILES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "test_files", "*.csv")))
+
+
+@pytest.fixture
+def archive_path(tmp_path):
+    path = str(tmp_path / "test_files.erarc")
+    convert_files(TEST_FILES, path, workers=1)
+    return path
+
+
+@pytest.mark.parametrize("uploaded", [False, True])
+def test_archived_runs_share_memory_with_the_archive(archive_path, monkeypatch, upload, uploaded):
+    # Keep the runs read from the archive, to check the loaded DataFrames are views of their arrays
+    read_runs = []
+    read_archive = reader.read_archive
+    monkeypatch.setattr(reader, "read_archive", lambda source: read_runs.append(read_archive(source)) or read_runs[-1])
+    named_runs = load_archive(upload(archive_path) if uploaded else archive_path)
+
+    assert len(named_runs) == len(TEST_FILES)
+    for (_, (power_tdf, _)), run in zip(named_runs, read_runs[0]):
+        assert np.shares_memory(power_tdf[TIME].to_numpy(), run["time"])
+        assert np.shares_memory(power_tdf[POWER].to_numpy(), run["power"])
+
+
+def test_archived_runs_match_the_files(archive_path):
+    for (name, (power_tdf, total_energy)), path, (loaded_tdf, loaded_energy) in zip(
+            load_archive(archive_path), TEST_FILES, load_runs(TEST_FILES, workers=1)):
+        assert name == os.path.splitext(os.path.basename(path))[0]
+        np.testing.assert_array_equal(power_tdf[TIME], loaded_tdf[TIME])
+        np.testing.assert_array_equal(power_tdf[POWER], loaded_tdf[POWER])
+        assert total_energy == loaded_energy
@@ -0,0 +1,71 @@
+import glob
+import json
+import os
+
+import numpy as np
+import pytest
+
+from bundle import FORMAT_VERSION, build_bundle, bundle_html, read_bundle, write_bundle
+from runset import RunSet
+
+# The example EnergiBridge files shipped with the repository, grouped into the sets of the comparisons
+TEST_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "test_files")
+SETS = [sorted(glob.glob(os.path.join(TEST_DIRECTORY, f"{name}*.csv"))) for name in ["gedit", "sleep"]]
+
+
+@pytest.fixture(scope="module")
+def run_sets():
+    return [RunSet.from_files(paths) for paths in SETS + [SETS[0][:1]]]
+
+
+def bundle_data(set_count, run_sets):
+    """
+    :param set_count: The number of sets to bundle
+    :param run_sets: The RunSets of the test files
+    :return: The bytes of the bundle of the first sets
+    """
+    return write_bundle(build_bundle([f"Set <{i}>" for i in range(set_count)], run_sets[:set_count]))
+
+
+@pytest.mark.parametrize("set_count", [1, 2, 3])
+def test_round_trip(set_count, run_sets):
+    bundle = read_bundle(bundle_data(set_count, run_sets))
+
+    assert bundle["kind"] == ("analysis" if set_count == 1 else "comparison")
+    assert [set_data["name"] for set_data in bundle["sets"]] == [f"Set <{i}>" for i in range(set_count)]
+    for set_data, run_set in zip(bundle["sets"], run_sets):
+        assert set_data["files"] == run_set.names
+        np.testing.assert_allclose(set_data["total_energies"], run_set.total_energies)
+        assert (set_data["errorband"] is None) == run_set.single
+    assert ("comparison" in bundle) == (set_count == 2)
+    assert ("pairwise" in bundle) == (set_count == 3)
+
+    # The report is self-contained, with the names escaped and an image per chart
+    text = bundle_html(bundle)
+    assert "Set &lt;0&gt;" in text and "Set <0>" not in text
+    assert text.count("<img ") == 1 + set_count
+    assert "http" not in text
+
+
+def test_not_a_bundle():
+    for data in [b"\xff\xfe", b"[1, 2]", json.dumps({"format": "other"}).encode()]:
+        with pytest.raises(ValueError):
+            read_bundle(data)
+
+
+@pytest.mark.parametrize("change", [
+    {"version": None}, {"version": "1"}, {"version": FORMAT_VERSION + 1}, {"kind": "<script>"},
+    {"created": 1}, {"sets": []}])
+def test_invalid_bundle(change, run_sets):
+    bundle = json.loads(bundle_data(1, run_sets))
+    bundle.update(change)
+    with pytest.raises(ValueError):
+        read_bundle(json.dumps({key: value for key, value in bundle.items() if value is not None}).encode())
+
+
+@pytest.mark.parametrize("outlier_removal", [None, "<b>3</b>", True])
+def test_invalid_outlier_removal(outlier_removal, run_sets):
+    bundle = json.loads(bundle_data(1, run_sets))
+    bundle["sets"][0]["outlier_removal"] = outlier_removal
+    with pytest.raises(ValueError):
+        read_bundle(json.dumps(bundle).encode())
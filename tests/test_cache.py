@@ -0,0 +1,29 @@
+import os
+import tracemalloc
+
+from cache import RunCache
+from reader import PARSER_VERSION, source_cache_key
+
+
+def test_key_of_blocks_matches_bytes():
+    data = os.urandom(3 * 2 ** 20 + 17)
+    blocks = [data[start:start + 2 ** 20] for start in range(0, len(data), 2 ** 20)]
+
+    assert RunCache.key(iter(blocks), PARSER_VERSION, 0.1) == RunCache.key(data, PARSER_VERSION, 0.1)
+    assert RunCache.key(data, PARSER_VERSION, 0.1) != RunCache.key(data, PARSER_VERSION, 0.2)
+
+
+def test_file_key_is_hashed_in_blocks(tmp_path):
+    # The key of a file on disk matches that of its bytes, without reading the whole file into memory
+    path = tmp_path / "large.csv"
+    data = os.urandom(32 * 2 ** 20)
+    path.write_bytes(data)
+    cache = RunCache(0)
+
+    tracemalloc.start()
+    key = source_cache_key(cache, str(path))
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    assert key == source_cache_key(cache, data)
+    assert peak < 4 * 2 ** 20
@@ -0,0 +1,197 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from comparison import (SCIPY_MAX_SAMPLES, adjust_pvalues, bootstrap_interval, compare_many, compare_sets,
+                        permutation_pvalue, rank_comparison, shared_bins)
+
+
+def power_sets(sizes, tied=False, seed=0):
+    """
+    :param sizes: The number of values of each set
+    :param tied: Whether to round the values to 0.1W, so many values are tied
+    :param seed: The seed of the random values
+    :return: The list of arrays of power-like values of the sets, each set a little higher than the previous
+    """
+    rng = np.random.default_rng(seed)
+    sets = [rng.normal(20 + i * 0.2, 2, size) for i, size in enumerate(sizes)]
+    return [values.round(1) for values in sets] if tied else sets
+
+
+def brute_force_pairs(data1, data2):
+    """
+    :param data1: The array of values of the first set
+    :param data2: The array of values of the second set
+    :return: The fraction of all the pairs where the first value is higher and where it is lower
+    """
+    return np.mean(data1[:, None] > data2[None, :]), np.mean(data1[:, None] < data2[None, :])
+
+
+@pytest.mark.parametrize("tied", [False, True])
+@pytest.mark.parametrize("sizes", [(7, 9), (300, 500), (3000, 4000)])
+def test_rank_comparison(sizes, tied):
+    # Small sets are left to scipy, larger sets use the normal approximation scipy uses for them itself
+    data1, data2 = power_sets(sizes, tied)
+    higher, lower, p_value = rank_comparison(data1, data2)
+    method = "auto" if sum(sizes) <= SCIPY_MAX_SAMPLES else "asymptotic"
+
+    assert (higher, lower) == pytest.approx(brute_force_pairs(data1, data2), rel=1e-12)
+    assert p_value == pytest.approx(stats.mannwhitneyu(data1, data2, method=method).pvalue, rel=1e-9)
+
+
+def test_rank_comparison_of_empty_sets():
+    assert np.isnan(rank_comparison(np.empty(0), np.ones(3))).all()
+    assert np.isnan(rank_comparison(np.ones(3), np.empty(0))).all()
+
+
+@pytest.mark.parametrize("tied", [False, True])
+def test_shared_bins_keep_values_exact(tied):
+    data1, data2 = power_sets((1000, 1048), tied)
+    values, counts1, counts2 = shared_bins(data1, data2, max_bins=2048)
+
+    np.testing.assert_array_equal(values, np.unique(np.concatenate((data1, data2))))
+    np.testing.assert_array_equal(values.repeat(counts1), np.sort(data1))
+    np.testing.assert_array_equal(values.repeat(counts2), np.sort(data2))
+
+
+def test_shared_bins_above_max_bins():
+    # Each bin is represented by the mean of its values, so the sums and means of the sets stay nearly the same
+    data1, data2 = power_sets((50000, 60000))
+    values, counts1, counts2 = shared_bins(data1, data2, max_bins=256)
+
+    assert len(values) <= 256
+    assert np.all(np.diff(values) > 0)
+    assert (counts1.sum(), counts2.sum()) == (len(data1), len(data2))
+    assert counts1 @ values + counts2 @ values == pytest.approx(data1.sum() + data2.sum(), rel=1e-12)
+    assert (counts1 @ values) / len(data1) == pytest.approx(data1.mean(), abs=0.01)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_permutation_pvalue_matches_scipy(seed):
+    # scipy enumerates all 1716 permutations of the small sets, 20000 random ones are within about 0.004 of it
+    data1, data2 = power_sets((6, 7), seed=seed)
+    values, counts1, counts2 = shared_bins(data1, data2)
+    observed = data1.mean() - data2.mean()
+    p_value = permutation_pvalue(values, counts1, counts2, observed, 20000, np.random.default_rng(seed))
+
+    expected = stats.permutation_test((data1, data2), lambda x, y: np.mean(x) - np.mean(y),
+                                      n_resamples=np.inf).pvalue
+    assert p_value == pytest.approx(expected, abs=0.02)
+
+
+def test_bootstrap_interval_coverage():
+    # About 95% of the intervals of sets drawn from distributions with means 0.5W apart should hold that difference
+    rng = np.random.default_rng(0)
+    covered = 0
+    for _ in range(300):
+        data1, data2 = rng.normal(20.5, 2, 80), rng.gamma(16, 1.25, 60)
+        values, counts1, counts2 = shared_bins(data1, data2)
+        low, high = bootstrap_interval(values, counts1, counts2, data1.mean() - data2.mean(), 500, rng)
+        covered += low <= 0.5 <= high
+    assert 0.9 <= covered / 300 <= 0.98
+
+
+def test_resampling_of_empty_sets():
+    values, counts1, counts2 = shared_bins(np.empty(0), np.ones(3))
+    rng = np.random.default_rng(0)
+
+    assert np.isnan(permutation_pvalue(values, counts1, counts2, np.nan, 100, rng))
+    assert np.isnan(bootstrap_interval(values, counts1, counts2, np.nan, 100, rng)).all()
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_compare_sets_with_an_empty_set():
+    results = compare_sets(np.ones(3), np.empty(0), [1.0, 2.0], [3.0])
+
+    for key in ["welch", "mannwhitneyu", "higher", "cohens_d", "cliffs_delta", "power_difference",
+                "power_permutation"]:
+        assert np.isnan(results[key])
+    assert np.isnan(results["power_bootstrap"]).all()
+    assert results["energy_difference"] == -1.5
+
+
+@pytest.mark.parametrize("tied", [False, True])
+def test_compare_many_matches_pairwise_tests(tied):
+    # The small set is compared with scipy, the pairs of large sets with the normal approximation scipy uses
+    datasets = power_sets((3000, 4000, 10, 5000), tied)
+    results = compare_many(datasets, "none")
+
+    for i, data1 in enumerate(datasets):
+        for j, data2 in enumerate(datasets):
+            if i == j:
+                assert all(np.isnan(results[test][i, j]) for test in results)
+                continue
+            method = "auto" if len(data1) + len(data2) <= SCIPY_MAX_SAMPLES else "asymptotic"
+            higher, lower = brute_force_pairs(data1, data2)
+            assert results["welch"][i, j] == pytest.approx(stats.ttest_ind(data1, data2, equal_var=False).pvalue,
+                                                           rel=1e-9)
+            assert results["mannwhitneyu"][i, j] == pytest.approx(
+                stats.mannwhitneyu(data1, data2, method=method).pvalue, rel=1e-9)
+            assert results["higher"][i, j] == round(100 * higher, 2)
+            assert results["cliffs_delta"][i, j] == pytest.approx(higher - lower, abs=1e-12)
+            assert results["mean_difference"][i, j] == pytest.approx(data1.mean() - data2.mean(), rel=1e-12)
+    for test in ("welch", "mannwhitneyu"):
+        np.testing.assert_array_equal(results[f"{test}_adjusted"], results[test])
+
+
+def test_compare_many_corrects_the_pairs():
+    datasets = power_sets((300, 400, 500))
+    results = compare_many(datasets, "holm")
+    upper = np.triu_indices(3, 1)
+
+    for test in ("welch", "mannwhitneyu"):
+        adjusted = adjust_pvalues(results[test][upper], "holm")
+        np.testing.assert_array_equal(results[f"{test}_adjusted"][upper], adjusted)
+        np.testing.assert_array_equal(results[f"{test}_adjusted"].T[upper], adjusted)
+
+
+def test_compare_many_with_an_empty_set():
+    results = compare_many(power_sets((300, 0, 400)))
+
+    assert np.isnan(results["mannwhitneyu"][1]).all() and np.isnan(results["welch"][:, 1]).all()
+    assert np.isnan(results["higher"][1]).all() and np.isnan(results["mannwhitneyu_adjusted"][1]).all()
+    assert not np.isnan(results["mannwhitneyu_adjusted"][0, 2])
+    with pytest.raises(ValueError):
+        compare_many(power_sets((3, 4)), "unknown")
+
+
+@pytest.mark.parametrize("correction, expected", [
+    ("bonferroni", [0.04, 0.16, 0.12, np.nan, 0.02]),
+    ("holm", [0.03, 0.06, 0.06, np.nan, 0.02]),
+    ("fdr_bh", [0.02, 0.04, 0.04, np.nan, 0.02]),
+    ("none", [0.01, 0.04, 0.03, np.nan, 0.005])])
+def test_adjust_pvalues(correction, expected):
+    np.testing.assert_allclose(adjust_pvalues([0.01, 0.04, 0.03, np.nan, 0.005], correction), expected,
+                               rtol=1e-12)
+
+
+@pytest.mark.parametrize("correction, expected", [("bonferroni", [0.6, 1.0]), ("holm", [0.6, 0.6]),
+                                                  ("fdr_bh", [0.6, 0.6])])
+def test_adjust_pvalues_at_most_one(correction, expected):
+    np.testing.assert_allclose(adjust_pvalues([0.3, 0.6], correction), expected, rtol=1e-12)
+
+
+def test_adjust_pvalues_without_p_values():
+    assert np.isnan(adjust_pvalues([np.nan, np.nan], "holm")).all()
+    assert len(adjust_pvalues([], "fdr_bh")) == 0
+    with pytest.raises(ValueError):
+        adjust_pvalues([0.1], "unknown")
+
+
+@pytest.mark.parametrize("sizes", [(300, 500), (3000, 4000)])
+def test_binned_values_match_repeated_values(sizes):
+    # Values given once with their counts compare like the values repeated that many times
+    data1, data2 = power_sets(sizes, tied=True)
+    (values1, counts1), (values2, counts2) = (np.unique(data, return_counts=True) for data in (data1, data2))
+    binned = compare_sets(values1, values2, [1.0, 2.0], [3.0, 4.0], weights=(counts1, counts2))
+    repeated = compare_sets(data1, data2, [1.0, 2.0], [3.0, 4.0])
+
+    for key in ["welch", "mannwhitneyu", "higher", "cohens_d", "cliffs_delta", "power_difference",
+                "power_permutation", "energy_difference"]:
+        assert binned[key] == pytest.approx(repeated[key], rel=1e-9), key
+    assert binned["power_bootstrap"] == pytest.approx(repeated["power_bootstrap"], rel=1e-9)
+
+    many = compare_many([values1, values2, values1], weights=[counts1, counts2, counts1])
+    expected = compare_many([data1, data2, data1])
+    for key in expected:
+        np.testing.assert_allclose(many[key], expected[key], rtol=1e-9, equal_nan=True, err_msg=key)
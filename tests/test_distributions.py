@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from distributions import binned_kde, violin_stats
+from power_statistics import Moments
+
+
+def power_values(samples=20000, seed=0):
+    """
+    :param samples: The number of values
+    :param seed: The seed of the random values
+    :return: An array of bimodal, power-like values
+    """
+    rng = np.random.default_rng(seed)
+    return np.concatenate((rng.normal(12, 1.5, samples // 2), rng.normal(25, 3, samples - samples // 2)))
+
+
+@pytest.mark.parametrize("bandwidth", [0.3, 1.0, 4.0])
+def test_binned_kde_matches_gaussian_kde(bandwidth):
+    # Binning onto 512 grid points moves each value by at most half a grid step, well within the bandwidths
+    values = power_values()
+    grid, density = binned_kde(values, values.min(), values.max(), bandwidth)
+    expected = stats.gaussian_kde(values, bw_method=bandwidth / values.std(ddof=1))(grid)
+
+    assert len(grid) == 512
+    np.testing.assert_allclose(density, expected, rtol=0, atol=2e-3 * expected.max())
+
+
+def test_binned_kde_weights():
+    # Weighted distinct values give the density of the values repeated that many times
+    values = np.array([10.0, 11.5, 11.5, 11.5, 14.0, 14.0])
+    distinct, counts = np.unique(values, return_counts=True)
+    _, density = binned_kde(values, 10, 14, 0.5)
+    _, weighted = binned_kde(distinct, 10, 14, 0.5, weights=counts)
+
+    np.testing.assert_allclose(weighted, density)
+
+
+def test_binned_kde_without_spread():
+    for values, minimum, maximum, bandwidth in [([], 0, 1, 1), ([5.0, 5.0], 5, 5, 1), ([1.0, 2.0], 1, 2, 0)]:
+        grid, density = binned_kde(np.array(values), minimum, maximum, bandwidth)
+        np.testing.assert_array_equal(density, np.ones(512))
+
+
+def test_violin_stats():
+    values = power_values(2000)
+    moments = Moments.from_values(values)
+    violin = violin_stats(values, moments, np.median(values))
+
+    # The bandwidth follows Scott's rule, like matplotlib's own violin statistics
+    expected = stats.gaussian_kde(values, bw_method="scott")(violin["coords"])
+    np.testing.assert_allclose(violin["vals"], expected, rtol=0, atol=2e-3 * expected.max())
+    assert (violin["min"], violin["max"]) == (values.min(), values.max())
+    assert violin["mean"] == pytest.approx(values.mean())
+
+    empty = violin_stats(np.empty(0), Moments(), np.nan)
+    assert np.isnan(empty["mean"]) and len(empty["coords"]) == 1
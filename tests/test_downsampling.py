@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from downsampling import bucket_means, downsample_frame, downsample_indices
+
+
+def noisy_series(samples=10007, seed=0):
+    """
+    :param samples: The number of samples
+    :param seed: The seed of the random values
+    :return: The time array at 0.1s and a noisy value array with some missing values
+    """
+    rng = np.random.default_rng(seed)
+    values = rng.normal(20, 2, samples)
+    values[rng.integers(0, samples, 50)] = np.nan
+    return np.arange(samples) * 0.1, values
+
+
+@pytest.mark.parametrize("n_points", [2, 10, 704])
+def test_minmax_keeps_bucket_extremes(n_points):
+    time, values = noisy_series()
+    indices = downsample_indices(time, values, n_points, "minmax")
+
+    # Each bucket of equally many samples keeps the samples of its min and max value
+    assert indices[0] == 0 and indices[-1] == len(values) - 1
+    assert np.all(np.diff(indices) > 0)
+    size = int(np.ceil(len(values) / max(1, n_points // 2)))
+    for start in range(0, len(values), size):
+        bucket = values[start:start + size]
+        assert start + np.nanargmin(bucket) in indices
+        assert start + np.nanargmax(bucket) in indices
+    assert len(indices) <= n_points + 2
+
+
+@pytest.mark.parametrize("n_points", [3, 10, 704])
+def test_lttb_keeps_endpoints(n_points):
+    time, values = noisy_series()
+    indices = downsample_indices(time, values, n_points, "lttb")
+
+    assert len(indices) == n_points
+    assert indices[0] == 0 and indices[-1] == len(values) - 1
+    assert np.all(np.diff(indices) > 0)
+
+
+def test_lttb_keeps_a_spike():
+    time = np.arange(1000) * 0.1
+    values = np.zeros(1000)
+    values[517] = 100
+    assert 517 in downsample_indices(time, values, 20, "lttb")
+
+
+@pytest.mark.parametrize("method", ["minmax", "lttb"])
+def test_short_series_are_kept(method):
+    np.testing.assert_array_equal(downsample_indices(np.arange(5), np.arange(5), 10, method), np.arange(5))
+
+
+def test_unknown_method():
+    with pytest.raises(ValueError):
+        downsample_indices(np.arange(100), np.arange(100), 10, "unknown")
+
+
+def test_downsample_frame_keeps_rows_of_all_columns():
+    time, values = noisy_series()
+    df = pd.DataFrame(data={"TIME": time, "A": values, "B": -values})
+    downsampled = downsample_frame(df, "TIME", ["A", "B"], n_points=100)
+
+    expected = np.union1d(downsample_indices(time, values, 100), downsample_indices(time, -values, 100))
+    np.testing.assert_array_equal(downsampled.index, expected)
+    assert downsample_frame(df, "TIME", "A", n_points=len(df)) is df
+
+
+def test_bucket_means():
+    x = np.arange(10, dtype=np.float64)
+    values = np.column_stack([x, 2 * x])
+    mean_x, means = bucket_means(x, values, 5)
+
+    np.testing.assert_allclose(mean_x, [0.5, 2.5, 4.5, 6.5, 8.5])
+    np.testing.assert_allclose(means, np.column_stack([mean_x, 2 * mean_x]))
@@ -0,0 +1,114 @@
+from concurrent.futures import ThreadPoolExecutor
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cache import RunCache
+from convert import convert_files
+from ingest import Ingestion
+from reader import POWER, read_uploaded_file_sets
+
+# The example EnergiBridge files shipped with the repository
+TEST_FILES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "test_files", "*.csv")))
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        yield executor
+
+
+def loaded(ingestion, files):
+    """
+    Submit the files and wait until the loading of all of them finished.
+
+    :param ingestion: The Ingestion
+    :param files: The list of paths or uploaded files
+    """
+    ingestion.submit(files)
+    while not ingestion.finished(files):
+        ingestion.wait(files, timeout=10)
+
+
+def test_read_file_sets_matches_reading_the_files(executor, upload):
+    file_sets = [[upload(path) for path in TEST_FILES[:3]], [upload(path) for path in TEST_FILES[3:]]]
+    ingestion = Ingestion(executor=executor)
+    loaded(ingestion, file_sets[0] + file_sets[1])
+
+    assert [job.status for job in ingestion.jobs(file_sets[0] + file_sets[1])] == ["done"] * len(TEST_FILES)
+    for ingested, read in zip(ingestion.read_file_sets(file_sets), read_uploaded_file_sets(file_sets, workers=1)):
+        pd.testing.assert_frame_equal(ingested[0], read[0])
+        pd.testing.assert_frame_equal(ingested[1], read[1])
+        assert ingested[2:4] == read[2:4]
+        np.testing.assert_array_equal(ingested[4].power, read[4].power)
+
+
+def test_files_are_submitted_once(executor, upload):
+    files = [upload(path) for path in TEST_FILES]
+    ingestion = Ingestion(executor=executor)
+    loaded(ingestion, files[:4])
+    jobs = ingestion.jobs(files[:4])
+
+    # Uploading more files only starts the new ones, and the files no longer uploaded are forgotten
+    loaded(ingestion, files[2:])
+    assert ingestion.jobs(files[2:4]) == jobs[2:]
+    with pytest.raises(KeyError):
+        ingestion.jobs(files[:2])
+
+
+def test_cached_and_archived_runs_are_available_right_away(executor, upload, tmp_path):
+    archive = str(tmp_path / "sleep.erarc")
+    convert_files(TEST_FILES[3:], archive, workers=1)
+    cache = RunCache()
+    loaded(Ingestion(cache=cache, executor=executor), [upload(path) for path in TEST_FILES[:3]])
+
+    # A new session uploading the same files takes them from the cache, the archive is read without parsing
+    files = [upload(path, file_id=f"again {path}") for path in TEST_FILES[:3]] + [upload(archive)]
+    ingestion = Ingestion(cache=cache, executor=executor)
+    ingestion.submit(files)
+
+    assert ingestion.finished(files)
+    assert [job.status for job in ingestion.jobs(files)] == ["cached"] * len(files)
+    assert [len(runs) for runs in ingestion.named_runs(files)] == [1, 1, 1, 3]
+    assert cache.stats()["hits"] == 3
+
+
+def test_failed_files(executor, upload, tmp_path):
+    broken = tmp_path / "broken.csv"
+    broken.write_text("Time,Other\n1,2\n")
+    files = [upload(TEST_FILES[0]), upload(str(broken))]
+    ingestion = Ingestion(executor=executor)
+    loaded(ingestion, files)
+
+    # The failed file is reported, and raises its error when the sets are combined
+    assert [job.status for job in ingestion.jobs(files)] == ["done", "failed"]
+    assert ingestion.named_runs(files)[1] is None
+    with pytest.raises(ValueError):
+        ingestion.read_file_sets([files])
+
+
+def test_combined_runs_are_kept_as_views_of_the_blocks(executor, upload):
+    # After combining, the jobs keep the power of their runs as views of the block of their set, so the session
+    # keeps the power values only once
+    file_sets = [[upload(path) for path in TEST_FILES[:2]], [upload(path) for path in TEST_FILES[2:]]]
+    ingestion = Ingestion(executor=executor)
+    loaded(ingestion, file_sets[0] + file_sets[1])
+    before = [runs[0][1][0].copy() for runs in ingestion.named_runs(file_sets[0] + file_sets[1])]
+    results = ingestion.read_file_sets(file_sets)
+
+    start = 0
+    for files, (*_, block) in zip(file_sets, results):
+        for i, runs in enumerate(ingestion.named_runs(files)):
+            (_, (power_tdf, _)), = runs
+            assert np.shares_memory(power_tdf[POWER].to_numpy(), block.power)
+            np.testing.assert_array_equal(power_tdf[POWER], block.run_power(i))
+            pd.testing.assert_frame_equal(power_tdf, before[start + i])
+        start += len(files)
+
+    # Combining again gives the same sets
+    for again, result in zip(ingestion.read_file_sets(file_sets), results):
+        pd.testing.assert_frame_equal(again[0], result[0])
+        np.testing.assert_array_equal(again[4].power, result[4].power)
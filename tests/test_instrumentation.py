@@ -0,0 +1,141 @@
+import contextvars
+import json
+import os
+import threading
+import tracemalloc
+
+import pytest
+
+import instrumentation
+from instrumentation import PROFILE_ENV, Profiler, activate, current_profiler, stage
+
+
+def recorded_profiler(trace_memory=False):
+    """
+    :param trace_memory: Whether to trace the memory allocated by each stage
+    :return: A profiler that recorded two runs of a "read" stage and a nested "parse" stage
+    """
+    profiler = Profiler(enabled=True, trace_memory=trace_memory)
+    for rows in [10, 20]:
+        with profiler.stage("read", rows=rows):
+            with profiler.stage("parse") as parsed:
+                parsed.rows = 2 * rows
+                data = [0] * 100000
+    del data
+    return profiler
+
+
+def in_new_context(function):
+    """
+    :param function: The function to run
+    :return: The result of the function run in a new context, so profilers activated by it do not leak out
+    """
+    return contextvars.Context().run(function)
+
+
+def test_disabled_stage_is_the_shared_no_op():
+    profiler = Profiler()
+    first, second = profiler.stage("read", rows=3), profiler.stage("parse")
+
+    assert first is second
+    with first as recording:
+        recording.rows = 5
+    assert first.rows is None and profiler.events == []
+
+
+def test_stage_without_an_activated_profiler_records_nothing(monkeypatch):
+    # Stages run outside a page or report run, such as in the workers of the ingestion, are never kept, even when
+    # profiling is enabled with the environment
+    monkeypatch.setenv(PROFILE_ENV, "1")
+    assert Profiler.from_environment().enabled
+
+    def run():
+        for _ in range(3):
+            with stage("read", rows=10):
+                pass
+        return current_profiler()
+
+    fallback = in_new_context(run)
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    assert not fallback.enabled and fallback.events == []
+    assert instrumentation._default.events == []
+
+
+def test_activated_profiler_records_the_stages():
+    profiler = Profiler(enabled=True)
+
+    def run():
+        activate(profiler)
+        with stage("read", rows=10):
+            pass
+        return current_profiler()
+
+    assert in_new_context(run) is profiler
+    assert [event["name"] for event in profiler.events] == ["read"]
+    assert profiler.events[0]["rows"] == 10 and profiler.events[0]["thread"] == threading.get_ident()
+    assert current_profiler() is not profiler
+
+
+@pytest.mark.parametrize("value, enabled, trace_memory", [
+    ("", False, False), ("0", False, False), ("false", False, False), ("1", True, False), ("memory", True, True),
+    (" Memory ", True, True)])
+def test_from_environment(value, enabled, trace_memory, monkeypatch):
+    monkeypatch.setenv(PROFILE_ENV, value)
+    profiler = Profiler.from_environment()
+
+    assert (profiler.enabled, profiler.trace_memory) == (enabled, trace_memory)
+
+
+def test_summary():
+    profiler = recorded_profiler()
+    summary = profiler.summary()
+
+    assert list(summary.columns) == ["STAGE", "CALLS", "TOTAL (s)", "MEAN (s)", "ROWS", "ALLOCATED (MiB)",
+                                     "PEAK (MiB)"]
+    assert list(summary["STAGE"]) == ["parse", "read"]
+    assert list(summary["CALLS"]) == [2, 2]
+    assert list(summary["ROWS"]) == [60, 30]
+    for name, total in zip(summary["STAGE"], summary["TOTAL (s)"]):
+        assert total == pytest.approx(sum(event["duration"] for event in profiler.events if event["name"] == name))
+    assert (summary["MEAN (s)"] == summary["TOTAL (s)"] / 2).all()
+    assert summary["ALLOCATED (MiB)"].isna().all() and summary["PEAK (MiB)"].isna().all()
+
+    # The nested stage ran within the time of its enclosing stage
+    assert summary["TOTAL (s)"].iloc[1] >= summary["TOTAL (s)"].iloc[0]
+
+    profiler.reset()
+    assert profiler.events == [] and profiler.summary().empty
+
+
+def test_summary_with_traced_memory():
+    # The list of 100000 references allocated by the nested stage takes at least 0.75 MiB
+    tracing = tracemalloc.is_tracing()
+    try:
+        summary = recorded_profiler(trace_memory=True).summary().set_index("STAGE")
+    finally:
+        if not tracing:
+            tracemalloc.stop()
+
+    assert summary.loc["parse", "PEAK (MiB)"] >= 0.75
+    assert summary.loc["read", "PEAK (MiB)"] >= summary.loc["parse", "PEAK (MiB)"]
+    assert summary["ALLOCATED (MiB)"].notna().all()
+
+
+def test_chrome_trace():
+    profiler = recorded_profiler()
+    trace = json.loads(profiler.chrome_trace())
+
+    assert trace["displayTimeUnit"] == "ms"
+    assert [event["name"] for event in trace["traceEvents"]] == [event["name"] for event in profiler.events]
+    for event, recorded in zip(trace["traceEvents"], profiler.events):
+        assert event["ph"] == "X" and event["pid"] == os.getpid() and event["tid"] == threading.get_ident()
+        assert event["ts"] == pytest.approx(recorded["start"] * 1e6)
+        assert event["dur"] == pytest.approx(recorded["duration"] * 1e6)
+        assert event["args"] == {"rows": recorded["rows"]}
+
+    # The nested stage lies within its enclosing stage
+    parse, read = trace["traceEvents"][:2]
+    assert read["ts"] <= parse["ts"] and parse["ts"] + parse["dur"] <= read["ts"] + read["dur"]
+    assert json.loads(Profiler(enabled=True).chrome_trace())["traceEvents"] == []
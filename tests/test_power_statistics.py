@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from power_statistics import (SHAPIRO_MAX_SAMPLES, Moments, QuantileSketch, dagostino_pearson, merge_all,
+                              normality_test)
+
+
+def skewed_values(samples=20000, seed=0):
+    """
+    :param samples: The number of values
+    :param seed: The seed of the random values
+    :return: An array of skewed, power-like values
+    """
+    return 15 + np.random.default_rng(seed).gamma(2.0, 3.0, samples)
+
+
+@pytest.mark.parametrize("splits", [[], [1], [10, 11], [3, 5000, 5001, 19999]])
+def test_merged_moments(splits):
+    values = skewed_values()
+    moments = merge_all([Moments.from_values(part) for part in np.split(values, splits)], Moments())
+
+    assert moments.count == len(values)
+    assert moments.mean == pytest.approx(np.mean(values), rel=1e-12)
+    assert moments.m2 / moments.count == pytest.approx(np.var(values), rel=1e-10)
+    assert moments.std == pytest.approx(np.std(values, ddof=1), rel=1e-10)
+    assert moments.skewness == pytest.approx(stats.skew(values), rel=1e-9)
+    assert moments.kurtosis == pytest.approx(stats.kurtosis(values, fisher=False), rel=1e-9)
+    assert (moments.minimum, moments.maximum) == (values.min(), values.max())
+
+
+def test_moments_of_counted_values():
+    values = np.array([18.5, 20.0, 21.25, 30.0])
+    counts = np.array([3, 1, 0, 2])
+    moments = Moments.from_values(values, counts)
+    expected = Moments.from_values(np.repeat(values, counts))
+
+    assert moments.count == 6
+    for name in ["mean", "m2", "m3", "m4", "minimum", "maximum"]:
+        assert getattr(moments, name) == pytest.approx(getattr(expected, name), rel=1e-12)
+
+
+def test_empty_moments():
+    moments = Moments.from_values([])
+    assert moments.count == 0
+    assert np.isnan(moments.std) and np.isnan(moments.skewness) and np.isnan(moments.kurtosis)
+    assert Moments.from_values([1.0, 2.0]).merge(moments).count == 2
+    assert np.isnan(Moments.from_values([3.0, 3.0]).skewness)
+
+
+@pytest.mark.parametrize("values", [skewed_values(20), skewed_values(500, 1), skewed_values(50000, 3),
+                                    np.random.default_rng(2).normal(20, 2, 10000)],
+                         ids=["20", "500", "50000", "normal"])
+def test_dagostino_pearson_matches_normaltest(values):
+    assert dagostino_pearson(Moments.from_values(values)) == pytest.approx(stats.normaltest(values).pvalue,
+                                                                           rel=1e-8, abs=1e-300)
+
+
+def test_dagostino_pearson_of_too_few_values():
+    assert np.isnan(dagostino_pearson(Moments.from_values(np.arange(7.0))))
+    assert np.isnan(dagostino_pearson(Moments.from_values(np.ones(100))))
+
+
+@pytest.mark.parametrize("splits", [[], [7], [100, 5000, 12345]])
+def test_merged_sketch_quantiles(splits):
+    values = skewed_values()
+    values[::97] = np.nan
+    sketch = merge_all([QuantileSketch.from_values(part) for part in np.split(values, splits)], QuantileSketch())
+    qs = [0, 0.01, 0.25, 0.5, 0.75, 0.99, 1]
+
+    assert sketch.counts.sum() == np.count_nonzero(~np.isnan(values))
+    np.testing.assert_allclose(sketch.quantiles(qs), np.nanquantile(values, qs), rtol=0, atol=0.01)
+
+
+def test_sketch_resolution():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.1))
+    assert np.isnan(QuantileSketch().quantiles([0.5])).all()
+
+
+@pytest.mark.parametrize("count, method, name", [
+    (SHAPIRO_MAX_SAMPLES, "auto", "Shapiro-Wilk"),
+    (SHAPIRO_MAX_SAMPLES + 1, "auto", "D'Agostino-Pearson"),
+    (SHAPIRO_MAX_SAMPLES, "subsample", "Shapiro-Wilk"),
+    (SHAPIRO_MAX_SAMPLES + 1, "subsample", f"Shapiro-Wilk ({SHAPIRO_MAX_SAMPLES} subsample)"),
+    (100, "dagostino", "D'Agostino-Pearson")])
+def test_normality_test_method(count, method, name):
+    values = skewed_values(count)
+    p_value, test = normality_test(values, method)
+
+    assert test == name
+    assert 0 <= p_value <= 1
+    if name == "D'Agostino-Pearson":
+        assert p_value == pytest.approx(stats.normaltest(values).pvalue, rel=1e-8, abs=1e-300)
+
+
+def test_normality_test_from_moments():
+    # The moments are enough for a large sample, the values are not used
+    values = skewed_values(SHAPIRO_MAX_SAMPLES * 2)
+    assert normality_test(None, moments=Moments.from_values(values)) == normality_test(values)
+    with pytest.raises(ValueError):
+        normality_test(values, "unknown")
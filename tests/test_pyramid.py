@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from pyramid import TimePyramid
+from reader import TIME
+
+
+def noisy_series(samples=100001, seed=0):
+    """
+    :param samples: The number of samples
+    :param seed: The seed of the random values
+    :return: The time array at 0.1s and a noisy value array with a one sample spike and some missing values
+    """
+    rng = np.random.default_rng(seed)
+    time = np.arange(samples) * 0.1
+    values = rng.normal(20, 2, samples)
+    values[rng.integers(0, samples, 100)] = np.nan
+    values[samples // 3] = 500
+    return time, values
+
+
+@pytest.mark.parametrize("start, end", [(0, 10000.0), (2000.0, 4000.0), (3333.0, 3334.0), (123.45, 9876.5)])
+def test_extremes_match_buckets(start, end):
+    # Each bucket of the level read gives the samples of its min and max value, within the range
+    time, values = noisy_series()
+    pyramid = TimePyramid(time, values)
+    extremes = pyramid.extremes(start, end, 1408)
+
+    level = pyramid.level_for(start, end, 704)
+    inside = (time >= start) & (time <= end)
+    buckets = np.flatnonzero(inside) // 2 ** level
+    expected = set()
+    for bucket in np.unique(buckets):
+        members = np.flatnonzero(inside)[buckets == bucket]
+        if not np.all(np.isnan(values[members])):
+            expected.update([members[np.nanargmin(values[members])], members[np.nanargmax(values[members])]])
+
+    np.testing.assert_array_equal(extremes[TIME].to_numpy(), time[sorted(expected)])
+    np.testing.assert_array_equal(extremes["VALUE"].to_numpy(), values[sorted(expected)])
+    assert len(extremes) <= 2 * 1408
+
+
+def test_extremes_keep_the_peak():
+    # A one sample spike is kept when the whole series is read at a coarse level
+    time, values = noisy_series()
+    extremes = TimePyramid(time, values).extremes(*TimePyramid(time, values).span, 200)
+
+    assert extremes["VALUE"].max() == 500
+    assert extremes["VALUE"].min() == np.nanmin(values)
+
+
+def test_query_aggregates():
+    time, values = noisy_series(1024)
+    pyramid = TimePyramid(time, values)
+    range_df = pyramid.query(0, 102.3, 100)
+
+    buckets = values.reshape(len(range_df), -1)
+    np.testing.assert_array_equal(range_df["MIN"], np.nanmin(buckets, axis=1))
+    np.testing.assert_array_equal(range_df["MAX"], np.nanmax(buckets, axis=1))
+    np.testing.assert_allclose(range_df["MEAN"], np.nanmean(buckets, axis=1), rtol=1e-12)
@@ -0,0 +1,201 @@
+import glob
+import io
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from alignment import bin_time
+import ingest
+import reader
+from reader import (POWER, TIME, extract_channels, extract_df, find_channel_columns, load_runs, read_channels_csv,
+                    read_energy_csv, stream_energy_csv)
+
+# The example EnergiBridge files shipped with the repository
+TEST_FILES = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "..", "test_files", "*.csv")))
+
+
+def synthetic_df(column, rows=2000, seed=0):
+    """
+    Create an EnergiBridge-like DataFrame with a jittered sampling interval, mostly shorter than the 0.1s time
+    bins so many rows share a bin.
+
+    :param column: The energy or power column to fill
+    :param rows: The number of rows
+    :param seed: The seed of the random values
+    :return: The DataFrame with the Time column and the data column
+    """
+    rng = np.random.default_rng(seed)
+    intervals = np.maximum(rng.normal(60, 25, rows).round(), 1)
+    times = 1711464957805 + np.cumsum(intervals)
+    if column.endswith("(J)"):
+        values = 6000 + np.cumsum(rng.random(rows) * 3)
+    else:
+        values = rng.normal(20, 4, rows)
+    return pd.DataFrame(data={"Time": times, column: values})
+
+
+@pytest.mark.parametrize("path", TEST_FILES, ids=os.path.basename)
+def test_engines_match_on_test_files(path):
+    # The engines accumulate the same values in the same row order, so they match exactly, not within a tolerance
+    df = read_energy_csv(path)
+    vectorized_tdf, vectorized_energy = extract_df(df, "vectorized")
+    loop_tdf, loop_energy = extract_df(df, "loop")
+
+    assert len(vectorized_tdf) > 0
+    pd.testing.assert_frame_equal(vectorized_tdf, loop_tdf, check_exact=True)
+    assert vectorized_energy == loop_energy
+
+
+@pytest.mark.parametrize("column", ["CPU_ENERGY (J)", "CPU_POWER (Watts)"])
+def test_engines_match_on_both_formats(column):
+    df = synthetic_df(column)
+    vectorized_tdf, vectorized_energy = extract_df(df, "vectorized")
+    loop_tdf, loop_energy = extract_df(df, "loop")
+
+    pd.testing.assert_frame_equal(vectorized_tdf, loop_tdf, check_exact=True)
+    assert vectorized_energy == loop_energy
+    assert list(vectorized_tdf.columns) == [TIME, POWER]
+    assert vectorized_tdf[TIME].is_unique
+
+
+def test_unknown_engine():
+    with pytest.raises(ValueError):
+        extract_df(synthetic_df("CPU_ENERGY (J)"), "unknown")
+
+
+def original_extract(df, key):
+    """
+    Extract a power column the way the reader did before the grouped reduction, rounding the cumulative numpy
+    time of each row with round(time, 1) and averaging the power of equal times row by row.
+
+    :param df: The DataFrame to extract
+    :param key: The power column
+    :return: The list of de-duplicated times and the list of their averaged power
+    """
+    time = []
+    total_time = 0
+    for i, row in df.iloc[2:].iterrows():
+        total_time += (row["Time"] - df.at[i - 1, "Time"]) / 1000
+        time.append(round(total_time, 1))
+    power = df[key].tolist()[2:]
+
+    clean_time, clean_power = [], []
+    for t, p in zip(time, power):
+        if clean_time and clean_time[-1] == t:
+            clean_power[-1].append(p)
+        else:
+            clean_time.append(t)
+            clean_power.append([p])
+    return clean_time, [sum(values) / len(values) for values in clean_power]
+
+
+def test_duplicates_match_original_extraction():
+    # The bins are the same exactly, the averaged power only differs in the order of the additions
+    df = synthetic_df("CPU_POWER (Watts)", rows=5000)
+    power_tdf, _ = extract_df(df)
+    time, power = original_extract(df, "CPU_POWER (Watts)")
+
+    np.testing.assert_array_equal(power_tdf[TIME].to_numpy(), time)
+    np.testing.assert_allclose(power_tdf[POWER].to_numpy(), power, rtol=1e-12, atol=0)
+
+
+def test_bin_time_ties():
+    # Ties of the scaled time go to the even bin like the numpy round of the original extraction, not like round
+    # of a Python float, which sees the binary value of 0.15 just below the tie
+    times = np.array([float(f"{whole}.{tenth}5") for whole in range(100) for tenth in range(10)])
+    np.testing.assert_array_equal(bin_time(times, 0.1), [round(time, 1) for time in times.astype(np.float64)])
+    assert bin_time(np.array([0.15]), 0.1)[0] == 0.2
+    assert round(0.15, 1) == 0.1
+
+
+@pytest.mark.parametrize("bin_width", [0.1, 0.25, 0.3, 1])
+def test_bin_time_multiples(bin_width):
+    times = np.random.default_rng(0).random(1000) * 100
+    binned = bin_time(times, bin_width)
+
+    assert np.all(np.abs(binned - times) <= bin_width / 2 + 1e-9)
+    np.testing.assert_allclose(binned / bin_width, np.round(binned / bin_width), atol=1e-6)
+
+
+def test_small_loads_are_serial(monkeypatch):
+    # Starting worker processes for the small test files would take longer than parsing them
+    def no_pool(*args, **kwargs):
+        raise AssertionError("a process pool was started")
+
+    monkeypatch.setattr(reader, "ProcessPoolExecutor", no_pool)
+    monkeypatch.setattr(ingest, "default_executor", no_pool)
+    runs = load_runs(TEST_FILES, workers=4) + load_runs(TEST_FILES)
+
+    assert len(runs) == 2 * len(TEST_FILES)
+
+
+@pytest.mark.parametrize("path", TEST_FILES, ids=os.path.basename)
+def test_channels_match_extract_df(path):
+    # Each channel matches extracting its column on its own as the total column, within the 1e-12 relative
+    # difference of averaging the duplicate times of all the channels in one reduction
+    channels_df = read_channels_csv(path)
+    channel_tdf, total_energies = extract_channels(channels_df)
+
+    columns = find_channel_columns(channels_df.columns)
+    assert len(columns) > 0
+    assert list(channel_tdf.columns) == [TIME] + list(total_energies.index)
+    for column, name in zip(columns, total_energies.index):
+        total_column = "CPU_ENERGY (J)" if column.endswith("ENERGY (J)") else "CPU_POWER (Watts)"
+        power_tdf, total_energy = extract_df(channels_df[["Time", column]].rename(columns={column: total_column}))
+
+        np.testing.assert_array_equal(channel_tdf[TIME], power_tdf[TIME])
+        np.testing.assert_allclose(channel_tdf[name], power_tdf[POWER], rtol=1e-12, atol=0)
+        assert total_energies[name] == pytest.approx(total_energy, rel=1e-12)
+
+
+def test_channels_of_both_units():
+    energy_df = synthetic_df("CPU_ENERGY (J)")
+    power_df = synthetic_df("CPU_POWER (Watts)", seed=1)
+    df = pd.DataFrame(data={"Time": energy_df["Time"], "CORE10_ENERGY (J)": energy_df["CPU_ENERGY (J)"],
+                            "CORE2_POWER (Watts)": power_df["CPU_POWER (Watts)"]})
+    channel_tdf, total_energies = extract_channels(df)
+
+    # The channels are in natural order, and each is extracted by its own unit
+    assert list(total_energies.index) == ["CORE2", "CORE10"]
+    for name, column, source_df in [("CORE2", "CPU_POWER (Watts)", power_df.assign(Time=df["Time"])),
+                                    ("CORE10", "CPU_ENERGY (J)", energy_df)]:
+        power_tdf, total_energy = extract_df(source_df[["Time", column]])
+        np.testing.assert_allclose(channel_tdf[name], power_tdf[POWER], rtol=1e-12, atol=0)
+        assert total_energies[name] == pytest.approx(total_energy, rel=1e-12)
+
+
+def streamed(file, chunk_rows):
+    """
+    :param file: The path or file-like object of the CSV file
+    :param chunk_rows: The number of rows to read per chunk
+    :return: The concatenated time and power arrays of the chunks and the total energy of the last one
+    """
+    power_tdfs, total_energies = zip(*stream_energy_csv(file, chunk_rows))
+    return (np.concatenate([power_tdf[TIME].to_numpy() for power_tdf in power_tdfs]),
+            np.concatenate([power_tdf[POWER].to_numpy() for power_tdf in power_tdfs]), total_energies[-1])
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 3, 7, 50])
+@pytest.mark.parametrize("path", TEST_FILES, ids=os.path.basename)
+def test_stream_matches_extract_df(path, chunk_rows):
+    # The time bins carried over between the chunks average the same values, only the order of the additions differs
+    power_tdf, total_energy = extract_df(read_energy_csv(path))
+    time, power, streamed_energy = streamed(path, chunk_rows)
+
+    np.testing.assert_array_equal(time, power_tdf[TIME].to_numpy())
+    np.testing.assert_allclose(power, power_tdf[POWER].to_numpy(), rtol=1e-12, atol=0)
+    assert streamed_energy == pytest.approx(total_energy, rel=1e-12)
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 3, 64])
+@pytest.mark.parametrize("column", ["CPU_ENERGY (J)", "CPU_POWER (Watts)"])
+def test_stream_matches_extract_df_on_both_formats(column, chunk_rows):
+    df = synthetic_df(column, rows=500)
+    power_tdf, total_energy = extract_df(df)
+    time, power, streamed_energy = streamed(io.StringIO(df.to_csv(index=False)), chunk_rows)
+
+    np.testing.assert_array_equal(time, power_tdf[TIME].to_numpy())
+    np.testing.assert_allclose(power, power_tdf[POWER].to_numpy(), rtol=1e-12, atol=0)
+    assert streamed_energy == pytest.approx(total_energy, rel=1e-12)
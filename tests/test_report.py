@@ -0,0 +1,49 @@
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from comparison import compare_many, compare_sets
+from report import SetReport, build_report
+from runset import RunSet
+
+# The example EnergiBridge files shipped with the repository, grouped into the sets of the comparisons
+TEST_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "test_files")
+SETS = [sorted(glob.glob(os.path.join(TEST_DIRECTORY, f"{name}*.csv"))) for name in ["gedit", "sleep"]]
+
+
+def test_comparison_from_merged_statistics():
+    # The sets are compared from their merged moments and 0.01W bins, adding the files in batches of one, so the
+    # mean based results are exact and the rank based ones count the pairs within a bin as tied
+    result = build_report(SETS, batch_size=1, workers=1)
+    run_sets = [RunSet.from_files(files, workers=1) for files in SETS]
+    exact = compare_sets(run_sets[0].pooled, run_sets[1].pooled, run_sets[0].total_energies,
+                         run_sets[1].total_energies)
+
+    comparison = result["comparison"]
+    for key in ["welch", "cohens_d", "power_difference", "energy_difference"]:
+        assert comparison[key] == pytest.approx(exact[key], rel=1e-9)
+    assert comparison["mannwhitneyu"] == pytest.approx(exact["mannwhitneyu"], rel=0.05)
+    assert comparison["higher"] == pytest.approx(exact["higher"], abs=1)
+    assert comparison["cliffs_delta"] == pytest.approx(exact["cliffs_delta"], abs=0.01)
+
+
+def test_pairwise_comparison_from_merged_statistics():
+    file_sets = SETS + [SETS[0][:1]]
+    result = build_report(file_sets, batch_size=2, workers=1)
+    exact = compare_many([RunSet.from_files(files, workers=1).pooled for files in file_sets])
+
+    np.testing.assert_allclose(result["pairwise"]["welch"], exact["welch"], rtol=1e-9)
+    np.testing.assert_allclose(result["pairwise"]["mean_difference"], exact["mean_difference"], rtol=1e-9)
+    np.testing.assert_allclose(result["pairwise"]["higher"], exact["higher"], atol=1)
+
+
+def test_set_report_keeps_no_values():
+    report = SetReport("Set #1", compare=True)
+    for files in SETS:
+        report.add(RunSet.from_files(files, workers=1))
+
+    # Only the bins of the power values are kept, at most one per 0.01W between the lowest and highest value
+    assert report.power_moments.count == report.power_sketch.counts.sum()
+    assert len(report.power_sketch.bins) <= (report.power_moments.maximum - report.power_moments.minimum) / 0.01 + 1
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+from runblock import PRECISION_ENV, RunBlock, resolve_precision
+
+
+def test_offsets_and_views():
+    powers = [np.arange(5, dtype=np.float64), np.empty(0), np.arange(3, dtype=np.float64) + 10]
+    block = RunBlock.from_runs(powers)
+
+    assert len(block) == 3
+    np.testing.assert_array_equal(block.offsets, [0, 5, 5, 8])
+    for power, run_power, item in zip(powers, block, [block[i] for i in range(len(block))]):
+        np.testing.assert_array_equal(run_power, power)
+        np.testing.assert_array_equal(item, power)
+
+    # The runs and all of them combined are views of the one contiguous block
+    assert block.power.flags.c_contiguous
+    assert all(np.shares_memory(run_power, block.power) for run_power in block if len(run_power))
+    assert block.pooled is block.power
+    np.testing.assert_array_equal(block.pooled, np.concatenate(powers))
+    assert block.nbytes == block.power.nbytes + block.offsets.nbytes
+
+
+def test_runs_are_copied():
+    power = np.arange(4, dtype=np.float64)
+    block = RunBlock.from_runs([power])
+
+    assert not np.shares_memory(block.power, power)
+    power[0] = 100
+    assert block.run_power(0)[0] == 0
+
+
+@pytest.mark.parametrize("precision", ["float64", "float32"])
+def test_precision(precision):
+    powers = [np.random.default_rng(0).normal(20, 4, 100)]
+    block = RunBlock.from_runs(powers, precision)
+
+    assert block.power.dtype == np.dtype(precision)
+    np.testing.assert_allclose(block.run_power(0), powers[0], rtol=1e-6 if precision == "float32" else 0)
+
+
+def test_resolve_precision(monkeypatch):
+    monkeypatch.delenv(PRECISION_ENV, raising=False)
+    assert resolve_precision() == np.float64
+    monkeypatch.setenv(PRECISION_ENV, "float32")
+    assert resolve_precision() == np.float32
+    assert resolve_precision("float64") == np.float64
+    with pytest.raises(ValueError):
+        resolve_precision("float16")
@@ -0,0 +1,28 @@
+import os
+
+import numpy as np
+
+from utils import find_files, to_json
+
+# The directory of the example EnergiBridge files shipped with the repository
+TEST_DIRECTORY = os.path.join(os.path.dirname(__file__), "..", "test_files")
+
+
+def test_find_files(tmp_path):
+    archive = tmp_path / "runs.erarc"
+    archive.write_bytes(b"")
+    (tmp_path / "notes.txt").write_text("")
+
+    files = find_files([TEST_DIRECTORY, os.path.join(TEST_DIRECTORY, "gedit*.csv"), str(tmp_path)])
+
+    assert [os.path.basename(path) for path in files if path.endswith(".csv")] == [
+        "gedit1.csv", "gedit2.csv", "gedit3.csv", "sleep1.csv", "sleep2.csv", "sleep3.csv"]
+    assert str(archive) in files
+    assert len(files) == 7
+
+
+def test_to_json():
+    value = {"array": np.array([1.5, np.nan, np.inf]), "pair": (np.int64(2), np.bool_(True)), "name": "set"}
+
+    assert to_json(value) == {"array": [1.5, None, None], "pair": [2, True], "name": "set"}
+    assert type(to_json(np.float32(0.5))) is float
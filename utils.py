@@ -0,0 +1,48 @@
+import glob
+import os
+
+import numpy as np
+
+from archive import ARCHIVE_EXTENSION
+
+# The small helpers shared by the command line tools and the pages, kept apart from the modules they come from so
+# using them does not import the data, charting and statistics modules of those
+
+
+def find_files(patterns):
+    """
+    Find the CSV files and archives of a set from a list of directories and glob patterns.
+
+    :param patterns: The list of directories (all the CSV files and archives in them) and glob patterns
+    :return: The sorted list of the paths of the files, without duplicates
+    """
+    files = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            files.update(glob.glob(os.path.join(pattern, "*.csv")))
+            files.update(glob.glob(os.path.join(pattern, f"*{ARCHIVE_EXTENSION}")))
+        else:
+            files.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(files)
+
+
+def to_json(value):
+    """
+    Convert a report value to plain JSON types, with NaN and infinite numbers as null.
+
+    :param value: The value, possibly a nested dict, list or tuple of numpy values, or a numpy array
+    :return: The JSON compatible value
+    """
+    if isinstance(value, np.ndarray):
+        return to_json(value.tolist())
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json(item) for item in value]
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return float(value) if np.isfinite(value) else None
+    return value